@@ -37,45 +37,137 @@ Licence:
 """
 
 import csv
+from functools import partial
 import textgrid
-
-# Load the CSV data
-with open("C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
-        "Github/TextGrid-scripts/textgrids/response_df.csv",
-          "r", encoding="utf-8-sig") as f:  # If `utf-8 BOM` encoded
-    reader = csv.DictReader(f,
-                            delimiter=";"  # If semicolon separated, not comma
-                            )
-    data = [row for row in reader]
-
-# Group data by participant
-participants = {}
-for row in data:
-    participant = row["participant"]
-    if participant not in participants:
-        participants[participant] = []
-    participants[participant].append(row)
-
-# Create a TextGrid for each participant
-for participant, rows in participants.items():
-    # Create a TextGrid object
-    tg = textgrid.TextGrid()
-
-    # Create an IntervalTier object
-    respons_tier = textgrid.IntervalTier(name="response")
-
-    # Populate the interval tier
-    for row in rows:
-        start_time = float(row["start_time"])
-        end_time = float(row["end_time"])
-        label = row["response"]
-        respons_tier.add(start_time, end_time, label)
-
-    # Add the interval tier to the TextGrid
-    tg.append(respons_tier)
-
-    # Write the TextGrid to a file
-    with open("C:/Users/eiten9710/OneDrive - OsloMet/Documents/"
-        "Github/TextGrid-scripts/textgrids/"
-        f"{participant}.TextGrid", "w", encoding="utf-8") as f:
-        tg.write(f)
+from TextGrid_batch import report_batch, run_stream
+from TextGrid_data import group_sorted_rows, iter_csv_rows, sort_csv
+from TextGrid_profile import Profiler, close_profiler, open_profiler
+
+input_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
+    "Github/TextGrid-scripts/textgrids/response_df.csv"
+
+output_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
+    "Github/TextGrid-scripts/textgrids/"
+
+# For sheets too large to load at once, set `streaming_mode_enabled = True`.
+# The rows are then read one participant at a time, and each participant's
+# TextGrid is written by one of `writer_workers` worker processes (`None`
+# uses all CPU cores) while the next participants are read, so memory is
+# bounded by the largest participants. This requires the rows of each
+# participant to be consecutive: set `sort_input_enabled = True` to sort the
+# sheet by participant into `sorted_input_path` first (with bounded memory).
+streaming_mode_enabled = False
+sort_input_enabled = False
+sorted_input_path = input_path[:-len(".csv")] + "_sorted.csv"
+writer_workers = None
+
+# Set `profile_path` to a JSON lines file to record the wall time, items and
+# peak memory of each stage of a run, per participant (see
+# `TextGrid_profile.py`), and `profile_slowest` to also keep `cProfile`
+# statistics of the slowest participants. `None` does not profile the run.
+profile_path = None
+profile_slowest = 0
+
+
+def write_participant_textgrid(participant_rows, profile=False,
+                               cprofile_path=None):
+    """Write the TextGrid of a participant from its
+    `(start_time, end_time, response)` rows.
+
+    With `profile=True` the stages are profiled. Returns the profile records,
+    to be added to those of the run.
+    """
+    participant, rows = participant_rows
+    profiler = Profiler(profile, cprofile_path=cprofile_path)
+
+    with profiler.file(participant, items=len(rows)):
+        with profiler.stage("build textgrid", file=participant,
+                            items=len(rows)):
+            # Create a TextGrid object
+            tg = textgrid.TextGrid()
+
+            # Create an IntervalTier object
+            respons_tier = textgrid.IntervalTier(name="response")
+
+            # Populate the interval tier
+            for start_time, end_time, label in rows:
+                start_time = float(start_time)
+                end_time = float(end_time)
+                respons_tier.add(start_time, end_time, label)
+
+            # Add the interval tier to the TextGrid
+            tg.append(respons_tier)
+
+        # Write the TextGrid to a file
+        with profiler.stage("write textgrid", file=participant,
+                            items=len(rows)):
+            with open(f"{output_path}{participant}.TextGrid", "w",
+                      encoding="utf-8") as f:
+                tg.write(f)
+    return profiler.records
+
+
+def main(input_path=input_path):
+    """Write a TextGrid per participant of the sheet `input_path`."""
+    profiler = open_profiler(profile_path, "csv-to-textgrid",
+                             profile_slowest)
+
+    if streaming_mode_enabled:
+        if sort_input_enabled:
+            with profiler.stage("sort csv"):
+                input_path = sort_csv(input_path, "participant",
+                                      sorted_input_path)
+
+        # Stream the rows of one participant at a time to the writers.
+        # Reading is interleaved with handing out the participants, so it is
+        # timed per row read.
+        rows = profiler.iterate("read csv", iter_csv_rows(
+            input_path, fields=("participant", "start_time", "end_time",
+                                "response")))
+        participants = ((participant, [row[1:] for row in participant_rows])
+                        for participant, participant_rows
+                        in group_sorted_rows(rows, "participant"))
+        batch_results = list(run_stream(
+            partial(write_participant_textgrid, profile=profiler.enabled,
+                    cprofile_path=profiler.cprofile_path),
+            participants, n_workers=writer_workers,
+            label=lambda item: item[0]))
+        report_batch(batch_results)
+        for batch_result in batch_results:
+            profiler.add_records(batch_result.result)
+    else:
+        # Load the CSV data
+        with profiler.stage("read csv") as record:
+            with open(input_path,
+                      "r", encoding="utf-8-sig") as f:  # If `utf-8 BOM` encoded
+                reader = csv.DictReader(f,
+                                        delimiter=";"  # If semicolon separated, not comma
+                                        )
+                data = [row for row in reader]
+            record["items"] = len(data)
+
+        # Group data by participant
+        with profiler.stage("group rows", items=len(data)):
+            participants = {}
+            for row in data:
+                participant = row["participant"]
+                if participant not in participants:
+                    participants[participant] = []
+                participants[participant].append(row)
+
+        # Create a TextGrid for each participant
+        for participant, rows in participants.items():
+            profiler.add_records(write_participant_textgrid(
+                (participant, [(row["start_time"], row["end_time"],
+                                row["response"]) for row in rows]),
+                profile=profiler.enabled,
+                cprofile_path=profiler.cprofile_path))
+
+    close_profiler(profiler, profile_path, "csv-to-textgrid",
+                   profile_slowest, input_path=input_path)
+
+
+# The worker processes of the streaming mode may import this script anew,
+# so only the main process reads the CSV file
+if __name__ == "__main__":
+    main()
@@ -66,13 +66,55 @@ Licence:
 # %% Step 0: Initialise script
 
 # %%% 0.1: Import dependencies
+import argparse
 import os
-from praatio import textgrid
 from os.path import join
-import pandas as pd
-from collections import namedtuple
-
-# %%% 0.2: Define function
+import numpy as np
+from TextGrid_batch import Manifest, hash_inputs, module_files
+from TextGrid_data import read_annotation_csv
+from TextGrid_export import export_available, export_tiers, is_up_to_date
+from TextGrid_files import scan_files
+from TextGrid_io import read_textgrid, write_textgrid
+from TextGrid_profile import Profiler, close_profiler, open_profiler
+from TextGrid_tiers import ArrayTier
+from TextGrid_transform import compile_transform, load_config, per_label
+# `pandas` is imported when the CSV file is read (1.2)
+
+# %%% 0.2: Settings
+# Set `profile_path` to a JSON lines file to record the wall time, items and
+# peak memory of each stage of a run, per file (see `TextGrid_profile.py`),
+# and `profile_slowest` to also keep `cProfile` statistics of the slowest
+# files. `None` does not profile the runs.
+profile_path = None
+profile_slowest = 0
+
+# The rows of the CSV file that are used are cached in a Feather file next to
+# it (`NWD_june23.feather` for `NWD_june23.csv`), which later runs read
+# instead of the CSV file, until the CSV file changes. This needs `pyarrow`.
+# Set `csv_cache_enabled = False` to always read the CSV file.
+csv_cache_enabled = True
+
+# The tiers of the annotated TextGrids in 1.2.3 (which tiers are added,
+# derived from the TextGrid or the CSV file and moved, and their order) are
+# set in a JSON config file (see `TextGrid_transform.py`)
+tier_config_path = join(os.path.dirname(os.path.abspath(__file__)),
+                        "tier_configs", "prosodic_annotation.json")
+
+# The tiers of each annotated TextGrid are also exported to a columnar dataset
+# (`textgrid_tiers/` in the output folder, see `TextGrid_export.py`), for
+# analyses that would otherwise parse every TextGrid again. This needs
+# `pyarrow`. Set `export_format = "feather"` to write Feather files instead
+# of Parquet files, and `export_enabled = False` to not export the tiers.
+export_enabled = True
+export_format = "parquet"
+
+# The modules, besides this script, whose code shapes the modified TextGrids.
+# They are hashed with the inputs of each TextGrid, so that a change to them
+# reprocesses the TextGrids.
+output_modules = ["TextGrid_data", "TextGrid_io", "TextGrid_tiers",
+                  "TextGrid_transform", "TextGrid_export"]
+
+# %%% 0.3: Define function
 # Populate `prosodic_unit` tier with `s` when given entries are not `''`
 
 
@@ -84,125 +126,203 @@ def prosodic_unit(s):
 # %% 1: Modify forced aligned TextGrids and populate with new tiers
 
 
-# %%% 1.1: Define input and output paths
-csv_path = "C:/Users/eirik/OneDrive - OsloMet/" + \
-    "Documents/Github/TextGrid-scripts/" + \
-    "NWD_june23.csv"
-
-# Read CSV file with pandas
-df = pd.read_csv(csv_path, encoding="utf-16")
-
-modified_textgrid_input_path = "C:/Users/eirik/OneDrive - OsloMet/" + \
-    "Documents/Github/TextGrid-scripts/" + \
-    "NorwegianTextGrids/"
-
-# Define `textgrid_output_path` if different from output_path
-modified_textgrid_output_path = join(modified_textgrid_input_path,
-                                     "modified_textgrids/")
-if not os.path.exists(modified_textgrid_output_path):
-    os.mkdir(modified_textgrid_output_path)
-    print(f"Created directory '{modified_textgrid_output_path}'!")
-
-# %%% 1.2: Populate each TextGrid with new tiers and modify existing ones
-# %%%% 1.2.1: Find all participant IDs based on the TextGrid filenames in the folder
-TextGrid_files_list = [f for f in os.listdir(modified_textgrid_input_path) if f.endswith(".TextGrid")]
-
-participant_list = []
-for textgrid_filename in TextGrid_files_list:
-    participant_id = textgrid_filename.split("_")
-    participant_id = participant_id[0][:-9]
-    participant_list.append(participant_id)
-
-# %%%% 1.2.2: Filter the dataframe based on the participant IDs
-
-# Keep only the df rows where the participant ID is in the `participant_list`
-df = df[df["Informant"].isin(participant_list)]
-# Filter out embedding experiment based on the presence of "emb" suffix in the `SoundMatch` column
-df = df[~df["SoundMatch"].str.contains("emb", na=False)]
-
-#pd.set_option('display.max_columns', None)
-
-# We will use the values in here to populate a new TextGrid tier: UniqueNumb, which coincides with the `Informant` column in the CSV file and additionaly by `Begin.Time...ss.msec` and `End.Time...ss.msec` columns. This way, we can ensure that the correct values are added to the TextGrids.
-df = df[["Informant", "UniqueNumb", "Begin.Time...ss.msec", "End.Time...ss.msec", "Realization"]]
-
-# %%%% 1.2.3: Loop through each TextGrid and modify it
-
-for textgrid_filename in os.listdir(modified_textgrid_input_path):
-    ext = os.path.splitext(textgrid_filename)[1]
-    if ext != ".TextGrid":
-        continue
-
-    print(f"Modifying '{textgrid_filename}' located in "
-          f"'{modified_textgrid_input_path}'.")
-
-    # Open the TextGrid
-    tg = textgrid.openTextgrid(f"{modified_textgrid_input_path}"
-                               f"{textgrid_filename}",
-                               includeEmptyIntervals=True)
-
-    # Remove `word` and `phone` tiers for placing them below prosodic tiers
-    word_tier = tg.removeTier("word")
-    phone_tier = tg.removeTier("phone")
-
-    # Add `stress_tier`
-    stress_tier = textgrid.PointTier(
-        "stress (S|SS|0)", [], minT=0, maxT=tg.maxTimestamp)
-    tg.addTier(stress_tier)
-
-    # Duplicate the `word` tier and create new `prosodic_unit` tier
-    prosodic_unit_entries = [(start, stop, prosodic_unit(label))
-                             for start, stop, label in word_tier.entries]
-    prosodic_unit_tier = word_tier.new(name="prosodic unit",
-                                       entries=prosodic_unit_entries)
-    tg.addTier(prosodic_unit_tier)
-
-    # Now reintroduce `word` and `phone` tiers
-    tg.addTier(word_tier)
-    tg.addTier(phone_tier)
-
-    # Add emphasis tier
-    emphasis_tier = textgrid.PointTier(
-        "emphasis (E)", [], minT=0, maxT=tg.maxTimestamp)
-    tg.addTier(emphasis_tier)
-
-    # Add `UniqueNumb` tier
-    uniquenumb_tier = textgrid.IntervalTier(
-        "uniquenumb", [], minT=0, maxT=tg.maxTimestamp)
-
-    # Populate the `UniqueNumb` tier with the `UniqueNumb` values from the CSV file
-    df_filtered = df[df["Informant"] == textgrid_filename[:-9]]
-    for index, row in df_filtered.iterrows():
-        uniquenumb_entry = namedtuple("Interval", ["start", "end", "label"])
-        uniquenumb_entry = uniquenumb_entry(row["Begin.Time...ss.msec"], row["End.Time...ss.msec"], str(row["UniqueNumb"]))
-        uniquenumb_tier.insertEntry(uniquenumb_entry, collisionMode="merge")
-    tg.addTier(uniquenumb_tier)
-
-    # Add `Realization` tier
-    realization_tier = textgrid.IntervalTier(
-        "realization", [], minT=0, maxT=tg.maxTimestamp)
-
-    # Populate the `realization` tier with the `Reailization` values from the CSV file
-    df_filtered = df[df["Informant"] == textgrid_filename[:-9]]
-    for index, row in df_filtered.iterrows():
-        realization_entry = namedtuple("Interval", ["start", "end", "label"])
-        realization_entry = realization_entry(row["Begin.Time...ss.msec"], row["End.Time...ss.msec"], str(row["Realization"]))
-        realization_tier.insertEntry(realization_entry, collisionMode="merge")
-    tg.addTier(realization_tier)
-
-    # Add `comment` tier
-    comment_tier_entries = [(start, stop, "")
-                             for start, stop, label in realization_tier.entries]
-    comment_tier = realization_tier.new(name="comment",
-                                       entries=comment_tier_entries)
-    tg.addTier(comment_tier)
-
-    # Write the TextGrid to a file (here naming with `audio_filename`)
-    tg.save(join(modified_textgrid_output_path,
-                 textgrid_filename),
-            # format="short_textgrid",
-            format="long_textgrid",
-            includeBlankSpaces=True)
-    print(f"Saved '{textgrid_filename}' to "
-          f"'{modified_textgrid_output_path}'.\n")
-
-print("Modified all TextGrids!")
+def load_informant_intervals(csv_path, participant_list, profiler=None,
+                             cache_path=None):
+    """Return the CSV intervals of each informant in `participant_list`.
+
+    The values are tuples of arrays of begin and end times and of
+    `UniqueNumb` and `Realization` labels (as strings). The sheet is read
+    with `read_annotation_csv`, and cached in `cache_path`, if given. The
+    stages are recorded by `profiler`, if given.
+    """
+    if profiler is None:
+        profiler = Profiler()
+
+    # Read the CSV file, keeping only the columns used below. Filter the rows
+    # based on the participant IDs, and filter out embedding experiment based
+    # on the presence of "emb" suffix in the `SoundMatch` column, while
+    # reading (%%%% 1.2.2).
+    # We will use the values in here to populate a new TextGrid tier: UniqueNumb, which coincides with the `Informant` column in the CSV file and additionaly by `Begin.Time...ss.msec` and `End.Time...ss.msec` columns. This way, we can ensure that the correct values are added to the TextGrids.
+    with profiler.stage("read csv") as record:
+        df = read_annotation_csv(csv_path, participant_list,
+                                 cache_path=cache_path)
+        record["items"] = len(df)
+
+    # Group the rows by informant once
+    informant_intervals = {}
+    with profiler.stage("group csv") as record:
+        for informant, df_informant in df.groupby("Informant", sort=False,
+                                                  observed=True):
+            informant_intervals[informant] = (
+                df_informant["Begin.Time...ss.msec"].to_numpy(dtype=float),
+                df_informant["End.Time...ss.msec"].to_numpy(dtype=float),
+                df_informant["UniqueNumb"].to_numpy(dtype=object).astype(str),
+                df_informant["Realization"].to_numpy(dtype=object).astype(
+                    str))
+        record["items"] = len(informant_intervals)
+    return informant_intervals
+
+
+def prosodic_annotate(csv_path, modified_textgrid_input_path,
+                      modified_textgrid_output_path=None, force=False,
+                      profile_path=profile_path,
+                      profile_slowest=profile_slowest, csv_cache_path=None,
+                      csv_cache=csv_cache_enabled, pattern=None,
+                      tier_config_path=tier_config_path,
+                      export=export_enabled, export_path=None,
+                      export_format=export_format):
+    """Add the prosodic annotation tiers to the TextGrids in
+    `modified_textgrid_input_path`, with the intervals in `csv_path`.
+
+    With `pattern`, only the TextGrids whose filename matches that glob
+    pattern are modified. The TextGrids are saved to `modified_textgrid_output_path`
+    (`modified_textgrids/` in the input path by default). With
+    `force=True`, TextGrids with unchanged inputs are modified too. With
+    `profile_path`, the stages of the run are profiled, and with
+    `csv_cache=True`, the CSV rows are cached in `csv_cache_path` (next to
+    the CSV file by default; see 0.2). The tiers are transformed as set in
+    the tier config `tier_config_path`, and with `export=True`, exported to
+    the dataset `export_path` (`textgrid_tiers/` in the output path by
+    default).
+    """
+    # Define `textgrid_output_path` if different from output_path
+    if modified_textgrid_output_path is None:
+        modified_textgrid_output_path = join(modified_textgrid_input_path,
+                                             "modified_textgrids/")
+    if not os.path.exists(modified_textgrid_output_path):
+        os.mkdir(modified_textgrid_output_path)
+        print(f"Created directory '{modified_textgrid_output_path}'!")
+
+    # Export the tiers to `export_path`, if `pyarrow` is installed
+    if not export or not export_available():
+        export_path = None
+    elif export_path is None:
+        export_path = join(modified_textgrid_output_path, "textgrid_tiers")
+
+    # Read and check the tier config once, before any TextGrid is modified
+    transform = compile_transform(load_config(tier_config_path),
+                                  {"prosodic_unit": per_label(prosodic_unit)})
+
+    # %%% 1.2: Populate each TextGrid with new tiers and modify existing ones
+    # %%%% 1.2.1: Find all participant IDs based on the TextGrid filenames in the folder
+    # The folder is listed once (see `TextGrid_files.py`). The participant ID
+    # of `FO03.TextGrid` (or `1203_FO03.TextGrid`) is `FO03`.
+    profiler = open_profiler(profile_path, "prosodic-annotate",
+                             profile_slowest)
+    with profiler.stage("scan files") as record:
+        textgrid_files = scan_files(modified_textgrid_input_path,
+                                    extensions=(".TextGrid",),
+                                    pattern=pattern)
+        record["items"] = len(textgrid_files)
+
+    participant_list = [textgrid_file.participant
+                        for textgrid_file in textgrid_files]
+
+    if csv_cache and csv_cache_path is None:
+        csv_cache_path = os.path.splitext(csv_path)[0] + ".feather"
+    informant_intervals = load_informant_intervals(
+        csv_path, participant_list, profiler,
+        cache_path=csv_cache_path if csv_cache else None)
+    no_intervals = (np.empty(0), np.empty(0), np.empty(0, dtype=str),
+                    np.empty(0, dtype=str))
+
+    # %%%% 1.2.3: Loop through each TextGrid and modify it
+    manifest = Manifest(modified_textgrid_output_path, force=force)
+    script_digest = hash_inputs(
+        files=[__file__, tier_config_path, *module_files(output_modules)])
+
+    for textgrid_file in textgrid_files:
+        textgrid_filename = textgrid_file.name
+
+        # Skip the TextGrid if it and the informant's rows are unchanged
+        with profiler.stage("hash inputs", file=textgrid_filename, items=1):
+            input_digest = hash_inputs(
+                files=[join(modified_textgrid_input_path, textgrid_filename)],
+                values=[array.tobytes() for array in informant_intervals.get(
+                    textgrid_file.participant, no_intervals)]
+                + [script_digest])
+        if is_up_to_date(manifest, textgrid_filename, input_digest,
+                         textgrid_file.participant, export_path,
+                         export_format):
+            print(f"Skipping '{textgrid_filename}', which is unchanged.\n")
+            continue
+
+        with profiler.file(textgrid_filename):
+            print(f"Modifying '{textgrid_filename}' located in "
+                  f"'{modified_textgrid_input_path}'.")
+
+            # Open the TextGrid, with its tiers as arrays. The tiers derived
+            # below share the time arrays of the tiers they are derived from.
+            with profiler.stage("read textgrid",
+                                file=textgrid_filename) as record:
+                tg = read_textgrid(join(modified_textgrid_input_path,
+                                        textgrid_filename),
+                                   include_empty_intervals=True)
+                tg = tg._replace(tiers=[ArrayTier.from_tier(tier)
+                                        for tier in tg.tiers])
+                record["items"] = sum(len(tier.codes) for tier in tg.tiers)
+
+            # Move, add and derive the tiers as set in the tier config (0.2),
+            # with the `uniquenumb` and `realization` tiers populated with
+            # the `UniqueNumb` and `Realization` values from the CSV file.
+            # Overlapping intervals are merged, as with
+            # `insertEntry(..., collisionMode="merge")`, but for all rows at
+            # once.
+            begin_times, end_times, uniquenumbs, realizations = \
+                informant_intervals.get(textgrid_file.participant,
+                                        no_intervals)
+            with profiler.stage("build tiers", file=textgrid_filename,
+                                items=len(begin_times)):
+                tg = transform.apply(tg, csv_intervals={
+                    "UniqueNumb": (begin_times, end_times, uniquenumbs),
+                    "Realization": (begin_times, end_times, realizations)})
+
+            # Write the TextGrid to a file (here naming with
+            # `audio_filename`)
+            with profiler.stage("write textgrid", file=textgrid_filename,
+                                items=sum(len(tier.codes)
+                                          for tier in tg.tiers)):
+                write_textgrid(tg, join(modified_textgrid_output_path,
+                                        textgrid_filename),
+                               # format="short_textgrid",
+                               format="long_textgrid",
+                               include_blank_spaces=True)
+            if export_path is not None:
+                with profiler.stage("export tiers", file=textgrid_filename,
+                                    items=len(tg.tiers)):
+                    export_tiers(tg, textgrid_filename,
+                                 textgrid_file.participant, export_path,
+                                 export_format)
+            print(f"Saved '{textgrid_filename}' to "
+                  f"'{modified_textgrid_output_path}'.\n")
+        manifest.record(textgrid_filename, input_digest)
+
+    manifest.save()
+    print("Modified all TextGrids!")
+    close_profiler(profiler, profile_path, "prosodic-annotate",
+                   profile_slowest, input_path=modified_textgrid_input_path)
+
+
+# %% 2: Run the script
+# `TextGrid_cli.py` imports this script to run it with other paths
+if __name__ == "__main__":
+    # TextGrids whose inputs (TextGrid file, the informant's CSV rows and this
+    # script) are unchanged since the last run are skipped, unless run with
+    # `--force`
+    parser = argparse.ArgumentParser(
+        description="Modify TextGrids for prosodic annotation.")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate all TextGrids, also unchanged ones")
+    args, _ = parser.parse_known_args()
+
+    # %%% 2.1: Define input and output paths
+    csv_path = "C:/Users/eirik/OneDrive - OsloMet/" + \
+        "Documents/Github/TextGrid-scripts/" + \
+        "NWD_june23.csv"
+
+    modified_textgrid_input_path = "C:/Users/eirik/OneDrive - OsloMet/" + \
+        "Documents/Github/TextGrid-scripts/" + \
+        "NorwegianTextGrids/"
+
+    prosodic_annotate(csv_path, modified_textgrid_input_path,
+                      force=args.force)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Audio file durations for the `maxTime` of generated TextGrids.
+
+The duration of a WAV file is given by its RIFF header, so instead of starting
+an ffprobe process per file, this module reads the header directly. Only the
+chunk headers and the `fmt ` (and `ds64`) chunks are read; the audio data is
+skipped. Plain RIFF/WAVE, WAVE_FORMAT_EXTENSIBLE and RF64/BW64 files with
+PCM, IEEE float, A-law or µ-law samples are supported. Other files fall back
+to ffprobe.
+
+`DurationCatalog` keeps the durations of a corpus in an SQLite file, with
+the size and modification time of each audio file. Later runs only read
+the files that are new or changed since, so the durations of thousands of
+clips are found from a listing of the folder alone.
+
+File:
+    TextGrid_audio.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+
+import csv
+import os
+import sqlite3
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Format tags with a constant number of bytes per sample frame, so that the
+# number of frames follows from the size of the `data` chunk
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+FRAME_BASED_FORMATS = {WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT,
+                       WAVE_FORMAT_ALAW, WAVE_FORMAT_MULAW}
+
+WavInfo = namedtuple("WavInfo", ["format_tag", "channels", "sample_rate",
+                                 "bits_per_sample", "block_align", "frames"])
+
+
+class UnsupportedAudioFormat(ValueError):
+    """Raised when the duration cannot be read from the file header."""
+
+
+def read_wav_info(path):
+    """Read the format and number of sample frames from a WAV header.
+
+    Raises `UnsupportedAudioFormat` for files that are not WAV files, that
+    use a compressed format, or whose header does not give the exact length.
+    """
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        riff_header = f.read(12)
+        if (len(riff_header) < 12
+                or riff_header[:4] not in (b"RIFF", b"RF64", b"BW64")
+                or riff_header[8:12] != b"WAVE"):
+            raise UnsupportedAudioFormat(f"'{path}' is not a WAV file")
+        is_rf64 = riff_header[:4] != b"RIFF"
+
+        fmt = None
+        ds64_data_size = None
+        data_size = None
+        position = 12
+        while position + 8 <= file_size:
+            f.seek(position)
+            chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+            if chunk_id == b"ds64":
+                # 64-bit sizes of the RIFF and data chunks of RF64 files
+                ds64_data_size = struct.unpack("<QQ", f.read(16))[1]
+            elif chunk_id == b"fmt ":
+                fmt = _parse_fmt(f.read(chunk_size), path)
+            elif chunk_id == b"data":
+                data_size = chunk_size
+                if is_rf64 and chunk_size == 0xFFFFFFFF:
+                    data_size = ds64_data_size
+                data_available = file_size - position - 8
+                break
+            # Chunks are padded to an even number of bytes
+            position += 8 + chunk_size + (chunk_size & 1)
+
+    if fmt is None or data_size is None:
+        raise UnsupportedAudioFormat(f"'{path}' has no 'fmt ' or 'data' chunk")
+    format_tag, channels, sample_rate, block_align, bits_per_sample = fmt
+    if format_tag not in FRAME_BASED_FORMATS:
+        raise UnsupportedAudioFormat(
+            f"'{path}' uses the compressed format 0x{format_tag:04X}")
+    if block_align == 0 or sample_rate == 0:
+        raise UnsupportedAudioFormat(f"'{path}' has an invalid 'fmt ' chunk")
+    if data_size > data_available:
+        # Truncated file, or written by a streaming recorder that never
+        # updated the header
+        raise UnsupportedAudioFormat(
+            f"'{path}' is shorter than its 'data' chunk")
+
+    return WavInfo(format_tag, channels, sample_rate, bits_per_sample,
+                   block_align, data_size // block_align)
+
+
+def _parse_fmt(chunk, path):
+    if len(chunk) < 16:
+        raise UnsupportedAudioFormat(f"'{path}' has an invalid 'fmt ' chunk")
+    (format_tag, channels, sample_rate, byte_rate, block_align,
+     bits_per_sample) = struct.unpack("<HHIIHH", chunk[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(chunk) < 40:
+            raise UnsupportedAudioFormat(
+                f"'{path}' has an invalid WAVE_FORMAT_EXTENSIBLE header")
+        # The actual format tag is the start of the sub-format GUID
+        format_tag = struct.unpack("<H", chunk[24:26])[0]
+    return format_tag, channels, sample_rate, block_align, bits_per_sample
+
+
+def wav_duration(path):
+    """Return the duration of a WAV file in seconds, as reported by ffprobe.
+
+    ffprobe reports durations in whole microseconds, rounding halves away
+    from zero; the same is done here so that the two agree exactly.
+    """
+    info = read_wav_info(path)
+    microseconds = ((2 * info.frames * 1000000 + info.sample_rate)
+                    // (2 * info.sample_rate))
+    return microseconds / 1000000
+
+
+def ffprobe_duration(path):
+    """Return the duration of any audio file in seconds via ffprobe."""
+    import ffmpeg  # If script aborts on error, try: `pip install ffmpeg-python`
+    return float(ffmpeg.probe(path)["format"]["duration"])
+
+
+def audio_duration(path):
+    """Return the duration of an audio file in seconds.
+
+    WAV headers are read directly; ffprobe is only used for other formats.
+    """
+    try:
+        return wav_duration(path)
+    except UnsupportedAudioFormat:
+        return ffprobe_duration(path)
+
+
+class DurationCatalog:
+    """SQLite catalog of audio durations keyed by path.
+
+    Each entry holds the size and modification time (in nanoseconds) of the
+    file when its duration was read, and is valid as long as they are
+    unchanged, which is checked with a stat rather than by reading the
+    file. The catalog file can be kept between runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # The number of files read by the last call of `durations`
+        self.n_read = 0
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "duration REAL)")
+        self.connection.commit()
+
+    def durations(self, audio_files, workers=8):
+        """Return a dict with the duration of each audio file.
+
+        `audio_files` are paths, or `InputFile`s from `scan_files`, whose
+        size and modification time are then used without another stat. The
+        durations of files that are not in the catalog, or have changed,
+        are read by `workers` threads and stored. Files whose duration
+        cannot be read are reported and left out. The keys are the paths
+        as given.
+        """
+        stamps = {}
+        for audio_file in audio_files:
+            if isinstance(audio_file, (str, os.PathLike)):
+                stat = os.stat(audio_file)
+                stamps[os.fspath(audio_file)] = (stat.st_size,
+                                                 stat.st_mtime_ns)
+            else:
+                stamps[audio_file.path] = (audio_file.size,
+                                           audio_file.mtime_ns)
+
+        found = {}
+        paths = list(stamps)
+        # Stay below SQLite's limit on the number of query parameters
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT path, size, mtime_ns, duration FROM durations "
+                f"WHERE path IN ({placeholders})",
+                [self._key(path) for path in chunk])
+            by_key = {key: (size, mtime_ns, duration)
+                      for key, size, mtime_ns, duration in rows}
+            for path in chunk:
+                entry = by_key.get(self._key(path))
+                if entry is not None and entry[:2] == stamps[path]:
+                    found[path] = entry[2]
+
+        missing = [path for path in paths if path not in found]
+        self.n_read = len(missing)
+        if missing:
+            with ThreadPoolExecutor(max(1, workers)) as executor:
+                read = list(executor.map(_try_audio_duration, missing))
+            new = {path: duration for path, duration in zip(missing, read)
+                   if duration is not None}
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?)",
+                    [(self._key(path), *stamps[path], duration)
+                     for path, duration in new.items()])
+            found.update(new)
+        return {path: found[path] for path in paths if path in found}
+
+    def export_csv(self, csv_path):
+        """Write the catalog to a CSV file, one row per audio file."""
+        rows = self.connection.execute(
+            "SELECT path, size, mtime_ns, duration FROM durations "
+            "ORDER BY path")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["path", "size", "mtime_ns", "duration"])
+            writer.writerows(rows)
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+
+def _try_audio_duration(path):
+    try:
+        return audio_duration(path)
+    except Exception as error:
+        print(f"Could not read the duration of '{path}': {error}")
+        return None
+
+
+def compare_durations(expected, durations, tolerance=0.001):
+    """Return the files whose expected duration differs from the real one.
+
+    `expected` and `durations` map the same keys (e.g. audio filenames) to
+    durations in seconds, e.g. from the `duration` column of a CSV file and
+    from `DurationCatalog.durations`. Returns a list of `(key, expected,
+    duration)` for the keys in both whose durations differ by more than
+    `tolerance` seconds.
+    """
+    return [(key, expected_duration, durations[key])
+            for key, expected_duration in expected.items()
+            if key in durations
+            and abs(expected_duration - durations[key]) > tolerance]
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Helpers for running the TextGrid scripts over many files at once.
+
+The TextGrid scripts process one file at a time. This module spreads such
+per-file work across a pool of worker processes, so that large forced-aligned
+corpora make use of all available cores. A failure in one file is reported
+without stopping the rest of the batch. Streams of items that are too large
+to hold in memory at once are processed as they are produced. A manifest in
+the output folder records a hash of the inputs of each output file, so that
+later runs can skip the files whose inputs have not changed. Each file is
+recorded in a journal as soon as it is written, so that a run that is
+interrupted resumes where it stopped.
+
+File:
+    TextGrid_batch.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import traceback
+from collections import deque, namedtuple
+from functools import partial
+from multiprocessing import Pool
+
+# Outcome of processing a single item: `error` is `None` on success, otherwise
+# the formatted traceback of the exception raised for `item`
+BatchResult = namedtuple("BatchResult", ["item", "result", "error"])
+
+
+def _call(function, item):
+    return BatchResult(item, *_outcome(function, item))
+
+
+def _outcome(function, item):
+    # Exceptions are returned as text, since not all of them can be pickled
+    # back to the main process
+    try:
+        return function(item), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def run_batch(function, items, n_workers=None, chunksize=1,
+              initializer=None, initargs=(), on_result=None):
+    """Apply `function` to each item, spread across worker processes.
+
+    `function` must be importable by the worker processes, i.e. defined at
+    module level (possibly wrapped in `functools.partial`). With
+    `n_workers=1` the items are processed in the current process instead.
+    `n_workers=None` uses all available CPU cores. `chunksize` is the number
+    of items sent to a worker at a time; larger chunks reduce the overhead of
+    inter-process communication when there are many small files.
+    `initializer(*initargs)` is called once in every worker before it starts
+    on its items, e.g. to set up a translator per process.
+
+    Returns a list of `BatchResult` in the order of `items`. Failed items are
+    reported as they occur, and the rest of the batch carries on.
+    `on_result(result)` is called in this process with each `BatchResult` as
+    it arrives, e.g. to record the finished files in a `Manifest`.
+    """
+    items = list(items)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(items)))
+    call = partial(_call, function)
+
+    if n_workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        outcomes = map(call, items)
+        results = _collect(outcomes, on_result)
+    else:
+        with Pool(n_workers, initializer, initargs) as pool:
+            outcomes = pool.imap(call, items, chunksize=chunksize)
+            results = _collect(outcomes, on_result)
+
+    return results
+
+
+def run_stream(function, items, n_workers=None, max_pending=None,
+               label=str, initializer=None, initargs=()):
+    """Apply `function` to a stream of items, spread across worker processes.
+
+    Like `run_batch`, but for an iterator of items that should not all be
+    held in memory at once, e.g. the rows of each participant of a large
+    sheet. Items are taken from `items` only as workers become free, with
+    at most `max_pending` items (by default twice the number of workers)
+    handed out and not finished, so the workers overlap with producing the
+    next items. Results are yielded in the order of `items`, as they
+    finish. To not keep every item alive, the results hold `label(item)`
+    in place of the item.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, n_workers)
+    if max_pending is None:
+        max_pending = 2 * n_workers
+    outcome = partial(_outcome, function)
+
+    if n_workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield _report(BatchResult(label(item), *outcome(item)))
+        return
+
+    with Pool(n_workers, initializer, initargs) as pool:
+        pending = deque()
+        for item in items:
+            if len(pending) >= max_pending:
+                yield _finish(*pending.popleft())
+            pending.append((label(item), pool.apply_async(outcome, (item,))))
+        while pending:
+            yield _finish(*pending.popleft())
+
+
+def submit(pool, function, item):
+    """Start `function(item)` in a worker of `pool`, as `run_batch` does.
+
+    For pools that are kept across many batches, e.g. while watching a
+    folder. Returns an `AsyncResult`; pass it to `collect` once it is
+    `ready()`.
+    """
+    return pool.apply_async(_call, (function, item))
+
+
+def collect(async_result):
+    """Return the `BatchResult` of an item started with `submit`.
+
+    A failure is reported, as in `run_batch`.
+    """
+    return _report(async_result.get())
+
+
+def _finish(item_label, async_outcome):
+    return _report(BatchResult(item_label, *async_outcome.get()))
+
+
+def _report(result):
+    if result.error is not None:
+        print(f"Failed to process '{result.item}':\n{result.error}")
+    return result
+
+
+def _collect(outcomes, on_result=None):
+    results = []
+    for outcome in outcomes:
+        results.append(_report(outcome))
+        if on_result is not None:
+            on_result(outcome)
+    return results
+
+
+def report_batch(results):
+    """Print a summary of a batch and return the failed items."""
+    failed = [result.item for result in results if result.error is not None]
+    print(f"Processed {len(results) - len(failed)} of {len(results)} files.")
+    if failed:
+        print("The following files failed and were skipped:")
+        for item in failed:
+            print(f"    {item}")
+    return failed
+
+
+# %% Incremental re-processing
+def hash_inputs(files=(), values=()):
+    """Return a SHA-256 hex digest of the contents of `files` and `values`.
+
+    `values` are hashed by their `repr`, e.g. the CSV rows used for a file.
+    """
+    digest = hashlib.sha256()
+    for path in files:
+        with open(path, "rb") as f:
+            for block in iter(partial(f.read, 1024 * 1024), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    for value in values:
+        digest.update(value if isinstance(value, bytes)
+                      else repr(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def module_files(names):
+    """Return the source files of the modules `names`, e.g. to hash them.
+
+    The modules are found without being imported, so that modules that a
+    script imports only when needed can be hashed before they are used.
+    """
+    return [importlib.util.find_spec(name).origin for name in names]
+
+
+class Manifest:
+    """Hashes of the inputs of each output file in `output_path`.
+
+    An output file is up to date if it exists and was written from inputs
+    with the same hash. With `force=True` no file is considered up to date,
+    but the manifest is still updated. Call `save()` at the end of a run.
+
+    Each `record` is also appended to a journal next to the manifest at
+    once, and the journal is read back with the manifest. If a run is
+    interrupted before `save()`, e.g. by a crash or a failing file, the next
+    run (without `force`) thus skips the files that were finished, and only
+    processes the rest. `save()` folds the journal into the manifest.
+    """
+
+    filename = ".textgrid_manifest.json"
+    journal_filename = ".textgrid_manifest.journal"
+
+    def __init__(self, output_path, force=False):
+        self.output_path = output_path
+        self.path = os.path.join(output_path, self.filename)
+        self.journal_path = os.path.join(output_path, self.journal_filename)
+        self.force = force
+        self.digests = {}
+        self._journal = None
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.digests = json.load(f)
+        if os.path.exists(self.journal_path):
+            self.digests.update(_read_journal(self.journal_path))
+
+    def is_up_to_date(self, output_filename, digest):
+        return (not self.force
+                and self.digests.get(output_filename) == digest
+                and os.path.exists(os.path.join(self.output_path,
+                                                output_filename)))
+
+    def record(self, output_filename, digest):
+        self.digests[output_filename] = digest
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps([output_filename, digest]) + "\n")
+        # Flushed at once, so that the line survives if the run is killed
+        self._journal.flush()
+
+    def save(self):
+        # Write to a temporary file first, so that an interrupted run cannot
+        # leave a truncated manifest behind
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.digests, f, indent=0, sort_keys=True)
+        os.replace(temporary_path, self.path)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+
+def _read_journal(path):
+    """Return the digests recorded in a journal, in the order recorded."""
+    digests = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                output_filename, digest = json.loads(line)
+            except ValueError:
+                # A line cut short when the run was killed
+                continue
+            digests[output_filename] = digest
+    return digests
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Command-line entry point for the TextGrid scripts.
+
+Runs the steps of `TextGrid_script.py` and `TextGrid_Prosodic_Annotation.py`
+without interactive prompts and with the paths given as arguments, e.g. from
+a scheduler:
+
+    python TextGrid_cli.py generate --input-path data/
+    python TextGrid_cli.py modify --input-path fa_textgrids/ --backend stub
+    python TextGrid_cli.py prosodic-annotate --csv NWD_june23.csv \\
+        --input-path NorwegianTextGrids/
+
+Run a subcommand with `--help` for its options. Each subcommand imports only
+the script and dependencies it uses: e.g. `generate` does not load the
+translation code, and only `prosodic-annotate` loads pandas. All of them
+read or write TextGrids, and so load praatio and numpy.
+`benchmarks/bench_startup.py` measures the start-up time of each subcommand.
+
+File:
+    TextGrid_cli.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import argparse
+import importlib
+import sys
+
+# The function run by each subcommand, as (module, function). The module is
+# imported only when its subcommand runs.
+commands = {
+    "generate": ("TextGrid_script", "generate_textgrids"),
+    "modify": ("TextGrid_script", "modify_textgrids"),
+    "watch": ("TextGrid_script", "watch_textgrids"),
+    "prosodic-annotate": ("TextGrid_Prosodic_Annotation",
+                          "prosodic_annotate"),
+    "join": ("TextGrid_join", "join_corpus"),
+}
+
+
+def load_command(name):
+    """Import and return the function run by the subcommand `name`."""
+    module_name, function_name = commands[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Generate, modify and annotate TextGrid files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser(
+        "generate", help="generate TextGrids from `realization.csv` and the "
+        "durations of the audio files")
+    generate.add_argument("--input-path", required=True,
+                          help="folder with `realization.csv`")
+    generate.add_argument("--audio-path",
+                          help="folder with the audio files (default: the "
+                          "input path)")
+    generate.add_argument("--output-path",
+                          help="folder for the TextGrids (default: "
+                          "`textgrids/` in the audio path)")
+    generate.add_argument("--duration-catalog",
+                          help="SQLite file of the durations of the audio "
+                          "files (default: `duration_catalog.sqlite` in the "
+                          "audio path)")
+    generate.add_argument("--export-durations", metavar="CSV",
+                          help="also write the durations to this CSV file")
+    generate.add_argument("--duration-workers", type=int, default=8,
+                          help="threads reading the durations of new audio "
+                          "files (default: 8)")
+
+    modify = subparsers.add_parser(
+        "modify", help="add tiers to forced aligned TextGrids, with "
+        "translations of the `realization` labels")
+    watch = subparsers.add_parser(
+        "watch", help="modify forced aligned TextGrids as they arrive in a "
+        "folder, until stopped with Ctrl+C")
+    for subparser in (modify, watch):
+        subparser.add_argument("--input-path", required=True,
+                               help="folder with the forced aligned "
+                               "TextGrids")
+        subparser.add_argument("--output-path",
+                               help="folder for the modified TextGrids "
+                               "(default: `modified_textgrids/` in the input "
+                               "path)")
+        subparser.add_argument("--translation-cache",
+                               help="SQLite file of cached translations "
+                               "(default: `translation_cache.sqlite` in the "
+                               "input path)")
+        subparser.add_argument("--backend", default="google",
+                               choices=["google", "stub"],
+                               help="translation backend (default: google)")
+        subparser.add_argument("--workers", type=int,
+                               help="number of worker processes (default: "
+                               "all CPU cores)")
+        subparser.add_argument("--max-in-flight", type=int, default=8,
+                               help="concurrent translation requests "
+                               "(default: 8)")
+        subparser.add_argument("--rate", type=float, default=5,
+                               help="translation requests started per "
+                               "second (default: 5)")
+        subparser.add_argument("--retries", type=int, default=3,
+                               help="retries of a failed translation request "
+                               "(default: 3)")
+        subparser.add_argument("--timeout", type=float, default=10,
+                               help="timeout of a translation request in "
+                               "seconds (default: 10)")
+    modify.add_argument("--chunksize", type=int, default=4,
+                        help="files sent to a worker at a time (default: 4)")
+    modify.add_argument("--serial", action="store_true",
+                        help="modify the TextGrids one by one in this "
+                        "process")
+    watch.add_argument("--interval", type=float, default=1,
+                       help="seconds between checks of the folder "
+                       "(default: 1)")
+    watch.add_argument("--settle", type=float, default=2,
+                       help="seconds a TextGrid must be unchanged before it "
+                       "is modified (default: 2)")
+    watch.add_argument("--stop-after", type=float, metavar="SECONDS",
+                       help="stop watching after this many seconds")
+
+    prosodic = subparsers.add_parser(
+        "prosodic-annotate", help="add prosodic annotation tiers to "
+        "TextGrids, with intervals from a CSV file")
+    prosodic.add_argument("--csv", required=True,
+                          help="UTF-16 CSV file with the intervals per "
+                          "informant")
+    prosodic.add_argument("--input-path", required=True,
+                          help="folder with the TextGrids")
+    prosodic.add_argument("--output-path",
+                          help="folder for the modified TextGrids (default: "
+                          "`modified_textgrids/` in the input path)")
+    prosodic.add_argument("--csv-cache",
+                          help="Feather file caching the rows of the CSV "
+                          "file (default: next to the CSV file, with the "
+                          "extension `.feather`)")
+    prosodic.add_argument("--no-csv-cache", action="store_true",
+                          help="always read the CSV file, without a cache")
+
+    join = subparsers.add_parser(
+        "join", help="attach the labels of the word, phone and realization "
+        "tiers to the rows of a CSV file, by time")
+    join.add_argument("--csv", required=True,
+                      help="UTF-16 CSV file with the intervals per informant")
+    join.add_argument("--input-path", required=True,
+                      help="folder with the TextGrids")
+    join.add_argument("--output",
+                      help="CSV file for the joined rows (default: next to "
+                      "the CSV file, ending in `_joined.csv`)")
+    join.add_argument("--tiers", nargs="+",
+                      default=["word", "phone", "realization"],
+                      help="tiers whose labels are attached (default: word "
+                      "phone realization)")
+    join.add_argument("--mode", default="overlap",
+                      choices=["overlap", "within", "contains"],
+                      help="entries that overlap a row's interval, lie "
+                      "within it or contain it (default: overlap)")
+    join.add_argument("--csv-cache",
+                      help="Feather file caching the rows of the CSV file")
+
+    for subparser in (modify, watch, prosodic):
+        subparser.add_argument("--tier-config", metavar="PATH",
+                               help="JSON file setting the tiers of the "
+                               "output TextGrids (default: in "
+                               "`tier_configs/`, see TextGrid_transform.py)")
+        subparser.add_argument("--export-path", metavar="PATH",
+                               help="folder of the dataset the tiers are "
+                               "exported to (default: `textgrid_tiers/` in "
+                               "the output path)")
+        subparser.add_argument("--export-format", default="parquet",
+                               choices=["parquet", "feather"],
+                               help="file format of the exported tiers "
+                               "(default: parquet)")
+        subparser.add_argument("--no-export", action="store_true",
+                               help="do not export the tiers")
+
+    for subparser in (generate, modify, prosodic):
+        subparser.add_argument("--force", action="store_true",
+                               help="regenerate all TextGrids, also "
+                               "unchanged ones")
+
+    for subparser in (generate, modify, watch, prosodic, join):
+        subparser.add_argument("--pattern",
+                               help="only process the input files whose "
+                               "filename matches this glob pattern, e.g. "
+                               "'FO1*'")
+
+    for subparser in (generate, modify, prosodic, join):
+        subparser.add_argument("--profile", metavar="PATH",
+                               help="append the time, items and peak memory "
+                               "of each stage per file to this JSON lines "
+                               "file")
+        subparser.add_argument("--profile-slowest", type=int, default=0,
+                               metavar="N",
+                               help="with --profile, also keep cProfile "
+                               "statistics of the N slowest files")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run = load_command(args.command)
+    options = dict(pattern=args.pattern)
+    if args.command != "watch":
+        options.update(profile_path=args.profile,
+                       profile_slowest=args.profile_slowest)
+    if getattr(args, "tier_config", None):
+        options["tier_config_path"] = args.tier_config
+    if args.command in ("modify", "watch", "prosodic-annotate"):
+        options.update(export=not args.no_export,
+                       export_path=args.export_path,
+                       export_format=args.export_format)
+
+    if args.command == "generate":
+        run(args.input_path, audio_input_path=args.audio_path,
+            textgrid_output_path=args.output_path, force=args.force,
+            duration_catalog_path=args.duration_catalog,
+            duration_export_path=args.export_durations,
+            workers=args.duration_workers, **options)
+    elif args.command == "modify":
+        run(args.input_path, args.output_path, args.translation_cache,
+            force=args.force, backend=args.backend,
+            batch_mode=not args.serial, workers=args.workers,
+            chunksize=args.chunksize, max_in_flight=args.max_in_flight,
+            rate=args.rate, retries=args.retries, timeout=args.timeout,
+            **options)
+    elif args.command == "watch":
+        run(args.input_path, args.output_path, args.translation_cache,
+            backend=args.backend, workers=args.workers,
+            max_in_flight=args.max_in_flight, rate=args.rate,
+            retries=args.retries, timeout=args.timeout,
+            interval=args.interval, settle=args.settle,
+            stop_after=args.stop_after, **options)
+    elif args.command == "join":
+        run(args.csv, args.input_path, args.output,
+            tier_names=args.tiers, mode=args.mode,
+            csv_cache_path=args.csv_cache, **options)
+    else:
+        run(args.csv, args.input_path, args.output_path, force=args.force,
+            csv_cache_path=args.csv_cache, csv_cache=not args.no_csv_cache,
+            **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
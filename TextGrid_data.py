@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Loading of the CSV input data of the TextGrid scripts.
+
+The CSV files are read as a stream of rows, keeping only the columns that are
+needed, and indexed once per run, so that the rows belonging to an audio file
+or participant can be looked up directly instead of scanning the whole sheet
+for every file. Sheets too large to index can be processed one participant at
+a time, once sorted by participant (see `group_sorted_rows` and `sort_csv`).
+The UTF-16 annotation sheet of the prosodic annotation is read in chunks with
+only the needed columns and rows, and cached as a memory-mapped Feather file
+(see `read_annotation_csv`).
+
+File:
+    TextGrid_data.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+
+import csv
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from collections import namedtuple
+from operator import attrgetter, itemgetter
+
+
+def iter_csv_rows(path, fields=None, delimiter=";", encoding="utf-8-sig"):
+    """Yield the rows of a CSV file one at a time.
+
+    With `fields`, each row is a namedtuple of only those columns (accessible
+    as e.g. `row.duration`); otherwise it is a dict of all columns. Blank
+    lines are skipped, like `csv.DictReader` does. Raises `ValueError` if a
+    row is too short to have one of `fields`.
+    """
+    with open(path, "r", encoding=encoding, newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        if fields is None:
+            for values in reader:
+                if values:
+                    yield dict(zip(header, values))
+            return
+
+        Row = namedtuple("Row", fields)
+        columns = [header.index(field) for field in fields]
+        last_column = max(columns, default=-1)
+        for values in reader:
+            if not values:
+                continue
+            if len(values) <= last_column:
+                missing = next(field for field, column in zip(fields, columns)
+                               if column >= len(values))
+                raise ValueError(f"{path}, line {reader.line_num}: the row "
+                                 f"has no '{missing}' column")
+            yield Row(*[values[column] for column in columns])
+
+
+def index_csv(path, key_fields, fields, delimiter=";", encoding="utf-8-sig"):
+    """Index the rows of a CSV file by one or more key columns.
+
+    Returns nested dicts, one level per column in `key_fields`, ending in the
+    lists of rows (namedtuples of `fields`) with those key values, e.g.
+    `index[audio_filename][participant]`. Keys and rows keep the order in
+    which they appear in the file. Only `fields` of each row are kept, and
+    the file is read as a stream, so memory is proportional to the indexed
+    values rather than to the whole sheet.
+    """
+    index = {}
+    rows = iter_csv_rows(path, fields=(*key_fields, *fields),
+                         delimiter=delimiter, encoding=encoding)
+    Row = namedtuple("Row", fields)
+    n_keys = len(key_fields)
+    for row in rows:
+        level = index
+        for key in row[:n_keys - 1]:
+            level = level.setdefault(key, {})
+        level.setdefault(row[n_keys - 1], []).append(Row(*row[n_keys:]))
+    return index
+
+
+# %% Streaming over sorted sheets
+def group_sorted_rows(rows, key_field):
+    """Yield `(key, rows)` for each run of rows with the same `key_field`.
+
+    `rows` are dicts or namedtuples, as from `iter_csv_rows`, and must be
+    grouped by `key_field` (e.g. sorted with `sort_csv`). Only the rows of
+    one key are held in memory at a time. Raises `ValueError` if a key
+    occurs again after its run of rows has ended.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    get_key = (itemgetter(key_field) if isinstance(first, dict)
+               else attrgetter(key_field))
+    seen = set()
+    for key, group in itertools.groupby(itertools.chain([first], rows),
+                                        key=get_key):
+        if key in seen:
+            raise ValueError(f"The rows are not grouped by '{key_field}': "
+                             f"'{key}' occurs again after other rows. Sort "
+                             "the file first, e.g. with `sort_csv`.")
+        seen.add(key)
+        yield key, list(group)
+
+
+def sort_csv(path, key_field, output_path, chunk_rows=200000, delimiter=";",
+             encoding="utf-8-sig"):
+    """Sort a CSV file by `key_field` with an external merge sort.
+
+    The rows are sorted in chunks of `chunk_rows`, which are written to
+    temporary files next to `output_path` and then merged, so memory is
+    bounded by the chunk size rather than by the file. The sort is stable:
+    the rows of a key keep their order in the file. Returns `output_path`.
+    """
+    with open(path, "r", encoding=encoding, newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        get_key = itemgetter(header.index(key_field))
+        chunk_paths = []
+        try:
+            while True:
+                # Blank lines are dropped, as `iter_csv_rows` skips them
+                chunk = list(itertools.islice(filter(None, reader),
+                                              chunk_rows))
+                if not chunk:
+                    break
+                chunk.sort(key=get_key)
+                descriptor, chunk_path = tempfile.mkstemp(
+                    suffix=".csv", dir=os.path.dirname(output_path) or None)
+                chunk_paths.append(chunk_path)
+                with open(descriptor, "w", encoding="utf-8",
+                          newline="") as chunk_file:
+                    csv.writer(chunk_file, delimiter=delimiter).writerows(
+                        chunk)
+                del chunk
+
+            chunk_files = [open(chunk_path, "r", encoding="utf-8",
+                                newline="")
+                           for chunk_path in chunk_paths]
+            try:
+                # `heapq.merge` takes equal keys from the earlier chunk first,
+                # which keeps the sort stable
+                with open(output_path, "w", encoding=encoding,
+                          newline="") as output:
+                    writer = csv.writer(output, delimiter=delimiter)
+                    writer.writerow(header)
+                    writer.writerows(heapq.merge(
+                        *[csv.reader(chunk_file, delimiter=delimiter)
+                          for chunk_file in chunk_files], key=get_key))
+            finally:
+                for chunk_file in chunk_files:
+                    chunk_file.close()
+        finally:
+            for chunk_path in chunk_paths:
+                os.remove(chunk_path)
+    return output_path
+
+
+# %% Annotation sheets
+# Columns of the annotation sheet (e.g. `NWD_june23.csv`) that are read. The
+# other columns are skipped while parsing.
+ANNOTATION_COLUMNS = ["Informant", "UniqueNumb", "SoundMatch",
+                      "Begin.Time...ss.msec", "End.Time...ss.msec",
+                      "Realization"]
+ANNOTATION_DTYPES = {"Informant": str, "UniqueNumb": str, "SoundMatch": str,
+                     "Begin.Time...ss.msec": "float64",
+                     "End.Time...ss.msec": "float64", "Realization": str}
+# Columns stored as `category`: few distinct values, repeated over many rows
+ANNOTATION_CATEGORIES = ["Informant", "UniqueNumb", "Realization"]
+# Bump when the cached columns or filters change, to invalidate old caches
+ANNOTATION_CACHE_VERSION = "2"
+
+
+def read_annotation_csv(path, informants=None, cache_path=None,
+                        chunk_rows=100000, encoding="utf-16"):
+    """Read the intervals of an annotation sheet into a compact DataFrame.
+
+    Only the columns in `ANNOTATION_COLUMNS` are parsed, in chunks of
+    `chunk_rows` rows, and each chunk is filtered as it is read: rows whose
+    `SoundMatch` contains "emb" (the embedding experiment) are dropped, and
+    with `informants`, so are the rows of other informants. Memory is thus
+    bounded by a chunk and the rows kept, rather than by the whole sheet.
+    `SoundMatch` is dropped after filtering, the times are float64 and the
+    other columns `category`, with `UniqueNumb` and `Realization` kept as
+    the text in the sheet. The rows keep their order in the sheet.
+
+    With `cache_path`, the rows kept are cached there as an uncompressed
+    Feather file, stamped with `informants`. Later runs memory-map it
+    instead of parsing the sheet again, as long as the size and modification
+    time of the sheet are unchanged and the cache holds the rows of all of
+    their informants (a cache without `informants` holds every informant).
+    Otherwise the sheet is parsed again, and the cache replaced. Caching
+    needs `pyarrow`; without it, the sheet is read as if no cache was given.
+    """
+    if cache_path is not None:
+        try:
+            import pyarrow  # noqa: F401 (If error, try: `pip install pyarrow`)
+        except ImportError:
+            print("Not caching the annotation sheet, since `pyarrow` is not "
+                  "installed.")
+            cache_path = None
+
+    if cache_path is None:
+        return _parse_annotation_csv(path, informants, chunk_rows, encoding)
+
+    source = _source_stamp(path)
+    df = _read_annotation_cache(cache_path, source, informants)
+    if df is None:
+        df = _parse_annotation_csv(path, informants, chunk_rows, encoding)
+        _write_annotation_cache(df, cache_path, source, informants)
+    return df
+
+
+def _parse_annotation_csv(path, informants, chunk_rows, encoding):
+    import pandas as pd
+
+    columns = [column for column in ANNOTATION_COLUMNS
+               if column != "SoundMatch"]
+    if informants is not None:
+        informants = set(informants)
+    parts = []
+    with pd.read_csv(path, encoding=encoding, usecols=ANNOTATION_COLUMNS,
+                     dtype=ANNOTATION_DTYPES, chunksize=chunk_rows) as chunks:
+        for chunk in chunks:
+            keep = ~chunk["SoundMatch"].str.contains("emb", na=False)
+            if informants is not None:
+                keep &= chunk["Informant"].isin(informants)
+            parts.append(chunk.loc[keep, columns])
+    if parts:
+        df = pd.concat(parts, ignore_index=True)
+    else:
+        df = pd.DataFrame({column: pd.Series(dtype=ANNOTATION_DTYPES[column])
+                           for column in columns})
+    return df.astype({column: "category" for column in ANNOTATION_CATEGORIES})
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"source_size": str(stat.st_size),
+            "source_mtime_ns": str(stat.st_mtime_ns),
+            "cache_version": ANNOTATION_CACHE_VERSION}
+
+
+def _read_annotation_cache(cache_path, source, informants):
+    """Return the cached rows if the cache matches `source`, else `None`."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        table = feather.read_table(cache_path, memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = {key.decode(): value.decode()
+                for key, value in (table.schema.metadata or {}).items()}
+    if any(metadata.get(key) != value for key, value in source.items()):
+        return None
+    cached_informants = json.loads(metadata.get("informants", "null"))
+    if cached_informants is not None and (
+            informants is None
+            or not set(informants) <= set(cached_informants)):
+        return None
+
+    # Only the rows of `informants` are read from the memory-mapped file
+    if informants is not None and table.num_rows:
+        column_type = table.schema.field("Informant").type
+        if pa.types.is_dictionary(column_type):
+            column_type = column_type.value_type
+        table = table.filter(pc.is_in(
+            table["Informant"],
+            value_set=pa.array(list(informants), type=column_type)))
+    return table.to_pandas()
+
+
+def _write_annotation_cache(df, cache_path, source, informants):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    stamp = {**source, "informants": json.dumps(
+        None if informants is None else sorted(informants))}
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        **{key.encode(): value.encode() for key, value in stamp.items()}})
+    # Write to a temporary file first, so that an interrupted run cannot
+    # leave a truncated cache behind
+    temporary_path = cache_path + ".tmp"
+    feather.write_feather(table, temporary_path, compression="uncompressed")
+    os.replace(temporary_path, cache_path)
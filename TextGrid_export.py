@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Export of the tiers of processed TextGrids to a columnar dataset.
+
+While the TextGrids are modified, the tiers of each output TextGrid are also
+written to a dataset with a row per interval or point, and the columns
+
+    file, participant, tier, start, end, label
+
+(`end` is null for the points of point tiers), so that analyses can read the
+intervals of a whole corpus at once instead of parsing every TextGrid again:
+
+    import pandas as pd
+    df = pd.read_parquet("modified_textgrids/textgrid_tiers")
+
+The dataset is a folder partitioned by participant
+(`participant=FO03/1203_FO03.parquet`), with one compressed Parquet (or
+Feather) file per TextGrid, written next to the TextGrid. Files are thus
+written by the worker processes in parallel, and a TextGrid that is skipped
+as unchanged keeps its file from an earlier run. The `participant` column
+is given by the folder names, as with `pyarrow.dataset` and
+`pandas.read_parquet`. This needs `pyarrow`.
+
+File:
+    TextGrid_export.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+
+from TextGrid_tiers import ArrayTier
+
+EXPORT_FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def export_available():
+    """Return whether tiers can be exported, i.e. `pyarrow` is installed.
+
+    `pyarrow` is only looked up, not imported, since the tiers are written
+    by the worker processes and the main process does not need it.
+    """
+    # If not found, try: `pip install pyarrow`
+    if importlib.util.find_spec("pyarrow") is None:
+        print("Not exporting the tiers, since `pyarrow` is not installed.")
+        return False
+    return True
+
+
+def part_path(dataset_path, textgrid_filename, participant,
+              format="parquet"):
+    """Return the path of the file of `textgrid_filename` in the dataset."""
+    return os.path.join(dataset_path, f"participant={participant}",
+                        os.path.splitext(textgrid_filename)[0]
+                        + EXPORT_FORMATS[format])
+
+
+def is_up_to_date(manifest, textgrid_filename, digest, participant,
+                  dataset_path, format="parquet"):
+    """Return whether `textgrid_filename` need not be written again.
+
+    It is up to date if `manifest` (a `Manifest`, see `TextGrid_batch.py`)
+    has it with `digest` and, when the tiers are exported (`dataset_path` is
+    not `None`), its file in the dataset exists, so that TextGrids that are
+    not exported yet, e.g. from before exporting was enabled, are written
+    again.
+    """
+    return manifest.is_up_to_date(textgrid_filename, digest) and (
+        dataset_path is None or os.path.exists(part_path(
+            dataset_path, textgrid_filename, participant, format)))
+
+
+def tier_table(tg, textgrid_filename):
+    """Return the entries of the tiers of `tg` as a `pyarrow.Table`.
+
+    The `file`, `tier` and `label` columns are dictionary encoded. The
+    participant is left to the partition of the dataset.
+    """
+    import pyarrow as pa
+
+    tiers = [tier if isinstance(tier, ArrayTier) else ArrayTier.from_tier(tier)
+             for tier in tg.tiers]
+    counts = [len(tier.codes) for tier in tiers]
+    n_rows = sum(counts)
+    ends = [tier.starts if tier.ends is None else tier.ends
+            for tier in tiers]
+    is_point = np.repeat([tier.ends is None for tier in tiers], counts)
+
+    # The labels of all tiers, encoded once against their distinct labels.
+    # Tiers of one TextGrid may use different label tables.
+    labels, label_indices = [], []
+    for tier in tiers:
+        codes, inverse = np.unique(tier.codes, return_inverse=True)
+        label_indices.append(inverse.reshape(-1) + len(labels))
+        labels.extend(tier.table.lookup(codes))
+    label_indices = (np.concatenate(label_indices) if label_indices
+                     else np.empty(0, dtype=np.int64))
+    labels, relabel = np.unique(np.array(labels, dtype=object),
+                                return_inverse=True)
+
+    return pa.table({
+        "file": pa.DictionaryArray.from_arrays(
+            np.zeros(n_rows, dtype=np.int32), [textgrid_filename]),
+        "tier": pa.DictionaryArray.from_arrays(
+            np.repeat(np.arange(len(tiers), dtype=np.int32), counts),
+            pa.array([tier.name for tier in tiers], type=pa.string())),
+        "start": pa.array(np.concatenate([tier.starts for tier in tiers])
+                          if tiers else np.empty(0), type=pa.float64()),
+        "end": pa.array(np.concatenate(ends) if tiers else np.empty(0),
+                        mask=is_point, type=pa.float64()),
+        "label": pa.DictionaryArray.from_arrays(
+            relabel.reshape(-1)[label_indices].astype(np.int32),
+            pa.array(labels.tolist(), type=pa.string())),
+    })
+
+
+def export_tiers(tg, textgrid_filename, participant, dataset_path,
+                 format="parquet"):
+    """Write the tiers of `tg` to its file in the dataset, return its path.
+
+    The file is written to a temporary file first, so that an interrupted
+    run cannot leave a truncated file in the dataset. Its name starts with
+    a dot, so that readers of the dataset skip it.
+    """
+    path = part_path(dataset_path, textgrid_filename, participant, format)
+    folder, filename = os.path.split(path)
+    os.makedirs(folder, exist_ok=True)
+    table = tier_table(tg, textgrid_filename)
+    temporary_path = os.path.join(folder, f".{filename}.tmp")
+    if format == "parquet":
+        import pyarrow.parquet as parquet
+        parquet.write_table(table, temporary_path, compression="zstd")
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, temporary_path, compression="zstd")
+    os.replace(temporary_path, path)
+    return path
+
+
+def open_dataset(dataset_path, format="parquet"):
+    """Open an exported dataset as a `pyarrow.dataset.Dataset`.
+
+    Queries on it, e.g. `dataset.to_table(filter=...)`, read only the files
+    and columns they need. Participant IDs are read as strings, also those
+    that look like numbers.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.dataset(dataset_path,
+                      format="ipc" if format == "feather" else format,
+                      partitioning=ds.partitioning(
+                          pa.schema([("participant", pa.string())]),
+                          flavor="hive"))
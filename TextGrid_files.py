@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Discovery of the input files of the TextGrid scripts.
+
+Each input folder is listed once per run with `os.scandir`, which returns the
+file type (and on Windows the size and modification time) with the listing
+itself, instead of listing it anew for every stage and filtering by
+extension each time. The result is an index of `InputFile`s, with the path,
+stem, participant ID, size and modification time of each file, shared by
+all stages of a run. This matters most on network-mounted folders (e.g.
+OneDrive or SMB shares) with many thousands of files, where each listing is
+slow.
+
+File:
+    TextGrid_files.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import fnmatch
+import os
+import time
+from collections import namedtuple
+
+# A file found in an input folder. `name` is the path relative to the folder
+# that was scanned (the filename, unless scanned recursively), and `stem` the
+# filename without its extension. `mtime_ns` is the modification time in
+# nanoseconds.
+InputFile = namedtuple("InputFile", ["path", "name", "stem", "extension",
+                                     "participant", "size", "mtime_ns"])
+
+
+def participant_id(stem):
+    """Return the participant ID of a file from its stem.
+
+    Files are named either after the participant (`FO03.TextGrid`) or after
+    the item and participant (`1203_FO03.wav`), so the ID is the part of the
+    stem after the last underscore.
+    """
+    return stem.rsplit("_", 1)[-1]
+
+
+def scan_files(root, extensions=None, pattern=None, recursive=False,
+               participant=participant_id):
+    """Return the files in the folder `root` as a list of `InputFile`s.
+
+    Only files with an extension in `extensions` (e.g. `(".wav",)`, matched
+    case-sensitively) are kept, and with `pattern`, only files whose
+    filename matches that glob pattern (e.g. `"FO1*"`). With
+    `recursive=True`, subfolders are scanned too (without following
+    symbolic links to folders). The participant ID of each file is
+    `participant(stem)`. The files are sorted by `name`, so that runs
+    process them in the same order on every platform.
+    """
+    if extensions is not None:
+        extensions = tuple(extensions)
+    files = []
+    folders = [root]
+    while folders:
+        folder = folders.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if recursive and entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                    continue
+                stem, extension = os.path.splitext(entry.name)
+                if extensions is not None and extension not in extensions:
+                    continue
+                if pattern is not None and not fnmatch.fnmatch(entry.name,
+                                                               pattern):
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append(InputFile(
+                    entry.path, os.path.relpath(entry.path, root), stem,
+                    extension, participant(stem), stat.st_size,
+                    stat.st_mtime_ns))
+    files.sort(key=lambda input_file: input_file.name)
+    return files
+
+
+class FolderWatcher:
+    """Polls a folder for new and changed files.
+
+    Each `poll()` lists the folder once with `scan_files` (with the same
+    `extensions` and `pattern`) and returns the files that are new or have
+    changed since they were last returned. Files that are still being
+    written are held back: a file is only returned once its size and
+    modification time are the same as at the previous poll, and it was last
+    modified at least `settle` seconds ago. With `initial=False`, the files
+    already in the folder at the first poll are not returned, unless they
+    change later.
+    """
+
+    def __init__(self, root, extensions=None, pattern=None, settle=2.0,
+                 initial=True):
+        self.root = root
+        self.extensions = extensions
+        self.pattern = pattern
+        self.settle = settle
+        self.initial = initial
+        self.returned = {}
+        self.previous = None
+
+    def poll(self):
+        files = scan_files(self.root, extensions=self.extensions,
+                           pattern=self.pattern)
+        current = {input_file.name: (input_file.size, input_file.mtime_ns)
+                   for input_file in files}
+        if self.previous is None and not self.initial:
+            self.returned = dict(current)
+        # Forget deleted files, so that they are returned if they come back
+        for name in set(self.returned) - set(current):
+            del self.returned[name]
+
+        now_ns = time.time_ns()
+        ready = []
+        for input_file in files:
+            stamp = current[input_file.name]
+            if (self.returned.get(input_file.name) != stamp
+                    and self.previous is not None
+                    and self.previous.get(input_file.name) == stamp
+                    and now_ns - input_file.mtime_ns >= self.settle * 1e9):
+                self.returned[input_file.name] = stamp
+                ready.append(input_file)
+        self.previous = current
+        return ready
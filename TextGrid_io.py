@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""Fast reading and writing of Praat TextGrid files.
+
+praatio parses TextGrids with a regular expression search per field and
+builds its output by string concatenation, which is slow for long recordings
+with dense phone tiers. The reader here tokenizes a long or short text
+TextGrid in a single pass and keeps the intervals of each tier in arrays. The
+writer produces exactly the same text as praatio's `Textgrid.save` for the
+long and short formats, and writes it through one buffered file object.
+
+https://www.fon.hum.uva.nl/praat/manual/TextGrid_file_formats.html
+
+File:
+    TextGrid_io.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+
+import os
+import re
+from array import array
+from collections import namedtuple
+
+import numpy as np
+from praatio import textgrid
+from praatio.utilities.constants import MIN_INTERVAL_LENGTH
+
+INTERVAL_TIER = "IntervalTier"
+POINT_TIER = "TextTier"
+
+# The header of a long TextGrid, up to its first value
+_LONG_HEADER = re.compile(r"[^\n]*\n[^\n]*\n\s*xmin = ")
+
+# The values of a long TextGrid all follow "= ": a quoted string (with "" as an
+# escaped quote) or a number
+_LONG_TOKEN = re.compile(r'= ("(?:[^"]|"")*"|\S+)')
+
+# The values of a short TextGrid: a quoted string, an index in brackets as in
+# `item [1]:`, which is skipped, or a number. Anything else, like `<exists>`,
+# is skipped as well, so both formats give the same sequence of values.
+_SHORT_TOKEN = re.compile(r'("(?:[^"]|"")*")|\[\s*\d*\s*\]'
+                          r'|(-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+
+# A line that starts a quoted string but does not hold exactly that string,
+# as with labels that span several lines
+_PARTIAL_STRING_LINE = re.compile(r'^"(?:[^"\n]|"")*(?:$|"[^\n])', re.M)
+
+
+class TierData(namedtuple("TierData", ["kind", "name", "xmin", "xmax",
+                                       "starts", "ends", "labels"])):
+    """A tier as arrays: `starts` and `ends` (`None` for point tiers) are
+    `array("d")` of times, `labels` a list of strings."""
+
+    __slots__ = ()
+
+    @property
+    def entries(self):
+        if self.kind == INTERVAL_TIER:
+            return list(zip(self.starts, self.ends, self.labels))
+        return list(zip(self.starts, self.labels))
+
+
+class TextGridData(namedtuple("TextGridData", ["xmin", "xmax", "tiers"])):
+    """A TextGrid as returned by `read_textgrid`."""
+
+    __slots__ = ()
+
+    @property
+    def tier_names(self):
+        return [tier.name for tier in self.tiers]
+
+    def get_tier(self, name):
+        return self.tiers[self._index(name)]
+
+    def _index(self, name):
+        for index, tier in enumerate(self.tiers):
+            if tier.name == name:
+                return index
+        raise KeyError(f"No tier named '{name}'")
+
+    # The methods below change `tiers` in place, like the praatio methods of
+    # the same names. The tiers are `TierData` or `ArrayTier` (see
+    # `TextGrid_tiers.py`).
+    def add_tier(self, tier):
+        if tier.name in self.tier_names:
+            raise ValueError(f"There already is a tier named '{tier.name}'")
+        self.tiers.append(tier)
+
+    def remove_tier(self, name):
+        return self.tiers.pop(self._index(name))
+
+    def rename_tier(self, name, new_name):
+        index = self._index(name)
+        self.tiers[index] = self.tiers[index]._replace(name=new_name)
+
+
+# %% Reading
+def _read_text(path):
+    # Praat writes TextGrids as UTF-16 (with a byte order mark) or UTF-8
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return data.decode("utf-16")
+    return data.decode("utf-8-sig")
+
+
+def parse_textgrid(text, include_empty_intervals=True):
+    """Parse the text of a long or short TextGrid into a `TextGridData`."""
+    # Numbers are kept as strings here and converted per tier in bulk, and
+    # strings keep their quotes
+    if _LONG_HEADER.match(text):
+        tokens = _LONG_TOKEN.findall(text)
+    else:
+        tokens = _short_tokens(text)
+    if (len(tokens) < 5 or not _unescape(tokens[0]).startswith("ooTextFile")
+            or _unescape(tokens[1]) != "TextGrid"):
+        raise ValueError("Not a text TextGrid file")
+
+    xmin, xmax, n_tiers = float(tokens[2]), float(tokens[3]), int(tokens[4])
+    position = 5
+    tiers = []
+    for _ in range(n_tiers):
+        kind, name, tier_xmin, tier_xmax, size = \
+            tokens[position:position + 5]
+        kind = _unescape(kind)
+        position += 5
+        size = int(size)
+        if kind == INTERVAL_TIER:
+            block = tokens[position:position + 3 * size]
+            position += 3 * size
+            starts = array("d", map(float, block[0::3]))
+            ends = array("d", map(float, block[1::3]))
+            labels = [_unescape(label) for label in block[2::3]]
+        elif kind == POINT_TIER:
+            block = tokens[position:position + 2 * size]
+            position += 2 * size
+            starts = array("d", map(float, block[0::2]))
+            ends = None
+            labels = [_unescape(label) for label in block[1::2]]
+        else:
+            raise ValueError(f"Unknown tier class '{kind}'")
+        if len(labels) != size:
+            raise ValueError(f"Tier '{name}' ends prematurely")
+
+        tier = TierData(kind, _unescape(name, strip=False), float(tier_xmin),
+                        float(tier_xmax), starts, ends, labels)
+        if not include_empty_intervals:
+            tier = _remove_blanks(tier)
+        if tier.labels:
+            # As praatio, widen the tier and the TextGrid to their entries
+            tier = tier._replace(
+                xmin=min(tier.xmin, min(tier.starts)),
+                xmax=max(tier.xmax, max(tier.starts if tier.ends is None
+                                        else tier.ends)))
+        xmin, xmax = min(xmin, tier.xmin), max(xmax, tier.xmax)
+        tiers.append(tier)
+
+    return TextGridData(xmin, xmax, tiers)
+
+
+def _short_tokens(text):
+    # Praat writes every value of a short TextGrid on a line of its own, so
+    # the lines are the values unless a label spans several lines
+    lines = text.split("\n")
+    if len(lines) < 3 or "\r" in text or _PARTIAL_STRING_LINE.search(text):
+        return [string or number
+                for string, number in _SHORT_TOKEN.findall(text)
+                if string or number]
+    return (_LONG_TOKEN.findall("\n".join(lines[:2]))
+            + [line for line in lines[2:] if line and line != "<exists>"])
+
+
+def _unescape(token, strip=True):
+    # The string in a quoted token
+    label = token[1:-1]
+    if strip:
+        label = label.strip()
+    if '"' in label:
+        label = label.replace('""', '"')
+    return label
+
+
+def _remove_blanks(tier):
+    keep = [i for i, label in enumerate(tier.labels) if label != ""]
+    return tier._replace(
+        starts=array("d", [tier.starts[i] for i in keep]),
+        ends=(None if tier.ends is None
+              else array("d", [tier.ends[i] for i in keep])),
+        labels=[tier.labels[i] for i in keep])
+
+
+def read_textgrid(path, include_empty_intervals=True):
+    """Read a long or short text TextGrid file into a `TextGridData`."""
+    return parse_textgrid(_read_text(path), include_empty_intervals)
+
+
+def to_praatio(tg_data):
+    """Convert a `TextGridData` into a praatio `Textgrid`."""
+    tg = textgrid.Textgrid()
+    tg.minTimestamp = tg_data.xmin
+    tg.maxTimestamp = tg_data.xmax
+    for tier in tg_data.tiers:
+        if tier.kind == INTERVAL_TIER:
+            klass = textgrid.IntervalTier
+        else:
+            klass = textgrid.PointTier
+        tg.addTier(klass(tier.name, tier.entries, tier.xmin, tier.xmax))
+    return tg
+
+
+def open_textgrid(path, include_empty_intervals=True):
+    """Drop-in for praatio's `textgrid.openTextgrid` using the fast reader.
+
+    JSON TextGrids are left to praatio.
+    """
+    try:
+        tg_data = read_textgrid(path, include_empty_intervals)
+    except ValueError:
+        return textgrid.openTextgrid(path, include_empty_intervals)
+    return to_praatio(tg_data)
+
+
+# %% Writing
+def _num(value):
+    # As `praatio.utilities.my_math.numToStr`
+    integer = int(value)
+    if abs(value - integer) <= 1e-14 * max(abs(value), abs(integer)):
+        return "%d" % value
+    return repr(value)
+
+
+def _fill_in_blanks(entries, min_time, max_time):
+    # As praatio's `_fillInBlanks`: cover the gaps between intervals, and
+    # before the first and after the last, with empty intervals
+    if not entries:
+        entries = [(min_time, max_time, "")]
+    filled = [entries[0]]
+    previous_end = float(entries[0][1])
+    for entry in entries[1:]:
+        start = float(entry[0])
+        if previous_end < start:
+            filled.append((previous_end, start, ""))
+        filled.append(entry)
+        previous_end = float(entry[1])
+
+    if float(filled[0][0]) < float(min_time):
+        raise ValueError("The entries are shorter than the min time "
+                         "specified in the textgrid.")
+    if float(filled[0][0]) > float(min_time):
+        filled.insert(0, (min_time, filled[0][0], ""))
+    if float(filled[-1][1]) > float(max_time):
+        raise ValueError("The entries are longer than the max time "
+                         "specified in the textgrid.")
+    if float(filled[-1][1]) < float(max_time):
+        filled.append((filled[-1][1], max_time, ""))
+
+    filled.sort()
+    return filled
+
+
+def _remove_ultrashort_intervals(entries, min_length, min_time):
+    # As praatio's `_removeUltrashortIntervals`: fold intervals shorter than
+    # `min_length` into the previous one, then close tiny gaps
+    kept = []
+    for start, end, label in entries:
+        if end - start < min_length:
+            if kept:
+                last_start, _, last_label = kept[-1]
+                kept[-1] = (last_start, end, last_label)
+        elif not kept and start != min_time:
+            kept.append((min_time, end, label))
+        else:
+            kept.append((start, end, label))
+
+    for j in range(len(kept) - 1):
+        difference = abs(kept[j][1] - kept[j + 1][0])
+        if 0 < difference < min_length:
+            kept[j] = (kept[j][0], kept[j + 1][0], kept[j][2])
+    return kept
+
+
+def _tiers_for_saving(tg):
+    # (kind, name, xmin, xmax, columns) of each tier, from either a praatio
+    # Textgrid or a TextGridData. `columns` is (starts, ends, labels) for an
+    # interval tier and (times, labels) for a point tier.
+    if isinstance(tg, TextGridData):
+        return [(tier.kind, tier.name, tier.xmin, tier.xmax,
+                 (tier.starts, tier.labels) if tier.ends is None
+                 else (tier.starts, tier.ends, tier.labels))
+                for tier in tg.tiers]
+    return [(tier.tierType, tier.name, tier.minTimestamp, tier.maxTimestamp,
+             tuple(zip(*tier.entries))
+             or (((), (), ()) if tier.tierType == INTERVAL_TIER else ((), ())))
+            for tier in tg.tiers]
+
+
+def _prepare_entries(kind, columns, min_time, max_time, include_blank_spaces,
+                     minimum_interval_length):
+    if kind == INTERVAL_TIER:
+        prepared = _prepare_intervals(*columns, min_time, max_time,
+                                      include_blank_spaces,
+                                      minimum_interval_length)
+        if prepared is not None:
+            return prepared
+
+    entries = sorted(zip(*columns))
+    if include_blank_spaces and kind == INTERVAL_TIER:
+        entries = _fill_in_blanks(entries, min_time, max_time)
+        if minimum_interval_length is not None:
+            entries = _remove_ultrashort_intervals(
+                entries, minimum_interval_length, min_time)
+        entries.sort()
+    return tuple(zip(*entries)) or tuple(() for _ in columns)
+
+
+def _prepare_intervals(starts, ends, labels, min_time, max_time,
+                       include_blank_spaces, minimum_interval_length):
+    # `_prepare_entries` for an interval tier on arrays. Returns `None` for
+    # the rare tiers that need the general path: identical intervals, which
+    # are ordered by label, and intervals or gaps shorter than the minimum.
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    labels = np.asarray(labels, dtype=object)
+    if not len(starts):
+        return None
+    order = np.lexsort((ends, starts))
+    starts, ends, labels = starts[order], ends[order], labels[order]
+    if ((starts[1:] == starts[:-1]) & (ends[1:] == ends[:-1])).any():
+        return None
+    if not include_blank_spaces:
+        return starts, ends, labels
+
+    gaps = np.flatnonzero(ends[:-1] < starts[1:]) + 1
+    starts, ends, labels = (np.insert(starts, gaps, ends[gaps - 1]),
+                            np.insert(ends, gaps, starts[gaps]),
+                            np.insert(labels, gaps, ""))
+    if starts[0] < float(min_time):
+        raise ValueError("The entries are shorter than the min time "
+                         "specified in the textgrid.")
+    if starts[0] > float(min_time):
+        starts, ends, labels = (np.insert(starts, 0, min_time),
+                                np.insert(ends, 0, starts[0]),
+                                np.insert(labels, 0, ""))
+    if ends[-1] > float(max_time):
+        raise ValueError("The entries are longer than the max time "
+                         "specified in the textgrid.")
+    if ends[-1] < float(max_time):
+        starts, ends, labels = (np.append(starts, ends[-1]),
+                                np.append(ends, max_time),
+                                np.append(labels, ""))
+
+    if minimum_interval_length is not None:
+        gaps = np.abs(ends[:-1] - starts[1:])
+        if (((ends - starts) < minimum_interval_length).any()
+                or ((gaps > 0) & (gaps < minimum_interval_length)).any()):
+            return None
+    return starts, ends, labels
+
+
+def _format_times(columns):
+    # `_num` on whole columns of times, with each distinct time formatted
+    # only once: the end of an interval is usually the start of the next one
+    values, inverse = np.unique(
+        np.concatenate([np.asarray(column, dtype=float)
+                        for column in columns]), return_inverse=True)
+    integers = np.trunc(values)
+    whole = (np.abs(values - integers)
+             <= 1e-14 * np.maximum(np.abs(values), np.abs(integers)))
+    texts = np.array(["%d" % value if is_whole else repr(value)
+                      for value, is_whole
+                      in zip(values.tolist(), whole.tolist())] or [""],
+                     dtype=object)[inverse]
+    return np.split(texts, len(columns)) if columns else []
+
+
+def _escape(labels):
+    return [label.replace('"', '""') if '"' in label else label
+            for label in labels]
+
+
+def _long_textgrid_lines(xmin, xmax, tiers):
+    tab = " " * 4
+    yield ('File type = "ooTextFile"\nObject class = "TextGrid"\n\n'
+           f"xmin = {_num(xmin)} \nxmax = {_num(xmax)} \n"
+           f"tiers? <exists> \nsize = {len(tiers)} \nitem []: \n")
+    interval = (f"{tab * 2}intervals [%d]:\n"
+                f"{tab * 3}xmin = %s \n"
+                f"{tab * 3}xmax = %s \n"
+                f'{tab * 3}text = "%s" \n')
+    point = (f"{tab * 2}points [%d]:\n"
+             f"{tab * 3}number = %s \n"
+             f'{tab * 3}mark = "%s" \n')
+    for tier_number, (kind, name, tier_xmin, tier_xmax, columns) \
+            in enumerate(tiers, 1):
+        name = name.replace('"', '""')
+        size = len(columns[-1])
+        yield (f"{tab}item [{tier_number}]:\n"
+               f'{tab * 2}class = "{kind}" \n'
+               f'{tab * 2}name = "{name}" \n'
+               f"{tab * 2}xmin = {_num(tier_xmin)} \n"
+               f"{tab * 2}xmax = {_num(tier_xmax)} \n")
+        if kind == INTERVAL_TIER:
+            yield f"{tab * 2}intervals: size = {size} \n"
+            template = interval
+        else:
+            yield f"{tab * 2}points: size = {size} \n"
+            template = point
+        yield "".join([template % values for values in zip(
+            range(1, size + 1), *_format_times(columns[:-1]),
+            _escape(columns[-1]))])
+
+
+def _short_textgrid_lines(xmin, xmax, tiers):
+    yield ('File type = "ooTextFile"\nObject class = "TextGrid"\n\n'
+           f"{_num(xmin)}\n{_num(xmax)}\n<exists>\n{len(tiers)}\n")
+    for kind, name, tier_xmin, tier_xmax, columns in tiers:
+        name = name.replace('"', '""')
+        yield (f'"{kind}"\n"{name}"\n{_num(tier_xmin)}\n{_num(tier_xmax)}\n'
+               f"{len(columns[-1])}\n")
+        template = "%s\n" * (len(columns) - 1) + '"%s"\n'
+        yield "".join([template % values for values in zip(
+            *_format_times(columns[:-1]), _escape(columns[-1]))])
+
+
+def write_textgrid(tg, path, format="long_textgrid", include_blank_spaces=True,
+                   minimum_interval_length=MIN_INTERVAL_LENGTH):
+    """Drop-in for praatio's `Textgrid.save` for the long and short formats.
+
+    `tg` is a praatio `Textgrid` or a `TextGridData`. The file is the same,
+    byte for byte, as the one `tg.save(path, format, include_blank_spaces)`
+    writes. JSON formats are left to praatio.
+
+    The file is written to a temporary file next to it first, and then
+    renamed, so that a run that is killed cannot leave a truncated TextGrid
+    behind.
+    """
+    folder, filename = os.path.split(path)
+    temporary_path = os.path.join(folder, f".{filename}.tmp")
+    try:
+        _write_textgrid(tg, temporary_path, format, include_blank_spaces,
+                        minimum_interval_length)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def _write_textgrid(tg, path, format, include_blank_spaces,
+                    minimum_interval_length):
+    if format not in ("long_textgrid", "short_textgrid"):
+        if isinstance(tg, TextGridData):
+            tg = to_praatio(tg)
+        tg.save(path, format=format, includeBlankSpaces=include_blank_spaces,
+                minimumIntervalLength=minimum_interval_length)
+        return
+    if not isinstance(tg, TextGridData):
+        # Prints the same warnings about inconsistent timestamps as praatio
+        tg.validate("warning")
+        xmin, xmax = tg.minTimestamp, tg.maxTimestamp
+    else:
+        # As praatio's `addTier`, the TextGrid spans all of its tiers
+        xmin = min([tg.xmin] + [tier.xmin for tier in tg.tiers])
+        xmax = max([tg.xmax] + [tier.xmax for tier in tg.tiers])
+
+    tiers = [(kind, name, tier_xmin, tier_xmax,
+              _prepare_entries(kind, columns, xmin, xmax,
+                               include_blank_spaces, minimum_interval_length))
+             for kind, name, tier_xmin, tier_xmax, columns
+             in _tiers_for_saving(tg)]
+
+    if format == "long_textgrid":
+        lines = _long_textgrid_lines(xmin, xmax, tiers)
+    else:
+        lines = _short_textgrid_lines(xmin, xmax, tiers)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Time-aligned joins between the rows of a CSV file and TextGrid tiers.
+
+`IntervalIndex` indexes the entries of a tier (or any intervals) by time.
+It answers, for a whole array of query intervals at once, which entries
+overlap each query, lie within it or contain it, by binary search on the
+sorted start times and on the running maximum of the end times. A join of m
+rows with a tier of n entries thus costs O((n + m) log n) plus the number
+of matches, instead of O(n·m) with nested loops.
+
+`join_labels` attaches the labels of the matching entries of a tier to each
+query interval, and `join_corpus` does so for every row of an annotation
+sheet (e.g. `NWD_june23.csv`) with the `word`, `phone` and `realization`
+tiers of the informant's TextGrid:
+
+    python TextGrid_cli.py join --csv NWD_june23.csv --input-path NorwegianTextGrids/
+
+File:
+    TextGrid_join.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+
+import numpy as np
+
+from TextGrid_data import read_annotation_csv
+from TextGrid_files import scan_files
+from TextGrid_io import read_textgrid
+from TextGrid_profile import close_profiler, open_profiler
+from TextGrid_tiers import ArrayTier
+
+JOIN_MODES = ("overlap", "within", "contains")
+
+
+class IntervalIndex:
+    """An index of intervals for overlap and containment queries.
+
+    The intervals may overlap or nest, as the rows of a CSV file can; the
+    entries of an interval tier do not, and are found without any
+    candidates to discard. Points (intervals with `start == end`, e.g. the
+    entries of a point tier) overlap the queries they lie within, bounds
+    included.
+    """
+
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        # The largest end of each entry and the entries before it, which
+        # bounds the first entry that can reach a given time
+        self.max_ends = np.maximum.accumulate(self.ends) if len(ends) \
+            else self.ends
+
+    @classmethod
+    def from_tier(cls, tier):
+        """Index the entries of an `ArrayTier` (points of a point tier)."""
+        return cls(tier.starts,
+                   tier.starts if tier.ends is None else tier.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def query(self, starts, ends, mode="overlap"):
+        """Return the pairs of queries and entries that match.
+
+        `starts` and `ends` are arrays of query intervals. With `mode`
+        "overlap", an entry matches a query if they share some time (not
+        just a bound), with "within" if it lies within the query, and with
+        "contains" if it contains the query. Returns two arrays: the indices
+        of the queries and of the matching entries, in the order of the
+        queries and then of the start times of the entries.
+        """
+        starts = np.atleast_1d(np.asarray(starts, dtype=float))
+        ends = np.atleast_1d(np.asarray(ends, dtype=float))
+        if mode == "overlap":
+            low = np.searchsorted(self.max_ends, starts, side="left")
+            high = np.searchsorted(self.starts, ends, side="right")
+        elif mode == "within":
+            low = np.searchsorted(self.starts, starts, side="left")
+            high = np.searchsorted(self.starts, ends, side="right")
+        elif mode == "contains":
+            low = np.searchsorted(self.max_ends, ends, side="left")
+            high = np.searchsorted(self.starts, starts, side="right")
+        else:
+            raise ValueError(f"`mode` must be one of {JOIN_MODES}, not "
+                             f"'{mode}'")
+
+        # Expand the candidate ranges into pairs, then keep the matches
+        counts = np.maximum(high - low, 0)
+        queries = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(len(queries)) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        entries = np.repeat(low, counts) + offsets
+
+        entry_starts = self.starts[entries]
+        entry_ends = self.ends[entries]
+        query_starts = starts[queries]
+        query_ends = ends[queries]
+        if mode == "overlap":
+            match = ((entry_starts < query_ends) & (entry_ends > query_starts)
+                     | ((entry_starts == entry_ends)
+                        & (entry_starts >= query_starts)
+                        & (entry_starts <= query_ends)))
+        elif mode == "within":
+            match = ((entry_starts >= query_starts)
+                     & (entry_ends <= query_ends))
+        else:
+            match = ((entry_starts <= query_starts)
+                     & (entry_ends >= query_ends))
+        return queries[match], self.order[entries[match]]
+
+    def overlapping(self, start, end):
+        """Return the indices of the entries overlapping `start`–`end`."""
+        return self.query([start], [end], "overlap")[1]
+
+
+def join_labels(tier, starts, ends, mode="overlap", separator=" ",
+                index=None):
+    """Return the labels of the entries of `tier` matching each interval.
+
+    The labels of the entries of the `ArrayTier` that match each query
+    interval (see `IntervalIndex.query`) are joined by `separator`, in time
+    order; entries with empty labels are left out. Returns an object array
+    of strings, one per query. An `index` of the tier can be given, to be
+    reused across calls.
+    """
+    if index is None:
+        index = IntervalIndex.from_tier(tier)
+    queries, entries = index.query(starts, ends, mode)
+    labels = np.array(tier.table.lookup(tier.codes[entries]), dtype=object)
+    keep = labels != ""
+    queries, labels = queries[keep], labels[keep]
+
+    result = np.full(len(np.atleast_1d(starts)), "", dtype=object)
+    if len(queries):
+        # The queries are in order, so the labels of each are consecutive
+        boundaries = np.flatnonzero(np.diff(queries)) + 1
+        for query, group in zip(queries[np.r_[0, boundaries]],
+                                np.split(labels, boundaries)):
+            result[query] = separator.join(group)
+    return result
+
+
+def join_corpus(csv_path, textgrid_path, output_path=None,
+                tier_names=("word", "phone", "realization"), mode="overlap",
+                separator=" ", csv_cache_path=None, pattern=None,
+                profile_path=None, profile_slowest=0):
+    """Attach the labels of TextGrid tiers to the rows of an annotation sheet.
+
+    The rows of `csv_path` (read with `read_annotation_csv`, and cached in
+    `csv_cache_path`, if given) of the informants with a TextGrid in
+    `textgrid_path` get a column per tier in `tier_names`, with the labels
+    of the entries of that tier in the informant's TextGrid that match the
+    row's interval (see `join_labels`). Tiers that a TextGrid lacks give
+    empty labels. The rows are written as a UTF-16 CSV file to
+    `output_path` (by default `<csv file>_joined.csv`), and returned as a
+    DataFrame. With `pattern`, only the TextGrids whose filename matches
+    that glob pattern are joined. With `profile_path`, the stages of the run
+    are profiled (see `TextGrid_profile.py`). Raises `ValueError` if two
+    TextGrids belong to the same informant.
+    """
+    if output_path is None:
+        output_path = os.path.splitext(csv_path)[0] + "_joined.csv"
+
+    profiler = open_profiler(profile_path, "join", profile_slowest)
+    with profiler.stage("scan files") as record:
+        textgrid_files = {}
+        for textgrid_file in scan_files(textgrid_path,
+                                        extensions=(".TextGrid",),
+                                        pattern=pattern):
+            other = textgrid_files.setdefault(textgrid_file.participant,
+                                              textgrid_file)
+            if other is not textgrid_file:
+                raise ValueError(
+                    f"Both '{other.name}' and '{textgrid_file.name}' are "
+                    f"TextGrids of the informant '{textgrid_file.participant}'"
+                    ", so it is not clear which to join to their rows. Leave "
+                    "one out, e.g. with `pattern`.")
+        record["items"] = len(textgrid_files)
+
+    with profiler.stage("read csv") as record:
+        df = read_annotation_csv(csv_path, list(textgrid_files),
+                                 cache_path=csv_cache_path)
+        df = df.reset_index(drop=True)
+        record["items"] = len(df)
+    begin_times = df["Begin.Time...ss.msec"].to_numpy(dtype=float)
+    end_times = df["End.Time...ss.msec"].to_numpy(dtype=float)
+    columns = {tier_name: np.full(len(df), "", dtype=object)
+               for tier_name in tier_names}
+
+    rows_by_informant = df.groupby("Informant", sort=False,
+                                   observed=True).indices
+    for informant, rows in rows_by_informant.items():
+        textgrid_filename = textgrid_files[informant].name
+        with profiler.file(textgrid_filename, items=len(rows)):
+            with profiler.stage("read textgrid",
+                                file=textgrid_filename) as record:
+                tg = read_textgrid(textgrid_files[informant].path,
+                                   include_empty_intervals=False)
+                record["items"] = sum(len(tier.starts)
+                                      for tier in tg.tiers)
+            with profiler.stage("join", file=textgrid_filename,
+                                items=len(rows)):
+                for tier_name in tier_names:
+                    if tier_name not in tg.tier_names:
+                        continue
+                    tier = ArrayTier.from_tier(tg.get_tier(tier_name))
+                    columns[tier_name][rows] = join_labels(
+                        tier, begin_times[rows], end_times[rows], mode,
+                        separator)
+
+    for tier_name, labels in columns.items():
+        df[tier_name] = labels
+    with profiler.stage("write csv", items=len(df)):
+        df.to_csv(output_path, index=False, encoding="utf-16")
+    print(f"Joined the tiers {', '.join(tier_names)} to {len(df)} rows of "
+          f"'{csv_path}', saved to '{output_path}'.")
+    close_profiler(profiler, profile_path, "join", profile_slowest,
+                   input_path=textgrid_path)
+    return df
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Per-stage profiling of the TextGrid scripts.
+
+A `Profiler` records the wall time, the number of items and the peak memory
+of each stage of a run (reading the CSV file, probing audio durations,
+translating, reading, building and writing TextGrids, ...), per file where
+the stage is done per file. At the end of a run the records are appended to
+a JSON lines file, followed by a summary line per stage and one for the run,
+so that slow runs can be broken down and runs compared. The files that took
+longest can also be profiled function by function with `cProfile`.
+
+Profiling is off unless a profile path is given, e.g. with `--profile` on the
+command line; a disabled `Profiler` costs next to nothing.
+
+File:
+    TextGrid_profile.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+
+def peak_rss():
+    """Return the peak resident memory of this process in bytes, if known."""
+    if resource is None:
+        return None
+    # `ru_maxrss` is in kilobytes on Linux, but in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    """Records the wall time, items and peak memory of pipeline stages.
+
+    Each stage is run in a `with profiler.stage(name, file=...) as record:`
+    block; set `record["items"]` to the number of items the stage handled,
+    e.g. rows or labels. The peak memory of a stage is the peak of the memory
+    allocated by Python while it ran, as traced by `tracemalloc`, which slows
+    allocation-heavy stages somewhat; pass `trace_memory=False` to only time
+    the stages. With `cprofile_path`, each file run in `profiler.file(...)`
+    is profiled with `cProfile` and its statistics dumped to that folder;
+    `prune_cprofiles(n)` then keeps only the dumps of the `n` slowest files.
+
+    Stages may be nested. Records of other processes (e.g. batch workers,
+    which have a `Profiler` of their own) are added with `add_records`.
+    """
+
+    def __init__(self, enabled=False, trace_memory=True, cprofile_path=None):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.cprofile_path = cprofile_path if enabled else None
+        self.records = []
+        self.started = time.perf_counter()
+        # The peak memory of each enclosing stage, so far
+        self._peaks = []
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cprofile_path is not None:
+            os.makedirs(self.cprofile_path, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name, file=None, items=None):
+        """Time the stage `name`, and record it when the block ends."""
+        record = {"stage": name, "file": file, "items": items}
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_memory:
+            # `tracemalloc` has a single peak, so the peak of the enclosing
+            # stage is set aside and the peak reset for this stage
+            _, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, self._peaks.pop())
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record["peak_bytes"] = peak
+            self.records.append(record)
+
+    @contextmanager
+    def file(self, filename, items=None):
+        """Time the whole processing of `filename`, as the stage "file".
+
+        With a `cprofile_path`, the file is also profiled with `cProfile`.
+        """
+        if self.cprofile_path is None:
+            with self.stage("file", file=filename, items=items) as record:
+                yield record
+            return
+
+        profile = cProfile.Profile()
+        with self.stage("file", file=filename, items=items) as record:
+            profile.enable()
+            try:
+                yield record
+            finally:
+                profile.disable()
+        profile.dump_stats(join_cprofile(self.cprofile_path, filename))
+
+    def iterate(self, name, iterable, file=None):
+        """Yield from `iterable`, timing the time spent producing the items.
+
+        For stages that are interleaved with others, e.g. reading the rows of
+        a stream that is written as it is read. The stage is recorded once
+        the iterable is exhausted, with the number of items produced and
+        without its peak memory.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+
+        iterator = iter(iterable)
+        record = {"stage": name, "file": file, "items": 0, "seconds": 0.0}
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    record["seconds"] += time.perf_counter() - start
+                record["items"] += 1
+                yield item
+        finally:
+            self.records.append(record)
+
+    def add_records(self, records):
+        if self.enabled and records:
+            self.records.extend(records)
+
+    def summary(self):
+        """Return the totals of each stage, in the order first recorded.
+
+        The totals are the number of times the stage ran, its total time,
+        items and largest peak memory, and the time of its slowest run.
+        """
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "seconds": 0.0,
+                "max_seconds": 0.0, "items": None, "peak_bytes": None})
+            stage["calls"] += 1
+            stage["seconds"] += record["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"],
+                                       record["seconds"])
+            if record.get("items") is not None:
+                stage["items"] = (stage["items"] or 0) + record["items"]
+            if record.get("peak_bytes") is not None:
+                stage["peak_bytes"] = max(stage["peak_bytes"] or 0,
+                                          record["peak_bytes"])
+        return list(stages.values())
+
+    def slowest_files(self, n):
+        """Return the `n` files whose stage "file" took longest."""
+        records = sorted((record for record in self.records
+                          if record["stage"] == "file"),
+                         key=lambda record: record["seconds"], reverse=True)
+        return [record["file"] for record in records[:n]]
+
+    def prune_cprofiles(self, n):
+        """Keep only the `cProfile` dumps of the `n` slowest files."""
+        if self.cprofile_path is None:
+            return []
+        slowest = self.slowest_files(n)
+        keep = {os.path.basename(join_cprofile(self.cprofile_path, filename))
+                for filename in slowest}
+        for dump in os.listdir(self.cprofile_path):
+            if dump.endswith(".prof") and dump not in keep:
+                os.remove(os.path.join(self.cprofile_path, dump))
+        return slowest
+
+    def write(self, path, run, **details):
+        """Append the records and a summary of the run `run` to `path`.
+
+        Every line is a JSON object with a `type` ("record", "stage" or
+        "run") and the name of the run, followed by the fields of the record
+        or stage totals. `details` (e.g. the input path) are added to the
+        "run" line, along with the wall time since the profiler was created,
+        the number of files and the peak resident memory of the process.
+        """
+        if not self.enabled:
+            return
+        summary = {
+            "type": "run", "run": run,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": time.perf_counter() - self.started,
+            "files": sum(record["stage"] == "file"
+                         for record in self.records),
+            "peak_rss_bytes": peak_rss(), **details}
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps({"type": "record", "run": run, **record},
+                                   ensure_ascii=False) + "\n")
+            for stage in self.summary():
+                f.write(json.dumps({"type": "stage", "run": run, **stage},
+                                   ensure_ascii=False) + "\n")
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+    def print_summary(self):
+        """Print the totals of each stage as a table."""
+        if not self.enabled:
+            return
+        print(f"{'stage':<24} {'calls':>6} {'seconds':>9} {'max (s)':>8} "
+              f"{'items':>9} {'peak MB':>8}")
+        for stage in self.summary():
+            items = "" if stage["items"] is None else stage["items"]
+            peak = ("" if stage["peak_bytes"] is None
+                    else f"{stage['peak_bytes'] / 1e6:.1f}")
+            print(f"{stage['stage']:<24} {stage['calls']:>6} "
+                  f"{stage['seconds']:>9.3f} {stage['max_seconds']:>8.3f} "
+                  f"{items:>9} {peak:>8}")
+
+
+def join_cprofile(cprofile_path, filename):
+    return os.path.join(cprofile_path, os.path.basename(filename) + ".prof")
+
+
+def open_profiler(profile_path, run, cprofile_slowest=0):
+    """Return a `Profiler` for the run `run`, profiled to `profile_path`.
+
+    With `profile_path=None` the profiler is disabled. With
+    `cprofile_slowest`, the files are profiled with `cProfile` into the
+    folder `<profile_path without extension>_cprofile/<run>/`.
+    """
+    if profile_path is None:
+        return Profiler()
+    cprofile_path = None
+    if cprofile_slowest:
+        cprofile_path = os.path.join(
+            os.path.splitext(profile_path)[0] + "_cprofile", run)
+    return Profiler(enabled=True, cprofile_path=cprofile_path)
+
+
+def close_profiler(profiler, profile_path, run, cprofile_slowest=0,
+                   **details):
+    """Write the profile of a run, keep the slowest `cProfile` dumps."""
+    if not profiler.enabled:
+        return
+    slowest = profiler.prune_cprofiles(cprofile_slowest)
+    profiler.write(profile_path, run, **details)
+    profiler.print_summary()
+    print(f"Wrote the profile of the run to '{profile_path}'.")
+    if slowest:
+        print(f"Wrote cProfile statistics of the {len(slowest)} slowest "
+              f"files to '{profiler.cprofile_path}'.")
@@ -7,7 +7,8 @@ based on these, we modify the TextGrids to include specified tiers for
 subsequent manual prosodic annotation. The script allows the user to choose
 whether or not to run the TextGrid generation and/or modification. The script
 also features translation of `realization` labels in Norwegian into English via
-Google Translate.
+Google Translate. The steps can also be run without prompts, with
+`TextGrid_cli.py`.
 
 File:
     TextGrid_script.py
@@ -70,159 +71,309 @@ Licence:
 # %% Step 0: Initialise script
 
 # %%% 0.1: Import dependencies
-import csv
-import ffmpeg  # If script aborts on error, try: `pip install ffmpeg-python`
+import argparse
 import os
-from googletrans import Translator
-# If error, try: `pip install googletrans==4.0.0rc1`
-from praatio import textgrid  # If error, try: `pip install praatio`
+import signal
+import time
+from collections import namedtuple
+from functools import partial
 from os.path import join
-
-
-# %%% 0.2: Choose whether to generate and/or modify TextGrids
-generate_new_textgrids_enabled = True if input(
-    "Generate new TextGrids from "
-    "CSV input ([y]/n)?: ").lower().strip() == "y" else False
-
-modify_textgrids_enabled = True if input(
-    "Modify TextGrids ([y]/n)?: ").lower().strip() == "y" else False
-
-print("\n")
-# %%% 0.2: Define functions
-if modify_textgrids_enabled:
-    # Populate `prosodic_unit` tier with 'σ' when `word` entries are not `''`
-    def prosodic_word(s):
-        if not s:
-            return ""
-        return "ω"
-
-    # Google Translate API for automatic translation of `realization` strings
-    translator = Translator()
-
-    def translate_entry(s, src_lang="no", dest_lang="en"):
-        if not s:
-            return s
-        return translator.translate(s,
-                                    src=src_lang,
-                                    dest=dest_lang).text
+from praatio import textgrid  # If error, try: `pip install praatio`
+from TextGrid_audio import DurationCatalog, compare_durations
+from TextGrid_batch import (Manifest, collect, hash_inputs, module_files,
+                            report_batch, run_batch, submit)
+from TextGrid_data import index_csv
+from TextGrid_export import export_available, export_tiers, is_up_to_date
+from TextGrid_files import FolderWatcher, participant_id, scan_files
+from TextGrid_io import read_textgrid, write_textgrid
+from TextGrid_profile import Profiler, close_profiler, open_profiler
+from TextGrid_tiers import ArrayTier, LabelMap
+from TextGrid_transform import compile_transform, load_config, per_label
+# Every step reads or writes TextGrids, and so loads `praatio` and `numpy`
+# (through `TextGrid_io` and `TextGrid_tiers`). `TextGrid_translation` is
+# imported by step 2 only, which translates labels.
+
+
+# %%% 0.2: Settings
+# Process the TextGrids in 2.2 in parallel across `batch_workers` processes
+# (`None` uses all CPU cores), sending `batch_chunksize` files at a time to
+# each worker. Set `batch_mode_enabled = False` to process them one by one.
+batch_mode_enabled = True
+batch_workers = None
+batch_chunksize = 4
+
+# Translate `realization` labels with Google Translate ("google"), or leave
+# them untranslated for offline runs ("stub"). Translations are cached on
+# disk in `translation_cache_path` (see 2.1) and reused in later runs.
+translation_backend = "google"
+
+# Labels that are not cached yet are translated with up to
+# `translation_max_in_flight` concurrent requests, starting no more than
+# `translation_rate` requests per second. Failed or timed out requests are
+# retried `translation_retries` times with exponential backoff.
+translation_max_in_flight = 8
+translation_rate = 5
+translation_retries = 3
+translation_timeout = 10
+
+# Set `profile_path` to a JSON lines file to record the wall time, items and
+# peak memory of each stage of a run, per file (see `TextGrid_profile.py`),
+# and `profile_slowest` to also keep `cProfile` statistics of the slowest
+# files. `None` does not profile the runs.
+profile_path = None
+profile_slowest = 0
+
+# The tiers of the modified TextGrids in 2.2 (which tiers are renamed,
+# derived, added and removed, and their order) are set in a JSON config file
+# (see `TextGrid_transform.py`)
+tier_config_path = join(os.path.dirname(os.path.abspath(__file__)),
+                        "tier_configs", "modify_textgrids.json")
+
+# The tiers of each modified TextGrid are also exported to a columnar dataset
+# (`textgrid_tiers/` in the output folder, see `TextGrid_export.py`), for
+# analyses that would otherwise parse every TextGrid again. This needs
+# `pyarrow`. Set `export_format = "feather"` to write Feather files instead
+# of Parquet files, and `export_enabled = False` to not export the tiers.
+export_enabled = True
+export_format = "parquet"
+
+# The modules, besides this script, whose code shapes the generated (step 1)
+# and modified (step 2) TextGrids. They are hashed with the inputs of each
+# TextGrid, so that a change to them reprocesses the TextGrids.
+generate_modules = ["TextGrid_audio", "TextGrid_data"]
+modify_modules = ["TextGrid_io", "TextGrid_tiers", "TextGrid_transform",
+                  "TextGrid_translation", "TextGrid_export"]
+
+# In watch mode (2.3), the input folder is checked for new and changed
+# TextGrids every `watch_interval` seconds. A TextGrid is modified once it
+# has not changed for `watch_settle` seconds, so that files that are still
+# being written are not read halfway.
+watch_interval = 1
+watch_settle = 2
+
+
+# The durations of the audio files in 1.5 are kept in a catalog
+# (`duration_catalog.sqlite` in the audio folder by default), with the size
+# and modification time of each file, and only read again from the files
+# that changed. New files are read by `duration_workers` threads. Durations
+# in `realization.csv` that differ from those of the audio files by more
+# than `duration_tolerance` seconds are reported.
+duration_workers = 8
+duration_tolerance = 0.001
+
+
+# %%% 0.3: Define functions
+# Populate `prosodic_unit` tier with 'σ' when `word` entries are not `''`
+def prosodic_word(s):
+    if not s:
+        return ""
+    return "ω"
+
+
+# `prosodic_word` for the distinct labels of tiers, memoized across the
+# TextGrids that a process modifies (see `LabelMap` in `TextGrid_tiers.py`)
+prosodic_word_labels = LabelMap(per_label(prosodic_word))
+
+
+# Google Translate API for automatic translation of `realization` strings.
+# The translator is set up per process, so that each batch worker process gets
+# its own. Its translations are cached and batched (`TextGrid_translation.py`).
+translator = None
+
+
+def init_translator(backend="google", cache_path=None):
+    from TextGrid_translation import CachedTranslator
+
+    global translator
+    translator = CachedTranslator(backend, cache_path)
+
+
+def init_watch_worker(backend="google", cache_path=None):
+    # Ctrl+C stops the watch in the main process, which lets the workers
+    # finish the TextGrids they are modifying
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_translator(backend, cache_path)
 
 
 # %% 1: Generate TextGrids from CSV input data
-# %%% 1.1: Define input and output paths
-if generate_new_textgrids_enabled:
-    input_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
-        "Github/TextGrid-scripts/"
-
-    output_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
-        "Github/TextGrid-scripts/textgrids/"
-
-    if not os.path.exists(output_path):
-        os.mkdir(output_path)
-
-
-# %%% 1.2: Load the CSV data
-if generate_new_textgrids_enabled:
-    with open(f"{input_path}realization.csv", "r", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f, delimiter=";")
-        data = [row for row in reader]
-
-# %%% 1.3: Obtain audio file duration for TextGrid interval durations
-# Here we obtain information about the audio file's duration, as value for the
-# `maxTime` argument of TextGrid IntervalTier objects.
-
-# %%% 1.4: Define `audio_input_path`
-# Specify another path if the audio files are not in `input_path`
-if generate_new_textgrids_enabled:
-    audio_input_path = input_path
+def generate_textgrids(input_path, audio_input_path=None,
+                       textgrid_output_path=None, force=False,
+                       profile_path=profile_path,
+                       profile_slowest=profile_slowest, pattern=None,
+                       duration_catalog_path=None, duration_export_path=None,
+                       workers=duration_workers,
+                       tolerance=duration_tolerance):
+    """Generate a TextGrid per audio file from `realization.csv`.
+
+    The CSV file is read from `input_path`, and the audio files from
+    `audio_input_path` (`input_path` by default), or only those whose
+    filename matches the glob `pattern`. The TextGrids are saved to
+    `textgrid_output_path` (`textgrids/` in `audio_input_path` by default).
+    With `force=True`, TextGrids with unchanged inputs are generated too.
+    With `profile_path`, the stages of the run are profiled (see 0.2).
+    The durations of the audio files are kept in `duration_catalog_path`
+    (`duration_catalog.sqlite` in the audio path by default), read by
+    `workers` threads where needed, and with `duration_export_path`, the
+    catalog is also written to that CSV file.
+    """
+
+    # %%% 1.2: Load the CSV data
+    # The rows are indexed once by audio file and participant, keeping only
+    # the columns used below: `data_index[audio_filename][participant]` is the
+    # list of rows for that audio file and participant.
+    profiler = open_profiler(profile_path, "generate", profile_slowest)
+    with profiler.stage("read csv") as record:
+        data_index = index_csv(join(input_path, "realization.csv"),
+                               key_fields=("audio_filename", "participant"),
+                               fields=("duration", "realization"))
+        record["items"] = sum(len(rows) for participants
+                              in data_index.values()
+                              for rows in participants.values())
+
+    # %%% 1.3: Obtain audio file duration for TextGrid interval durations
+    # Here we obtain information about the audio file's duration, as value for
+    # the `maxTime` argument of TextGrid IntervalTier objects.
+
+    # %%% 1.4: Define `audio_input_path`
+    # Specify another path if the audio files are not in `input_path`
+    if audio_input_path is None:
+        audio_input_path = input_path
 
     # Define `textgrid_output_path` if different from output_path
-    textgrid_output_path = join(audio_input_path, "textgrids/")
+    if textgrid_output_path is None:
+        textgrid_output_path = join(audio_input_path, "textgrids/")
 
     if not os.path.exists(textgrid_output_path):
         os.mkdir(textgrid_output_path)
         print(f"Created directory '{textgrid_output_path}'!")
 
-# %%% 1.5: Obtain duration of audio files (within folder), populate TextGrids
-# This option presupposes (a) that audio files are already prepared, (b) that
-# you will generate new TextGrids for these, and (c) that the input data has
-# some sort of interval information. Here, `end_time equals `duration` because
-# the audio files per participants have been sliced per trial item. If the
-# audio file on the other hand is long/contains more intervals than just one,
-# the code for `start_time` and `end_time` should be adjusted accordingly.
-if generate_new_textgrids_enabled:
-    # duration_list = []
-    for filename in os.listdir(audio_input_path):
-        name, ext = os.path.splitext(filename)
-        if ext != ".wav":  # Specify different audio file extension if needed
+    # %%% 1.5: Obtain duration of audio files (within folder), populate
+    # TextGrids
+    # This option presupposes (a) that audio files are already prepared, (b)
+    # that you will generate new TextGrids for these, and (c) that the input
+    # data has some sort of interval information. Here, `end_time equals
+    # `duration` because the audio files per participants have been sliced per
+    # trial item. If the audio file on the other hand is long/contains more
+    # intervals than just one, the code for `start_time` and `end_time` should
+    # be adjusted accordingly.
+    manifest = Manifest(textgrid_output_path, force=force)
+    script_digest = hash_inputs(
+        files=[__file__, *module_files(generate_modules)])
+    # The audio folder is listed once, with the size and modification time of
+    # each file (see `TextGrid_files.py`)
+    with profiler.stage("scan files") as record:
+        audio_files = scan_files(
+            audio_input_path,
+            extensions=(".wav",),  # Specify different audio file extension if needed
+            pattern=pattern)
+        record["items"] = len(audio_files)
+
+    # Find the duration of each audio file in the catalog, reading only the
+    # files that are new or changed since the last run. WAV durations are
+    # read from the file header; other formats are probed with ffprobe
+    # (`pip install ffmpeg-python`).
+    if duration_catalog_path is None:
+        duration_catalog_path = join(audio_input_path,
+                                     "duration_catalog.sqlite")
+    duration_catalog = DurationCatalog(duration_catalog_path)
+    with profiler.stage("audio duration",
+                        items=len(audio_files)) as record:
+        durations = duration_catalog.durations(audio_files, workers=workers)
+        record["items"] = duration_catalog.n_read
+    if duration_export_path is not None:
+        duration_catalog.export_csv(duration_export_path)
+        print(f"Wrote the audio durations to '{duration_export_path}'.")
+    duration_catalog.close()
+
+    # Check the `duration` column of the CSV file against the audio files
+    mismatches = compare_durations(
+        {(audio_file.name, participant): float(row.duration.replace(",", "."))
+         for audio_file in audio_files
+         for participant, rows in data_index.get(audio_file.name, {}).items()
+         for row in rows},
+        {(audio_file.name, participant): durations[audio_file.path]
+         for audio_file in audio_files if audio_file.path in durations
+         for participant in data_index.get(audio_file.name, {})},
+        tolerance)
+    if mismatches:
+        print(f"The `duration` of {len(mismatches)} rows of "
+              "`realization.csv` differs from their audio file:")
+        for (filename, participant), expected, duration in mismatches:
+            print(f"    {filename} ({participant}): {expected} in the CSV "
+                  f"file, {duration} in the audio file")
+        print()
+
+    for audio_file in audio_files:
+        filename, name = audio_file.name, audio_file.stem
+        if audio_file.path not in durations:
+            print(f"Skipping '{filename}', whose duration could not be "
+                  "read.\n")
+            continue
+        duration = str(durations[audio_file.path])
+
+        # Skip the audio file if it and its CSV rows are unchanged. The
+        # audio file is identified by its size, modification time and
+        # duration, so that its audio data is not read.
+        with profiler.stage("hash inputs", file=filename, items=1):
+            input_digest = hash_inputs(
+                values=[audio_file.size, audio_file.mtime_ns, duration,
+                        data_index.get(filename, {}), script_digest])
+        if manifest.is_up_to_date(name + ".TextGrid", input_digest):
+            print(f"Skipping '{filename}', which is unchanged.\n")
             continue
-        print(f"Generating new TextGrid based on audio '{filename}' located "
-              f"in '{audio_input_path}'.")
-
-        # Find duration, store values in list for any subsequent use or export
-        duration = str(float(ffmpeg.probe(join(audio_input_path,
-                                               filename))["format"]["duration"]))
-        # duration_list.append({"filename": filename, "duration": duration})
-
-        # Create a TextGrid object
-        tg = textgrid.Textgrid()
-
-        # Create an IntervalTier object for realization and other variables
-        realization_tier = textgrid.IntervalTier(
-            "realization", [], 0, duration)
-
-        # Add `realization_tier` to the TextGrid object
-        tg.addTier(realization_tier)
-
-        # Make loop groups for intervals specific to audio file and participant
-        groups = {}
-        for row in data:
-            audio_filename = row["audio_filename"]
-            participant = row["participant"]
-            key = (audio_filename, participant)
-            if key not in groups:
-                groups[key] = []
-            groups[key].append(row)
-
-        # Loop through data from CSV for populating audio specific intervals
-        for (audio_filename, participant), rows in groups.items():
-            if audio_filename != filename:
-                continue
-
-            # Populate the `realization` IntervalTier object
-            for row in rows:
-                start_time = 0
-                end_time = float(row["duration"].replace(
-                    ",", "."))  # decimal sep
-                label = row["realization"]
-                realization_entry = [start_time, end_time, label]
-
-                # Add the IntervalTier to the TextGrid
-                realization_tier.insertEntry(realization_entry)
-
-            # Write the TextGrid to a file (here naming with `audio_filename`)
-            tg.save(join(textgrid_output_path, name + ".TextGrid"),
-                    # format="short_textgrid",
-                    format="long_textgrid",
-                    includeBlankSpaces=True)
-            print(f"Saved '{name}.TextGrid' to "
-                  f"'{textgrid_output_path}'.\n")
 
+        with profiler.file(filename):
+            print(f"Generating new TextGrid based on audio '{filename}' "
+                  f"located in '{audio_input_path}'.")
+
+            # Create a TextGrid object
+            tg = textgrid.Textgrid()
+
+            # Create an IntervalTier object for realization and other
+            # variables
+            realization_tier = textgrid.IntervalTier(
+                "realization", [], 0, duration)
+
+            # Add `realization_tier` to the TextGrid object
+            tg.addTier(realization_tier)
+
+            # Loop through data from CSV for populating audio specific
+            # intervals, grouped by participant
+            for participant, rows in data_index.get(filename, {}).items():
+
+                # Populate the `realization` IntervalTier object
+                with profiler.stage("build textgrid", file=filename,
+                                    items=len(rows)):
+                    for row in rows:
+                        start_time = 0
+                        end_time = float(row.duration.replace(
+                            ",", "."))  # decimal sep
+                        label = row.realization
+                        realization_entry = [start_time, end_time, label]
+
+                        # Add the IntervalTier to the TextGrid
+                        realization_tier.insertEntry(realization_entry)
+
+                # Write the TextGrid to a file (here naming with
+                # `audio_filename`)
+                with profiler.stage("write textgrid", file=filename,
+                                    items=len(realization_tier.entries)):
+                    write_textgrid(tg, join(textgrid_output_path,
+                                            name + ".TextGrid"),
+                                   # format="short_textgrid",
+                                   format="long_textgrid",
+                                   include_blank_spaces=True)
+                print(f"Saved '{name}.TextGrid' to "
+                      f"'{textgrid_output_path}'.\n")
+                manifest.record(name + ".TextGrid", input_digest)
+
+    manifest.save()
     print("Generated all TextGrids!\n")
+    close_profiler(profiler, profile_path, "generate", profile_slowest,
+                   input_path=input_path)
 
-# %% 2: Modify forced aligned TextGrids and populate with new tiers
-
-# %%% 2.1: Define input and output paths
-if modify_textgrids_enabled:
-    modified_textgrid_input_path = "C:/Users/eiten9710/OneDrive - OsloMet/" + \
-        "Documents/Github/TextGrid-scripts/fa_textgrids/"
-
-    # Define `textgrid_output_path` if different from output_path
-    modified_textgrid_output_path = join(modified_textgrid_input_path,
-                                         "modified_textgrids/")
 
-    if not os.path.exists(modified_textgrid_output_path):
-        os.mkdir(modified_textgrid_output_path)
-        print(f"Created directory '{modified_textgrid_output_path}'!")
+# %% 2: Modify forced aligned TextGrids and populate with new tiers
 
 # %%% 2.2: Populate each TextGrid with new tiers and modify existing ones
 # The Autophon.se Forced Aligner outputs the following three tiers:
@@ -231,79 +382,432 @@ if modify_textgrids_enabled:
 # (3): `[input tier]- trans`
 
 # In the present case, [input tier] is `realization`. We will rename these.
-if modify_textgrids_enabled:
-    for textgrid_filename in os.listdir(modified_textgrid_input_path):
-        ext = os.path.splitext(textgrid_filename)[1]
-        if ext != ".TextGrid":
-            continue
-
+def modify_textgrid(textgrid_filename, input_path, output_path,
+                    tier_config=None, export_path=None,
+                    export_format=export_format, profile=False,
+                    cprofile_path=None):
+    """Modify `textgrid_filename` in `input_path`, save it to `output_path`.
+
+    The tiers are transformed as set in `tier_config` (a tier config, see
+    `TextGrid_transform.py`), or else in the file `tier_config_path`. With
+    `export_path`, they are also exported to the dataset there.
+    With `profile=True` the stages are profiled (see `TextGrid_profile.py`).
+    Returns the profile records, to be added to those of the run.
+    """
+    profiler = Profiler(profile, cprofile_path=cprofile_path)
+    with profiler.file(textgrid_filename):
         print(f"Modifying '{textgrid_filename}' located in "
-              f"'{modified_textgrid_input_path}'.")
-
-        # Open the TextGrid
-        tg = textgrid.openTextgrid(f"{modified_textgrid_input_path}"
-                                   f"{textgrid_filename}",
-                                   includeEmptyIntervals=True)
-
-        # Rename the `realization - phone` tier to `phone`
-        tg.renameTier("realization - phone",
-                      "phone")
-
-        # Rename the `realization - word` tier to `word`
-        tg.renameTier("realization - word",
-                      "word")
-        word_tier = tg.getTier("word")
-
-        # Add `realization` based on `realization - trans`
-        rem_realization_tier = tg.getTier("realization - trans")
-        realization_tier = rem_realization_tier.new(name="realization")
-        translation_entries = [(start, stop, translate_entry(label,
-                                                             src_lang="no",
-                                                             dest_lang="en"))
-                               for start, stop, label in realization_tier.entries]
-
-        tg.addTier(realization_tier)
-        rem_realization_tier = tg.removeTier("realization - trans")
-
-        # Translate `realization` tier into English, add to `translation` tier
-        translation_entries = [(start, stop, translate_entry(label,
-                                                             src_lang="no",
-                                                             dest_lang="en"))
-                               for start, stop, label in realization_tier.entries]
-        translation_tier = realization_tier.new(name="translation (Google)",
-                                                entries=translation_entries)
-
-        tg.addTier(translation_tier)
-
-        # Duplicate the `word` tier and create new `prosodic_unit` (`ω`) tier
-        prosodic_unit_entries = [(start, stop, prosodic_word(label))
-                                 for start, stop, label in word_tier.entries]
-        prosodic_unit_tier = word_tier.new(name="prosodic unit",
-                                           entries=prosodic_unit_entries)
-
-        tg.addTier(prosodic_unit_tier)
-
-        # Now, simply add any new empty tiers
-        stress_tier = textgrid.PointTier(
-            "stress (PS|SS|0)", [], minT=0, maxT=tg.maxTimestamp)
-        emphasis_tier = textgrid.PointTier(
-            "emphasis (E)", [], minT=0, maxT=tg.maxTimestamp)
-        comment_tier = textgrid.IntervalTier(
-            "comment", [], minT=0, maxT=tg.maxTimestamp)
-        # minT=realization_tier.entries[0][0],
-        # maxT=realization_tier.entries[0][1])
-
-        tg.addTier(stress_tier)
-        tg.addTier(emphasis_tier)
-        tg.addTier(comment_tier)
+              f"'{input_path}'.")
+
+        # Open the TextGrid, with its tiers as arrays. The tiers derived
+        # below share the time arrays of the tiers they are derived from.
+        with profiler.stage("read textgrid",
+                            file=textgrid_filename) as record:
+            tg = read_textgrid(join(input_path, textgrid_filename),
+                               include_empty_intervals=True)
+            tg = tg._replace(tiers=[ArrayTier.from_tier(tier)
+                                    for tier in tg.tiers])
+            record["items"] = sum(len(tier.codes) for tier in tg.tiers)
+
+        # Translate `realization` labels into English (as configured, for
+        # the `translation (Google)` tier), once per unique label
+        def translate(labels):
+            with profiler.stage("translate", file=textgrid_filename,
+                                items=len(labels)):
+                if translator is None:
+                    init_translator()
+                translations = translator.translate_many(labels, src="no",
+                                                         dest="en")
+            return [translations[label] for label in labels]
+
+        # Rename, derive and add the tiers as set in the tier config (0.2)
+        transform = compile_transform(
+            tier_config if tier_config is not None
+            else load_config(tier_config_path),
+            {"prosodic_word": prosodic_word_labels, "translate": translate})
+        with profiler.stage("build tiers", file=textgrid_filename):
+            tg = transform.apply(tg)
 
         # Write the TextGrid to a file (here naming with `audio_filename`)
-        tg.save(join(modified_textgrid_output_path,
-                     textgrid_filename),
-                # format="short_textgrid",
-                format="long_textgrid",
-                includeBlankSpaces=True)
+        with profiler.stage("write textgrid", file=textgrid_filename,
+                            items=sum(len(tier.codes)
+                                      for tier in tg.tiers)):
+            write_textgrid(tg, join(output_path, textgrid_filename),
+                           # format="short_textgrid",
+                           format="long_textgrid",
+                           include_blank_spaces=True)
+        if export_path is not None:
+            with profiler.stage("export tiers", file=textgrid_filename,
+                                items=len(tg.tiers)):
+                export_tiers(tg, textgrid_filename,
+                             participant_id(os.path.splitext(
+                                 textgrid_filename)[0]),
+                             export_path, export_format)
         print(f"Saved '{textgrid_filename}' to "
-              f"'{modified_textgrid_output_path}'.\n")
+              f"'{output_path}'.\n")
+    return profiler.records
+
+
+def prefetch_translations(prefetch_translator, input_path, textgrid_filenames,
+                          tier_names, profiler):
+    """Translate the labels of the TextGrids up front, in bulk requests.
+
+    The labels of the tiers `tier_names` (those that the tier config
+    translates) of each TextGrid are translated with `prefetch_translator`,
+    so that the TextGrids are then translated from the cache. Files that
+    cannot be read are left to be reported when they are modified.
+    """
+    from TextGrid_translation import TranslationError
+
+    realization_labels = []
+    with profiler.stage("prefetch read", items=len(textgrid_filenames)):
+        for textgrid_filename in textgrid_filenames:
+            try:
+                tg_data = read_textgrid(join(input_path, textgrid_filename))
+                for tier_name in tier_names:
+                    realization_labels.extend(
+                        tg_data.get_tier(tier_name).labels)
+            except Exception:
+                continue
+    with profiler.stage("prefetch translate") as record:
+        try:
+            prefetch_translator.translate_many(realization_labels,
+                                               src="no", dest="en")
+        except TranslationError as error:
+            print(f"{error}. These are translated again per TextGrid "
+                  "below.")
+        translation_stats = prefetch_translator.pipeline.stats()
+        record["items"] = translation_stats["texts"]
+    print(f"Translated {translation_stats['texts']} new unique labels in "
+          f"{translation_stats['elapsed']:.1f} s "
+          f"({translation_stats['failures']} failed requests).\n")
+
+
+# The paths, tier config and script digest shared by `modify_textgrids` and
+# `watch_textgrids` (see `set_up_modify`)
+ModifySetup = namedtuple("ModifySetup", [
+    "output_path", "translation_cache_path", "export_path", "tier_config",
+    "transform", "script_digest"])
+
+
+def set_up_modify(modified_textgrid_input_path, modified_textgrid_output_path,
+                  translation_cache_path, tier_config_path, export,
+                  export_path):
+    """Resolve the paths of a modify run, and read its tier config.
+
+    The output folder (`modified_textgrids/` in the input path by default)
+    is created if needed, translations are cached in
+    `translation_cache.sqlite` in the input path by default, and the tiers
+    are exported to `textgrid_tiers/` in the output path by default, if
+    `export` and `pyarrow` is installed (otherwise `export_path` is `None`).
+    The tier config is read and checked once, before any TextGrid is
+    modified. Returns a `ModifySetup`.
+    """
+    # %%% 2.1: Define input and output paths
+    # Define `textgrid_output_path` if different from output_path
+    if modified_textgrid_output_path is None:
+        modified_textgrid_output_path = join(modified_textgrid_input_path,
+                                             "modified_textgrids/")
+
+    if not os.path.exists(modified_textgrid_output_path):
+        os.mkdir(modified_textgrid_output_path)
+        print(f"Created directory '{modified_textgrid_output_path}'!")
 
+    # Define `translation_cache_path` for keeping translations between runs
+    if translation_cache_path is None:
+        translation_cache_path = join(modified_textgrid_input_path,
+                                      "translation_cache.sqlite")
+
+    # Export the tiers to `export_path`, if `pyarrow` is installed
+    if not export or not export_available():
+        export_path = None
+    elif export_path is None:
+        export_path = join(modified_textgrid_output_path, "textgrid_tiers")
+
+    # Read and check the tier config once, before any TextGrid is modified
+    tier_config = load_config(tier_config_path)
+    transform = compile_transform(tier_config, {"prosodic_word": None,
+                                                "translate": None})
+
+    # TextGrids are modified again when this script, its modules or the tier
+    # config change
+    script_digest = hash_inputs(
+        files=[__file__, tier_config_path, *module_files(modify_modules)])
+    return ModifySetup(modified_textgrid_output_path, translation_cache_path,
+                       export_path, tier_config, transform, script_digest)
+
+
+def modify_textgrids(modified_textgrid_input_path,
+                     modified_textgrid_output_path=None,
+                     translation_cache_path=None, force=False,
+                     backend=translation_backend,
+                     batch_mode=batch_mode_enabled, workers=batch_workers,
+                     chunksize=batch_chunksize,
+                     max_in_flight=translation_max_in_flight,
+                     rate=translation_rate, retries=translation_retries,
+                     timeout=translation_timeout, profile_path=profile_path,
+                     profile_slowest=profile_slowest, pattern=None,
+                     tier_config_path=tier_config_path, export=export_enabled,
+                     export_path=None, export_format=export_format):
+    """Modify the forced aligned TextGrids in `modified_textgrid_input_path`.
+
+    The TextGrids are saved to `modified_textgrid_output_path`
+    (`modified_textgrids/` in the input path by default), and translations
+    are cached in `translation_cache_path` (`translation_cache.sqlite` in
+    the input path by default). The other arguments default to the settings
+    in 0.2, e.g. `tier_config_path` for the tier config. With `export=True`,
+    the tiers are exported to the dataset `export_path` (`textgrid_tiers/`
+    in the output path by default). With `pattern`, only
+    the TextGrids whose filename matches that glob pattern are modified.
+    With `force=True`, TextGrids with unchanged
+    inputs are modified too. With `profile_path`, the stages of the run are
+    profiled (see 0.2).
+    """
+    from TextGrid_translation import (AsyncTranslationPipeline,
+                                      CachedTranslator)
+
+    (modified_textgrid_output_path, translation_cache_path, export_path,
+     tier_config, transform, script_digest) = set_up_modify(
+        modified_textgrid_input_path, modified_textgrid_output_path,
+        translation_cache_path, tier_config_path, export, export_path)
+
+    profiler = open_profiler(profile_path, "modify", profile_slowest)
+    with profiler.stage("scan files") as record:
+        textgrid_filenames = [
+            textgrid_file.name for textgrid_file in scan_files(
+                modified_textgrid_input_path, extensions=(".TextGrid",),
+                pattern=pattern)]
+        record["items"] = len(textgrid_filenames)
+
+    # Skip the TextGrids that are unchanged since the last run
+    manifest = Manifest(modified_textgrid_output_path, force=force)
+    with profiler.stage("hash inputs", items=len(textgrid_filenames)):
+        input_digests = {
+            textgrid_filename: hash_inputs(
+                files=[join(modified_textgrid_input_path, textgrid_filename)],
+                values=[backend, script_digest])
+            for textgrid_filename in textgrid_filenames}
+    unchanged_filenames = {
+        textgrid_filename for textgrid_filename in textgrid_filenames
+        if is_up_to_date(
+            manifest, textgrid_filename, input_digests[textgrid_filename],
+            participant_id(os.path.splitext(textgrid_filename)[0]),
+            export_path, export_format)}
+    if unchanged_filenames:
+        print(f"Skipping {len(unchanged_filenames)} unchanged TextGrids.\n")
+    textgrid_filenames = [textgrid_filename
+                          for textgrid_filename in textgrid_filenames
+                          if textgrid_filename not in unchanged_filenames]
+
+    # Translate the unique `realization` labels of all TextGrids up front, in
+    # a few bulk requests. The TextGrids below are then translated from the
+    # cache.
+    prefetch_translator = CachedTranslator(
+        backend, translation_cache_path,
+        pipeline=AsyncTranslationPipeline(
+            max_in_flight=max_in_flight,
+            rate=rate,
+            retries=retries,
+            timeout=timeout))
+    prefetch_translations(prefetch_translator, modified_textgrid_input_path,
+                          textgrid_filenames,
+                          transform.source_tiers("translate"), profiler)
+    if prefetch_translator.cache is not None:
+        prefetch_translator.cache.close()
+
+    if batch_mode:
+        # Record each TextGrid in the manifest's journal as soon as it is
+        # written, so that a run that is interrupted resumes with the
+        # remaining TextGrids
+        def record_finished(batch_result):
+            if batch_result.error is None:
+                manifest.record(batch_result.item,
+                                input_digests[batch_result.item])
+
+        # Per-file failures are reported, and the rest of the batch continues
+        batch_results = run_batch(
+            partial(modify_textgrid,
+                    input_path=modified_textgrid_input_path,
+                    output_path=modified_textgrid_output_path,
+                    tier_config=tier_config,
+                    export_path=export_path,
+                    export_format=export_format,
+                    profile=profiler.enabled,
+                    cprofile_path=profiler.cprofile_path),
+            textgrid_filenames,
+            n_workers=workers,
+            chunksize=chunksize,
+            initializer=init_translator,
+            initargs=(backend, translation_cache_path),
+            on_result=record_finished)
+        report_batch(batch_results)
+        for batch_result in batch_results:
+            profiler.add_records(batch_result.result)
+    else:
+        init_translator(backend, translation_cache_path)
+        for textgrid_filename in textgrid_filenames:
+            profiler.add_records(modify_textgrid(
+                textgrid_filename, modified_textgrid_input_path,
+                modified_textgrid_output_path, tier_config=tier_config,
+                export_path=export_path, export_format=export_format,
+                profile=profiler.enabled,
+                cprofile_path=profiler.cprofile_path))
+            manifest.record(textgrid_filename,
+                            input_digests[textgrid_filename])
+
+    manifest.save()
     print("Modified all TextGrids!")
+    close_profiler(profiler, profile_path, "modify", profile_slowest,
+                   input_path=modified_textgrid_input_path)
+
+
+# %%% 2.3: Watch for new TextGrids
+def watch_textgrids(modified_textgrid_input_path,
+                    modified_textgrid_output_path=None,
+                    translation_cache_path=None,
+                    backend=translation_backend, workers=batch_workers,
+                    max_in_flight=translation_max_in_flight,
+                    rate=translation_rate, retries=translation_retries,
+                    timeout=translation_timeout, pattern=None,
+                    tier_config_path=tier_config_path, export=export_enabled,
+                    export_path=None, export_format=export_format,
+                    interval=watch_interval, settle=watch_settle,
+                    stop_after=None):
+    """Modify the TextGrids in `modified_textgrid_input_path` as they arrive.
+
+    Runs until interrupted (Ctrl+C), or for `stop_after` seconds. The folder
+    is polled every `interval` seconds (see `FolderWatcher`), and each new or
+    changed TextGrid is modified, as by `modify_textgrids`, once it has not
+    changed for `settle` seconds. TextGrids that are unchanged since they
+    were last modified, also by earlier runs, are skipped. The worker
+    processes and their translators, the tier config and the manifest are
+    set up once and kept between TextGrids. The other arguments are as for
+    `modify_textgrids`.
+    """
+    from multiprocessing import Pool
+    from TextGrid_translation import (AsyncTranslationPipeline,
+                                      CachedTranslator)
+
+    (modified_textgrid_output_path, translation_cache_path, export_path,
+     tier_config, transform, script_digest) = set_up_modify(
+        modified_textgrid_input_path, modified_textgrid_output_path,
+        translation_cache_path, tier_config_path, export, export_path)
+    translated_tiers = transform.source_tiers("translate")
+    manifest = Manifest(modified_textgrid_output_path)
+    watcher = FolderWatcher(modified_textgrid_input_path,
+                            extensions=(".TextGrid",), pattern=pattern,
+                            settle=settle)
+    prefetch_translator = CachedTranslator(
+        backend, translation_cache_path,
+        pipeline=AsyncTranslationPipeline(
+            max_in_flight=max_in_flight, rate=rate, retries=retries,
+            timeout=timeout))
+    modify = partial(modify_textgrid,
+                     input_path=modified_textgrid_input_path,
+                     output_path=modified_textgrid_output_path,
+                     tier_config=tier_config, export_path=export_path,
+                     export_format=export_format)
+
+    # TextGrids being modified, and those that changed again meanwhile, with
+    # the digests of their inputs
+    pending = {}
+    changed = {}
+
+    def finish(textgrid_filename):
+        digest, async_result = pending.pop(textgrid_filename)
+        if collect(async_result).error is None:
+            manifest.record(textgrid_filename, digest)
+        if textgrid_filename in changed:
+            pending[textgrid_filename] = (changed.pop(textgrid_filename),
+                                          submit(pool, modify,
+                                                 textgrid_filename))
+
+    print(f"Watching '{modified_textgrid_input_path}' for TextGrids. Stop "
+          "with Ctrl+C.\n")
+    started = time.monotonic()
+    with Pool(workers or os.cpu_count() or 1, init_watch_worker,
+              (backend, translation_cache_path)) as pool:
+        try:
+            while stop_after is None or time.monotonic() - started < stop_after:
+                arrived = []
+                for textgrid_file in watcher.poll():
+                    digest = hash_inputs(files=[textgrid_file.path],
+                                         values=[backend, script_digest])
+                    if is_up_to_date(manifest, textgrid_file.name, digest,
+                                     textgrid_file.participant, export_path,
+                                     export_format):
+                        continue
+                    if textgrid_file.name in pending:
+                        changed[textgrid_file.name] = digest
+                    else:
+                        arrived.append((textgrid_file.name, digest))
+
+                if arrived:
+                    prefetch_translations(
+                        prefetch_translator, modified_textgrid_input_path,
+                        [textgrid_filename for textgrid_filename, _
+                         in arrived], translated_tiers, Profiler())
+                    for textgrid_filename, digest in arrived:
+                        pending[textgrid_filename] = (
+                            digest, submit(pool, modify, textgrid_filename))
+
+                for textgrid_filename in [
+                        textgrid_filename for textgrid_filename, (_, result)
+                        in pending.items() if result.ready()]:
+                    finish(textgrid_filename)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopping after the TextGrids being modified.")
+        finally:
+            changed.clear()
+            while pending:
+                finish(next(iter(pending)))
+            manifest.save()
+            if prefetch_translator.cache is not None:
+                prefetch_translator.cache.close()
+    print("Stopped watching.")
+
+
+# %% 3: Run the script
+# Worker processes of the batch mode (see 2.2) may import this script anew,
+# and `TextGrid_cli.py` imports it to run the steps without prompts. Only when
+# run as a script does it ask which steps to run.
+if __name__ == "__main__":
+    # TextGrids whose inputs (audio or TextGrid file, CSV rows and this
+    # script) are unchanged since the last run are skipped, unless run with
+    # `--force`
+    parser = argparse.ArgumentParser(
+        description="Generate and/or modify TextGrid files.")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate all TextGrids, also unchanged ones")
+    args, _ = parser.parse_known_args()
+
+    # %%% 3.1: Choose whether to generate and/or modify TextGrids
+    generate_new_textgrids_enabled = True if input(
+        "Generate new TextGrids from "
+        "CSV input ([y]/n)?: ").lower().strip() == "y" else False
+
+    modify_textgrids_enabled = True if input(
+        "Modify TextGrids ([y]/n)?: ").lower().strip() == "y" else False
+
+    print("\n")
+
+    # %%% 3.2: Define input and output paths, and run the chosen steps
+    if generate_new_textgrids_enabled:
+        input_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
+            "Github/TextGrid-scripts/"
+
+        output_path = "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
+            "Github/TextGrid-scripts/textgrids/"
+
+        if not os.path.exists(output_path):
+            os.mkdir(output_path)
+
+        generate_textgrids(input_path, force=args.force)
+
+    if modify_textgrids_enabled:
+        modified_textgrid_input_path = \
+            "C:/Users/eiten9710/OneDrive - OsloMet/Documents/" + \
+            "Github/TextGrid-scripts/fa_textgrids/"
+
+        modify_textgrids(modified_textgrid_input_path, force=args.force)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Construction of TextGrid tiers from whole arrays of intervals.
+
+Filling a praatio tier with one `insertEntry` call per interval rescans and
+re-sorts the tier on every call, so a tier with n intervals costs O(n²). The
+functions here take all intervals of a tier at once and build the tier in a
+single pass after sorting them.
+
+`ArrayTier` holds a tier as arrays instead of one tuple per interval: times
+in float64 arrays and labels as codes into a shared `LabelTable`. Tiers
+derived from another tier share its time arrays, so that the tiers of whole
+corpora can be kept in memory at once.
+
+File:
+    TextGrid_tiers.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+
+from collections import namedtuple
+
+import numpy as np
+from praatio import textgrid
+from praatio.utilities import errors, utils
+from praatio.utilities.constants import Interval, Point
+
+from TextGrid_io import INTERVAL_TIER, POINT_TIER
+
+
+def build_interval_tier(name, starts, ends, labels, minT=None, maxT=None,
+                        collision_mode="merge",
+                        collision_reporting_mode="warning"):
+    """Build a praatio IntervalTier from arrays of starts, ends and labels.
+
+    The result is the same as inserting the intervals one by one, in the
+    given order, with `tier.insertEntry(entry, collisionMode=...)` into an
+    empty tier from `minT` to `maxT`:
+
+    - with `collision_mode="merge"`, overlapping intervals are fused into one
+      interval from the earliest start to the latest end, with the labels
+      joined by "-";
+    - with `collision_mode="error"`, overlapping intervals raise a
+      `CollisionError`.
+
+    The intervals are merged with `merge_intervals`.
+    """
+    starts, ends, labels = merge_intervals(name, starts, ends, labels,
+                                           collision_mode,
+                                           collision_reporting_mode)
+    return textgrid.IntervalTier(
+        name, list(map(Interval, starts.tolist(), ends.tolist(), labels)),
+        minT, maxT)
+
+
+def merge_intervals(name, starts, ends, labels, collision_mode="merge",
+                    collision_reporting_mode="warning"):
+    """Merge overlapping intervals as `build_interval_tier`, as arrays.
+
+    Returns the starts and ends (float64 arrays) and labels (a list) of the
+    entries of the tier that `build_interval_tier` builds, in time order
+    and with the labels stripped as praatio does, without building the
+    tier. `name` is only used in the messages of collisions.
+
+    Overlapping groups are found with a sweep over the intervals sorted by
+    start time, in O(n log n). Only within a group of overlapping intervals
+    is praatio's insertion order replayed, to join their labels in exactly
+    the same order as `insertEntry` would.
+    """
+    if collision_mode not in ("merge", "error"):
+        raise ValueError("`collision_mode` must be 'merge' or 'error', "
+                         f"not '{collision_mode}'")
+    report_collision = utils.getErrorReporter(collision_reporting_mode)
+
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    labels = labels.tolist() if isinstance(labels, np.ndarray) else list(labels)
+    if not len(starts) == len(ends) == len(labels):
+        raise ValueError("`starts`, `ends` and `labels` differ in length")
+    invalid = np.flatnonzero(starts >= ends)
+    if len(invalid):
+        i = invalid[0]
+        raise errors.ArgumentError(
+            f"Crop error: start time ({starts[i]}) must occur before end "
+            f"time ({ends[i]})")
+    if not len(starts):
+        return starts, ends, []
+
+    # Sort by start time; an interval starts a new group unless it begins
+    # before the latest end of the intervals sorted before it
+    order = np.argsort(starts, kind="stable")
+    sorted_starts = starts[order]
+    latest_ends = np.maximum.accumulate(ends[order])
+    group_starts = np.flatnonzero(
+        np.concatenate(([True], sorted_starts[1:] >= latest_ends[:-1])))
+    group_ends = np.append(group_starts[1:], len(order))
+
+    # Intervals that overlap no other are kept as they are
+    single = order[group_starts[group_ends - group_starts == 1]]
+    merged_starts = [starts[single]]
+    merged_ends = [ends[single]]
+    merged_labels = [labels[i] for i in single.tolist()]
+
+    start_list = starts.tolist()
+    end_list = ends.tolist()
+    for group_start, group_end in zip(group_starts.tolist(),
+                                      group_ends.tolist()):
+        if group_end - group_start == 1:
+            continue
+        if collision_mode == "error":
+            i, j = sorted(order[group_start:group_start + 2].tolist())
+            raise errors.CollisionError(
+                "Attempted to insert interval "
+                f"({start_list[j]}, {end_list[j]}, '{labels[j]}') into tier "
+                f"{name} of textgrid but overlapping entries "
+                f"[{(start_list[i], end_list[i], labels[i])}] already exist")
+        members = sorted(order[group_start:group_end].tolist())
+        intervals = _merge_in_insertion_order(
+            name, [Interval(start_list[i], end_list[i], labels[i])
+                   for i in members], report_collision)
+        merged_starts.append([interval.start for interval in intervals])
+        merged_ends.append([interval.end for interval in intervals])
+        merged_labels.extend(interval.label for interval in intervals)
+
+    # The merged intervals do not overlap, so they are ordered by start
+    starts = np.concatenate(merged_starts)
+    ends = np.concatenate(merged_ends)
+    order = np.argsort(starts, kind="stable")
+    return (starts[order], ends[order],
+            [merged_labels[i].strip() for i in order.tolist()])
+
+
+def _merge_in_insertion_order(name, intervals, report_collision):
+    # Replay `IntervalTier.insertEntry(..., collisionMode="merge")` for one
+    # group of overlapping intervals
+    merged = []
+    for interval in intervals:
+        matches = [entry for entry in merged
+                   if entry.end > interval.start and entry.start < interval.end]
+        if not matches:
+            merged.append(interval)
+            continue
+        merged = [entry for entry in merged if entry not in matches]
+        matches.append(interval)
+        matches.sort()
+        merged.append(Interval(
+            min(match.start for match in matches),
+            max(match.end for match in matches),
+            "-".join(match.label for match in matches)))
+        report_collision(
+            errors.CollisionError,
+            f"Collision warning for ({interval}) with items "
+            f"({matches}) of tier '{name}'")
+    return merged
+
+
+# %% Array-backed tiers
+class LabelTable:
+    """Interned labels: every distinct label is stored once, and tiers refer
+    to it by its code, i.e. its index in `labels`.
+
+    As in praatio, labels are stripped of surrounding whitespace.
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.codes = {}
+        self._array = np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def intern(self, labels):
+        """Return an int32 array with the codes of `labels`."""
+        codes = self.codes
+        for label in dict.fromkeys(labels):
+            if label not in codes:
+                stripped = label.strip()
+                if stripped not in codes:
+                    codes[stripped] = len(self.labels)
+                    self.labels.append(stripped)
+                codes[label] = codes[stripped]
+        return np.fromiter(map(codes.__getitem__, labels), dtype=np.int32,
+                           count=len(labels))
+
+    def lookup(self, codes):
+        """Return the labels of `codes` as a list."""
+        if len(self._array) != len(self.labels):
+            self._array = np.array(self.labels + [""], dtype=object)[:-1]
+        return self._array[codes].tolist()
+
+
+# The table shared by all tiers that are not given one
+label_table = LabelTable()
+
+
+class LabelMap:
+    """A mapping of labels, applied to tiers once per distinct label.
+
+    `function` is given a list of distinct labels and returns their new
+    labels, in the same order. The new code of each label code is memoized
+    per `LabelTable`, so that the tiers of later files only pass the labels
+    not seen before to `function`, and the new codes are spread over the
+    entries of a tier by indexing, without a Python call per entry. A
+    `LabelMap` kept across the files of a batch shares its memo across them.
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self._memos = {}
+
+    def map_codes(self, codes, table):
+        """Return the codes in `table` of the new labels of `codes`."""
+        memo = self._memo(table)
+        missing = np.unique(codes[memo[codes] < 0])
+        if len(missing):
+            labels = list(self.function(table.lookup(missing)))
+            if len(labels) != len(missing):
+                raise ValueError(f"The label function returned {len(labels)} "
+                                 f"labels for {len(missing)}")
+            memo[missing] = table.intern(labels)
+        return memo[codes]
+
+    def apply(self, tier, name=None):
+        """Return `tier` with mapped labels, sharing its time arrays."""
+        codes = self.map_codes(tier.codes, tier.table)
+        codes.flags.writeable = False
+        return tier._replace(name=tier.name if name is None else name,
+                             codes=codes)
+
+    def _memo(self, table):
+        # The new code of each code of `table`, or -1 if not mapped yet,
+        # grown as the table grows
+        memo = self._memos.get(table, np.empty(0, dtype=np.int32))
+        if len(memo) < len(table):
+            grown = np.full(max(len(table), 2 * len(memo)), -1,
+                            dtype=np.int32)
+            grown[:len(memo)] = memo
+            self._memos[table] = memo = grown
+        return memo
+
+
+def _read_only(values, dtype):
+    # A read-only view, so that tiers can share arrays safely
+    values = np.asarray(values, dtype=dtype).view()
+    values.flags.writeable = False
+    return values
+
+
+class ArrayTier(namedtuple("ArrayTier", ["name", "xmin", "xmax", "starts",
+                                         "ends", "codes", "table"])):
+    """An interval tier, or a point tier if `ends` is `None`, as arrays.
+
+    `starts` and `ends` are read-only float64 arrays of times, `codes` a
+    read-only int32 array of label codes in `table`. An `ArrayTier` can take
+    the place of a `TierData` in a `TextGridData`, e.g. to write it with
+    `TextGrid_io.write_textgrid`.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_labels(cls, name, starts, ends, labels, xmin=None, xmax=None,
+                    table=None):
+        """Build a tier from its times and labels.
+
+        As with praatio's tiers, `xmin` and `xmax` default to the times of
+        the first start and the last end, and are widened to cover them.
+        """
+        table = label_table if table is None else table
+        starts = _read_only(starts, np.float64)
+        ends = None if ends is None else _read_only(ends, np.float64)
+        codes = table.intern(list(labels))
+        codes.flags.writeable = False
+        if not len(starts) == len(codes) or (ends is not None
+                                             and len(ends) != len(codes)):
+            raise ValueError("`starts`, `ends` and `labels` differ in length")
+
+        minimums = [] if xmin is None else [float(xmin)]
+        maximums = [] if xmax is None else [float(xmax)]
+        if len(starts):
+            minimums.append(float(starts.min()))
+            maximums.append(float((starts if ends is None else ends).max()))
+        if not minimums or not maximums:
+            raise errors.TimelessTextgridTierException()
+        return cls(name, min(minimums), max(maximums), starts, ends, codes,
+                   table)
+
+    @classmethod
+    def from_tier(cls, tier, table=None):
+        """Build a tier from a praatio tier or a `TierData`."""
+        if isinstance(tier, textgrid.IntervalTier):
+            starts, ends, labels = (list(zip(*tier.entries))
+                                    or ((), (), ()))
+        elif isinstance(tier, textgrid.PointTier):
+            starts, labels = list(zip(*tier.entries)) or ((), ())
+            ends = None
+        else:
+            starts, ends, labels = tier.starts, tier.ends, tier.labels
+        xmin = getattr(tier, "minTimestamp", getattr(tier, "xmin", None))
+        xmax = getattr(tier, "maxTimestamp", getattr(tier, "xmax", None))
+        return cls.from_labels(tier.name, starts, ends, labels, xmin, xmax,
+                               table)
+
+    @property
+    def kind(self):
+        return POINT_TIER if self.ends is None else INTERVAL_TIER
+
+    @property
+    def labels(self):
+        return self.table.lookup(self.codes)
+
+    @property
+    def entries(self):
+        """The praatio `Interval` or `Point` tuples of the tier."""
+        if self.ends is None:
+            return [Point(*entry) for entry in zip(self.starts.tolist(),
+                                                   self.labels)]
+        return [Interval(*entry) for entry in zip(
+            self.starts.tolist(), self.ends.tolist(), self.labels)]
+
+    def derive(self, name, labels=None):
+        """Return a tier with the same times, sharing the time arrays.
+
+        `labels` gives the new label of each entry; by default the labels
+        are kept as well.
+        """
+        if labels is None:
+            return self._replace(name=name)
+        codes = self.table.intern(list(labels))
+        if len(codes) != len(self.codes):
+            raise ValueError("`labels` differs in length from the tier")
+        codes.flags.writeable = False
+        return self._replace(name=name, codes=codes)
+
+    def to_praatio(self):
+        """Convert the tier into a praatio tier."""
+        if self.ends is None:
+            return textgrid.PointTier(self.name, self.entries, self.xmin,
+                                      self.xmax)
+        return textgrid.IntervalTier(self.name, self.entries, self.xmin,
+                                     self.xmax)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays, including those shared with others."""
+        return sum(array.nbytes for array in (self.starts, self.ends,
+                                              self.codes) if array is not None)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Declarative transformations of the tiers of a TextGrid.
+
+The tiers that the scripts add to, rename in and remove from each TextGrid
+are described in a JSON config file (see `tier_configs/`), as the list of
+tiers of the output TextGrid, in order:
+
+    {"tiers": [
+        {"name": "phone", "from": "realization - phone"},
+        {"name": "prosodic unit", "from": "word", "labels": "prosodic_word"},
+        {"name": "stress (PS|SS|0)", "empty": "point"},
+        {"name": "uniquenumb", "csv": "UniqueNumb", "collision_mode": "merge"},
+        {"others": true}
+    ]}
+
+- `"from"` copies a tier: under a new name, this renames it. A tier listed
+  earlier in the config is taken over an input tier of the same name.
+  With `"labels"`, each label is mapped by the named function, e.g. to
+  derive `prosodic unit` from `word`.
+- `"empty"` adds an empty `"point"` or `"interval"` tier over the duration
+  of the TextGrid.
+- `"csv"` adds an interval tier with the intervals of a CSV column (see
+  `Transform.apply`); overlapping intervals are merged or raise an error
+  depending on `"collision_mode"`, as in `merge_intervals`.
+- `{"others": true}` places the input tiers that are not copied by a
+  `"from"` entry; without it, they are removed. Tiers can thus be
+  reordered by listing them in the new order.
+
+`compile_transform` checks a config once and returns a `Transform`, which
+builds the output tiers of each TextGrid in one pass. The tiers are
+`ArrayTier`s: copied and derived tiers share the time arrays of their
+source, and label functions are applied through `LabelMap`s, once per
+distinct label rather than once per entry. A `LabelMap` given in
+`functions` keeps its memo across all TextGrids it is applied to.
+
+File:
+    TextGrid_transform.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+from collections import namedtuple
+
+from TextGrid_io import TextGridData
+from TextGrid_tiers import ArrayTier, LabelMap, merge_intervals
+
+# A step of a compiled transform. `kind` is "from", "empty", "csv" or
+# "others"; `source` is the tier (or for "csv", the column) it is built from,
+# and `source_is_output` whether that is a tier listed earlier in the config.
+# `labels` is the name of the label function, and `function` the function.
+Step = namedtuple("Step", ["kind", "name", "source", "source_is_output",
+                           "labels", "function", "tier_kind",
+                           "collision_mode"])
+
+
+def per_label(function):
+    """Adapt a function of one label to a label function of the config."""
+    def label_function(labels):
+        return [function(label) for label in labels]
+    return label_function
+
+
+# Label functions available to every config. A label function is given the
+# distinct labels of a tier and returns their new labels, in the same order.
+label_functions = {
+    "copy": None,
+    "blank": LabelMap(lambda labels: [""] * len(labels)),
+}
+
+
+def load_config(path):
+    """Read a tier config from a JSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_transform(config, functions=None):
+    """Check `config` and compile it into a `Transform`.
+
+    `functions` maps names of label functions to functions or `LabelMap`s,
+    in addition to those in `label_functions` (see `per_label`). Functions
+    are memoized for the lifetime of the transform. Raises `ValueError` if
+    the config is not valid, e.g. names an unknown function or lists a tier
+    twice.
+    """
+    functions = {name: function if function is None
+                 or isinstance(function, LabelMap) else LabelMap(function)
+                 for name, function in {**label_functions,
+                                        **(functions or {})}.items()}
+    steps = []
+    names = set()
+    for entry in config.get("tiers", []):
+        if entry.get("others"):
+            if any(step.kind == "others" for step in steps):
+                raise ValueError("`others` is given more than once")
+            steps.append(Step("others", None, None, False, None, None, None,
+                              None))
+            continue
+
+        name = entry.get("name")
+        if not name:
+            raise ValueError(f"The tier {entry} has no `name`")
+        if name in names:
+            raise ValueError(f"The tier '{name}' is listed more than once")
+        kinds = [kind for kind in ("from", "empty", "csv") if kind in entry]
+        if len(kinds) != 1:
+            raise ValueError(f"The tier '{name}' needs exactly one of "
+                             "`from`, `empty` and `csv`")
+        kind = kinds[0]
+        source = entry[kind] if kind != "empty" else None
+
+        function = None
+        if "labels" in entry:
+            if kind != "from":
+                raise ValueError(f"The tier '{name}' has `labels`, which "
+                                 "only applies to tiers with `from`")
+            if entry["labels"] not in functions:
+                raise ValueError(
+                    f"Unknown label function '{entry['labels']}' for the "
+                    f"tier '{name}'; known are {sorted(functions)}")
+            function = functions[entry["labels"]]
+        tier_kind = entry.get("empty")
+        if kind == "empty" and tier_kind not in ("point", "interval"):
+            raise ValueError(f"The tier '{name}' must be an empty `point` "
+                             "or `interval` tier")
+        collision_mode = entry.get("collision_mode", "merge")
+        if collision_mode not in ("merge", "error"):
+            raise ValueError(f"`collision_mode` of the tier '{name}' must be "
+                             f"'merge' or 'error', not '{collision_mode}'")
+
+        steps.append(Step(kind, name, source,
+                          kind == "from" and source in names,
+                          entry.get("labels"), function, tier_kind,
+                          collision_mode))
+        names.add(name)
+    return Transform(steps)
+
+
+class Transform:
+    """A compiled tier config, applied to TextGrids with `apply`."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        # The input tiers copied by a step, which `others` leaves out
+        self.copied = {step.source for step in steps
+                       if step.kind == "from" and not step.source_is_output}
+
+    def source_tiers(self, labels):
+        """Return the input tiers whose labels the function `labels` maps.
+
+        Input tiers that are copied unchanged before being mapped are
+        followed, so that e.g. the labels to translate can be collected
+        before the TextGrids are transformed. Labels from CSV columns or
+        other label functions are left out.
+        """
+        steps = {step.name: step for step in self.steps}
+        sources = []
+        for step in self.steps:
+            if step.kind != "from" or step.labels != labels:
+                continue
+            source = step
+            while source is not None and source.source_is_output:
+                source = steps[source.source]
+                if source.kind != "from" or source.function is not None:
+                    source = None
+            if source is not None and source.source not in sources:
+                sources.append(source.source)
+        return sources
+
+    def apply(self, tg, csv_intervals=None):
+        """Return a `TextGridData` with the tiers of the config.
+
+        `tg` is a `TextGridData` (or a praatio Textgrid) whose tiers are
+        converted to `ArrayTier`s if they are not already. `csv_intervals`
+        maps the CSV columns of `"csv"` steps to `(starts, ends, labels)`
+        arrays for this TextGrid. Raises `KeyError` if a source tier or
+        column is missing, and `ValueError` if two output tiers have the
+        same name.
+        """
+        input_tiers = {}
+        for tier in tg.tiers:
+            if not isinstance(tier, ArrayTier):
+                tier = ArrayTier.from_tier(tier)
+            input_tiers[tier.name] = tier
+        xmin = getattr(tg, "xmin", getattr(tg, "minTimestamp", None))
+        xmax = getattr(tg, "xmax", getattr(tg, "maxTimestamp", None))
+
+        result = TextGridData(xmin, xmax, [])
+        output_tiers = {}
+        for step in self.steps:
+            if step.kind == "others":
+                for name, tier in input_tiers.items():
+                    if name not in self.copied:
+                        result.add_tier(tier)
+                continue
+
+            if step.kind == "from":
+                source = (output_tiers if step.source_is_output
+                          else input_tiers).get(step.source)
+                if source is None:
+                    raise KeyError(f"No tier named '{step.source}'")
+                tier = map_labels(source, step.name, step.function)
+            elif step.kind == "empty":
+                tier = ArrayTier.from_labels(
+                    step.name, [], None if step.tier_kind == "point" else [],
+                    [], xmin=0, xmax=xmax)
+            else:
+                starts, ends, labels = (csv_intervals or {})[step.source]
+                starts, ends, labels = merge_intervals(
+                    step.name, starts, ends, labels,
+                    collision_mode=step.collision_mode)
+                tier = ArrayTier.from_labels(step.name, starts, ends, labels,
+                                             xmin=0, xmax=xmax)
+            output_tiers[step.name] = tier
+            result.add_tier(tier)
+        return result
+
+
+def map_labels(tier, name, function=None):
+    """Return `tier` renamed to `name`, with its labels mapped by `function`.
+
+    `function` is a `LabelMap` or a label function, which is applied to the
+    distinct labels of the tier only. The result shares the time arrays of
+    `tier`.
+    """
+    if function is None:
+        return tier.derive(name)
+    if not isinstance(function, LabelMap):
+        function = LabelMap(function)
+    return function.apply(tier, name)
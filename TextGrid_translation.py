@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""Cached and batched translation of TextGrid labels.
+
+`TextGrid_script.py` translates the `realization` labels into English. The
+same realization strings recur across participants, so translations are kept
+in a disk-backed cache keyed by text and language pair, and the labels that
+are not cached yet are sent to the translator in a few bulk requests. The
+translator backend is pluggable: the `stub` backend stands in for Google
+Translate in tests and offline runs.
+
+For the first run over a new corpus, `AsyncTranslationPipeline` keeps several
+requests in flight at once, with rate limiting, retries and timeouts. Its
+throughput and latency can be measured against `FakeTranslationServer`, a
+local server with artificial latency (see `benchmarks/bench_translation.py`).
+
+File:
+    TextGrid_translation.py
+
+Author:
+    Eirik Tengesdal¹˒²
+
+Affiliations:
+    ¹ OsloMet – Oslo Metropolitan University (Assistant Professor of Norwegian)
+    ² University of Oslo (Guest Researcher of Linguistics)
+
+Email:
+    eirik.tengesdal@oslomet.no
+    eirik.tengesdal@iln.uio.no
+    eirik@tengesdal.name
+
+Licence:
+    MIT License
+
+    Copyright (c) 2024 Eirik Tengesdal
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in
+    all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+    DEALINGS IN THE SOFTWARE.
+"""
+
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Google Translate rejects requests of more than 5000 characters
+MAX_REQUEST_CHARS = 4500
+
+
+# %% Translator backends
+# A backend has a single method, `translate_batch(texts, src, dest)`, which
+# returns the translations of `texts` in the same order.
+class GoogleTranslator:
+    """Google Translate via `googletrans`.
+
+    Each thread gets its own `googletrans.Translator`, whose HTTP client is
+    not safe to share between the threads of `AsyncTranslationPipeline`.
+    """
+
+    def __init__(self):
+        # Set up on the first request of a thread, so that runs where every
+        # label is cached do not import `googletrans`
+        self._local = threading.local()
+
+    @property
+    def translator(self):
+        translator = getattr(self._local, "translator", None)
+        if translator is None:
+            from googletrans import Translator
+            # If error, try: `pip install googletrans==4.0.0rc1`
+            translator = self._local.translator = Translator()
+        return translator
+
+    def translate_batch(self, texts, src, dest):
+        # The texts are sent as a list rather than as lines of one text, which
+        # Google may split or join differently, so that each translation is
+        # that of its own text, as when translating one text at a time
+        return [translated.text for translated in self.translator.translate(
+            list(texts), src=src, dest=dest)]
+
+
+class HTTPTranslator:
+    """Translation service taking JSON requests, e.g. `FakeTranslationServer`.
+
+    The request is `{"q": [...], "source": src, "target": dest}`, and the
+    response is `{"translations": [...]}`.
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def translate_batch(self, texts, src, dest):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"q": texts, "source": src,
+                             "target": dest}).encode("utf-8"),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))["translations"]
+
+
+class StubTranslator:
+    """Offline stand-in that returns each text unchanged (or with a prefix)."""
+
+    # Its output is not a translation, so it is kept out of the disk cache
+    cacheable = False
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self.requests = 0
+
+    def translate_batch(self, texts, src, dest):
+        self.requests += 1
+        return [f"{self.prefix}{text}" for text in texts]
+
+
+translator_backends = {
+    "google": GoogleTranslator,
+    "stub": StubTranslator,
+}
+
+
+def get_backend(backend):
+    """Return a backend instance from its name, or `backend` as it is."""
+    if isinstance(backend, str):
+        try:
+            return translator_backends[backend]()
+        except KeyError:
+            raise ValueError(f"Unknown translator backend '{backend}', "
+                             f"choose from {sorted(translator_backends)}")
+    return backend
+
+
+class TranslationError(RuntimeError):
+    """Raised when some texts could not be translated."""
+
+    def __init__(self, texts):
+        super().__init__(f"Could not translate {len(texts)} text(s), "
+                         f"e.g. {texts[0]!r}")
+        self.texts = texts
+
+
+# %% Disk-backed translation cache
+class TranslationCache:
+    """SQLite cache of translations keyed by (text, src, dest).
+
+    When the stored texts and translations exceed `max_size` bytes, the least
+    recently used entries are evicted. The cache file can be shared between
+    processes and between runs.
+    """
+
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text TEXT, src TEXT, dest TEXT, translation TEXT, "
+            "size INTEGER, last_used REAL, "
+            "PRIMARY KEY (text, src, dest))")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS translations_last_used "
+            "ON translations (last_used)")
+        self.connection.commit()
+
+    def get_many(self, texts, src, dest):
+        """Return a dict with the cached translations among `texts`."""
+        found = {}
+        texts = list(texts)
+        # Stay below SQLite's limit on the number of query parameters
+        for i in range(0, len(texts), 500):
+            chunk = texts[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT text, translation FROM translations "
+                f"WHERE src = ? AND dest = ? AND text IN ({placeholders})",
+                [src, dest, *chunk])
+            found.update(rows)
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE translations SET last_used = ? "
+                    "WHERE text = ? AND src = ? AND dest = ?",
+                    [(now, text, src, dest) for text in found])
+        return found
+
+    def put_many(self, translations, src, dest):
+        """Store a dict of translations, evicting old entries if needed."""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                [(text, src, dest, translation,
+                  len(text.encode("utf-8")) + len(translation.encode("utf-8")),
+                  now)
+                 for text, translation in translations.items()])
+        self.evict()
+
+    def size(self):
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def evict(self):
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+        evicted = []
+        rows = self.connection.execute(
+            "SELECT rowid, size FROM translations ORDER BY last_used")
+        for rowid, size in rows:
+            if excess <= 0:
+                break
+            evicted.append((rowid,))
+            excess -= size
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM translations WHERE rowid = ?", evicted)
+
+    def close(self):
+        self.connection.close()
+
+
+# %% Translation with cache and batching
+class CachedTranslator:
+    """Translate labels through a cache, batching the uncached ones.
+
+    `backend` is a backend instance or the name of one (see
+    `translator_backends`). Without a `cache` (or a path to one), the
+    translations are only kept in memory for the lifetime of the object.
+    With a `pipeline` (an `AsyncTranslationPipeline`), the uncached texts are
+    translated concurrently rather than one request after the other.
+    """
+
+    def __init__(self, backend="google", cache=None,
+                 batch_chars=MAX_REQUEST_CHARS, pipeline=None):
+        self.backend = get_backend(backend)
+        if not getattr(self.backend, "cacheable", True):
+            cache = None
+        if isinstance(cache, (str, os.PathLike)):
+            cache = TranslationCache(cache)
+        self.cache = cache
+        self.batch_chars = batch_chars
+        self.pipeline = pipeline
+        self.memory = {}
+
+    def translate(self, text, src="no", dest="en"):
+        return self.translate_many([text], src, dest)[text]
+
+    def translate_many(self, texts, src="no", dest="en"):
+        """Return a dict mapping each of `texts` to its translation.
+
+        Empty labels are left as they are. Every unique text is looked up
+        once; the ones missing from the cache are translated in bulk.
+        """
+        translations = {"": ""}
+        memory = self.memory.setdefault((src, dest), {})
+        missing = []
+        for text in dict.fromkeys(texts):
+            if text in translations:
+                continue
+            if text in memory:
+                translations[text] = memory[text]
+            else:
+                missing.append(text)
+
+        if missing and self.cache is not None:
+            cached = self.cache.get_many(missing, src, dest)
+            translations.update(cached)
+            missing = [text for text in missing if text not in cached]
+
+        failed = []
+        if missing:
+            if self.pipeline is not None:
+                new_translations = run_coroutine(self.pipeline.translate_all(
+                    self.backend, missing, src, dest))
+                failed = [text for text in missing
+                          if text not in new_translations]
+            else:
+                new_translations = {}
+                for batch in batches(missing, self.batch_chars):
+                    new_translations.update(zip(
+                        batch, self.backend.translate_batch(batch, src, dest)))
+            if self.cache is not None and new_translations:
+                self.cache.put_many(new_translations, src, dest)
+            translations.update(new_translations)
+
+        memory.update(translations)
+        if failed:
+            raise TranslationError(failed)
+        return translations
+
+
+def batches(texts, max_chars=MAX_REQUEST_CHARS, max_texts=None):
+    """Group texts into requests of at most `max_chars` characters."""
+    batch, chars = [], 0
+    for text in texts:
+        if batch and (chars + len(text) + 1 > max_chars
+                      or len(batch) == max_texts):
+            yield batch
+            batch, chars = [], 0
+        batch.append(text)
+        chars += len(text) + 1
+    if batch:
+        yield batch
+
+
+def run_coroutine(coroutine):
+    """Run `coroutine` to completion, also from within a running event loop.
+
+    Spyder and Jupyter already run an event loop in the main thread, in
+    which case the coroutine is run in a separate thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    result = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as error:
+            result["error"] = error
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+# %% Concurrent translation
+class TokenBucket:
+    """Token-bucket rate limiter allowing `rate` requests per second.
+
+    Up to `capacity` requests may be sent in a burst after an idle period.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncTranslationPipeline:
+    """Translate many texts with a bounded number of requests in flight.
+
+    At most `max_in_flight` requests run at the same time, and no more than
+    `rate` requests per second are started (`None` for no limit). A request
+    that fails or takes longer than `timeout` seconds is retried up to
+    `retries` times, waiting `backoff`, 2 × `backoff`, 4 × `backoff`, ...
+    seconds in between. Texts still failing after that are left out of the
+    result. Latencies and counts of the last run are kept in `stats()`.
+
+    A blocking backend cannot be interrupted, so a request that times out is
+    abandoned rather than cancelled: it keeps its thread, and its place among
+    the `max_in_flight` requests, until the backend returns.
+    """
+
+    def __init__(self, max_in_flight=8, rate=None, burst=None, retries=3,
+                 backoff=0.5, timeout=10.0, batch_chars=MAX_REQUEST_CHARS):
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.batch_chars = batch_chars
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.latencies = []
+        self.attempts = 0
+        self.abandoned = 0
+        self.failures = 0
+        self.elapsed = 0.0
+        self.n_texts = 0
+
+    async def translate_all(self, backend, texts, src="no", dest="en"):
+        """Return a dict mapping the unique `texts` to their translations."""
+        self._reset_stats()
+        texts = list(dict.fromkeys(texts))
+        self.n_texts = len(texts)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+
+        # Spread the texts across at least `max_in_flight` requests
+        max_texts = max(1, -(-len(texts) // self.max_in_flight))
+        requests = list(batches(texts, self.batch_chars, max_texts))
+
+        # Blocking backends get one thread per request in flight. Since
+        # abandoned requests keep their place in `semaphore` until their
+        # thread is done, a request never waits for a free thread.
+        executor = ThreadPoolExecutor(self.max_in_flight)
+
+        start = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(
+                self._translate_batch(backend, batch, src, dest, bucket,
+                                      executor, semaphore)
+                for batch in requests))
+        finally:
+            executor.shutdown(wait=False)
+        self.elapsed = time.perf_counter() - start
+
+        translations = {}
+        for batch, result in zip(requests, results):
+            if result is not None:
+                translations.update(zip(batch, result))
+        return translations
+
+    async def _translate_batch(self, backend, batch, src, dest, bucket,
+                               executor, semaphore):
+        for attempt in range(self.retries + 1):
+            # The place in `semaphore` is given back when the backend is done
+            # with the request, not when it times out
+            await semaphore.acquire()
+            if bucket is not None:
+                await bucket.acquire()
+            self.attempts += 1
+            sent = time.perf_counter()
+            if hasattr(backend, "translate_batch_async"):
+                # A coroutine is cancelled when it times out
+                request = asyncio.ensure_future(
+                    backend.translate_batch_async(batch, src, dest))
+                waited = request
+            else:
+                # A thread cannot be cancelled, so only the waiting for it is
+                request = asyncio.get_running_loop().run_in_executor(
+                    executor, backend.translate_batch, batch, src, dest)
+                waited = asyncio.shield(request)
+            request.add_done_callback(lambda _: semaphore.release())
+            try:
+                result = await asyncio.wait_for(waited, self.timeout)
+                if len(result) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} translations, "
+                                     f"got {len(result)}")
+                self.latencies.append(time.perf_counter() - sent)
+                return result
+            except Exception:
+                if not request.done():
+                    # Timed out while the thread is still running
+                    self.abandoned += 1
+                if attempt == self.retries:
+                    break
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        self.failures += 1
+        return None
+
+    def stats(self):
+        """Throughput and latency percentiles (in seconds) of the last run."""
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return latencies[round(q * (len(latencies) - 1))]
+
+        return {
+            "texts": self.n_texts,
+            "requests": len(latencies) + self.failures,
+            "attempts": self.attempts,
+            "abandoned": self.abandoned,
+            "failures": self.failures,
+            "elapsed": self.elapsed,
+            "texts_per_second": (self.n_texts / self.elapsed
+                                 if self.elapsed else None),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+
+# %% Fake translation server for tests and benchmarks
+class FakeTranslationServer:
+    """Local HTTP translation service that adds artificial latency.
+
+    Every request sleeps for `latency` seconds (plus up to `jitter` seconds)
+    and fails with status 503 with probability `failure_rate`. Texts are
+    "translated" by adding `prefix`. Use it as a context manager, with
+    `HTTPTranslator(server.url)` as the backend. `requests` counts the
+    requests, and `peak_in_flight` the most handled at the same time.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, failure_rate=0.0,
+                 prefix="en:", host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.prefix = prefix
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                body = json.loads(self.rfile.read(length).decode("utf-8"))
+                with server.lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight,
+                                                server.in_flight)
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+                with server.lock:
+                    server.in_flight -= 1
+                if random.random() < server.failure_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                data = json.dumps({"translations": [
+                    f"{server.prefix}{text}" for text in body["q"]]})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(data.encode("utf-8"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://%s:%d/" % self.httpd.server_address[:2]
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the generate, modify and prosodic-annotate steps.
+
+Writes a synthetic corpus (see `synthetic_corpus.py`), runs each step of
+`TextGrid_cli.py` on it in a fresh Python process, with the stub translator
+so that no network requests are made, and reports the throughput (files per
+second), the peak resident memory of the main process and of its worker
+processes, and the time spent in each stage (from `--profile`, see
+`TextGrid_profile.py`). Each step is run `--repeat` times and the median run
+is kept. The stages are taken from one more run with `--profile`, since
+tracing memory slows a run down and would skew the throughput.
+
+Every run is cold: it regenerates all TextGrids (`--force`), and the caches
+that outlive a run (the audio duration catalog, the Feather cache of the
+annotation sheet and the translation cache) are kept in a fresh temporary
+folder per run, or disabled, so that later runs do not measure cache hits.
+
+The results can be stored as JSON with `--output`, and two stored results,
+e.g. of two versions of the scripts, compared with `--compare`. To benchmark
+another checkout of the scripts (e.g. a `git worktree` of an earlier commit)
+on the same corpus, pass it with `--repository`; stages are only reported
+for versions with `--profile`.
+
+Usage:
+    python benchmarks/bench_pipelines.py --files 200 --output new.json
+    python benchmarks/bench_pipelines.py --repository ../old --output old.json
+    python benchmarks/bench_pipelines.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_corpus import write_corpus
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child process: runs a subcommand, then reports its peak memory
+# and that of its largest worker process (`resource` is not available on
+# Windows, where the memory is not reported)
+CHILD = """
+import contextlib, io, json, sys
+sys.path.insert(0, {repository!r})
+import TextGrid_cli
+with contextlib.redirect_stdout(io.StringIO()):
+    TextGrid_cli.main({arguments!r})
+try:
+    import resource
+except ImportError:
+    print(json.dumps([None, None]))
+else:
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps([
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale]))
+"""
+
+
+def pipelines(corpus, workers):
+    """Return the arguments of each step on the corpus in `corpus`."""
+    modify = ["modify", "--input-path", os.path.join(corpus, "fa_textgrids"),
+              "--backend", "stub"]
+    if workers is not None:
+        modify += ["--workers", str(workers)]
+    return {
+        "generate": ["generate", "--input-path", corpus],
+        "modify": modify,
+        "prosodic-annotate": [
+            "prosodic-annotate",
+            "--csv", os.path.join(corpus, "NWD_june23.csv"),
+            "--input-path", os.path.join(corpus, "NorwegianTextGrids")],
+    }
+
+
+# Options of each step that keep the caches of a run out of the corpus, given
+# the folder for the caches of the run. Versions of the scripts without an
+# option (see `cold_arguments`) have no such cache.
+COLD_OPTIONS = {
+    "generate": {"--duration-catalog": "duration_catalog.sqlite"},
+    "modify": {"--translation-cache": "translation_cache.sqlite"},
+    "prosodic-annotate": {"--no-csv-cache": None},
+}
+
+
+def cli_source(repository):
+    with open(os.path.join(repository, "TextGrid_cli.py"),
+              encoding="utf-8") as f:
+        return f.read()
+
+
+def supports_profile(repository):
+    return "--profile" in cli_source(repository)
+
+
+def cold_arguments(repository, name, cache_directory):
+    """Return the options that make a run of step `name` cold."""
+    source = cli_source(repository)
+    arguments = []
+    for option, filename in COLD_OPTIONS[name].items():
+        if f'"{option}"' not in source:
+            continue
+        arguments.append(option)
+        if filename is not None:
+            arguments.append(os.path.join(cache_directory, filename))
+    return arguments
+
+
+def stage_totals(profile_path):
+    """Return the stage totals of the last run in a profile file."""
+    stages = {}
+    with open(profile_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "stage":
+                stages[record["stage"]] = {
+                    key: record[key]
+                    for key in ("calls", "seconds", "items", "peak_bytes")}
+    return stages
+
+
+def run_step(repository, arguments):
+    """Run a step in a fresh process, return its time and peak memory."""
+    code = CHILD.format(repository=repository, arguments=arguments)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", code],
+                             capture_output=True, text=True, cwd=repository)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"'{' '.join(arguments)}' failed:\n"
+                           f"{process.stderr}")
+    peak_rss, peak_worker_rss = json.loads(process.stdout.splitlines()[-1])
+    return seconds, peak_rss, peak_worker_rss or None
+
+
+def run_cold(repository, name, arguments):
+    """Run step `name` cold, with its caches in a new temporary folder."""
+    with tempfile.TemporaryDirectory() as cache_directory:
+        return run_step(repository, [
+            *arguments, "--force",
+            *cold_arguments(repository, name, cache_directory)])
+
+
+def run_pipeline(repository, name, arguments, n_files, repeat, profile):
+    """Run a step `repeat` times, return the results of the median run."""
+    runs = [run_cold(repository, name, arguments) for _ in range(repeat)]
+    seconds, peak_rss, peak_worker_rss = sorted(runs)[(len(runs) - 1) // 2]
+    result = {
+        "seconds": seconds,
+        "files_per_second": n_files / seconds,
+        "peak_rss_bytes": peak_rss,
+        "peak_worker_rss_bytes": peak_worker_rss,
+        "all_seconds": [run[0] for run in runs],
+        "stages": None,
+    }
+
+    if profile:
+        descriptor, profile_path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(descriptor)
+        try:
+            run_cold(repository, name,
+                     [*arguments, "--profile", profile_path])
+            result["stages"] = stage_totals(profile_path)
+        finally:
+            os.remove(profile_path)
+    return result
+
+
+def git_commit(repository):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=repository, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(args):
+    repository = os.path.abspath(args.repository)
+    profile = supports_profile(repository)
+    results = {
+        "repository": repository,
+        "commit": git_commit(repository),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"files": args.files, "seconds": args.seconds,
+                   "seed": args.seed},
+        "workers": args.workers,
+        "repeat": args.repeat,
+        "pipelines": {},
+    }
+    with tempfile.TemporaryDirectory() as corpus:
+        write_corpus(corpus, args.files, args.seconds, seed=args.seed)
+        for name, arguments in pipelines(corpus, args.workers).items():
+            if args.pipelines and name not in args.pipelines:
+                continue
+            result = run_pipeline(repository, name, arguments, args.files,
+                                  args.repeat, profile)
+            results["pipelines"][name] = result
+            print_result(name, result)
+    return results
+
+
+def megabytes(size):
+    return "" if size is None else f"{size / 1e6:.0f}"
+
+
+def print_result(name, result):
+    print(f"{name}: {result['files_per_second']:.1f} files/s, "
+          f"{result['seconds']:.2f} s, peak RSS "
+          f"{megabytes(result['peak_rss_bytes']) or '?'} MB (workers "
+          f"{megabytes(result['peak_worker_rss_bytes']) or '-'} MB)")
+    for stage, totals in (result["stages"] or {}).items():
+        print(f"    {stage:<24} {totals['seconds']:>8.3f} s "
+              f"{totals['calls']:>6} calls")
+
+
+def compare(old_path, new_path):
+    """Print the change in throughput and memory from `old` to `new`."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old: {old['commit']} ({old['date']}), "
+          f"new: {new['commit']} ({new['date']})")
+    if old["corpus"] != new["corpus"]:
+        print(f"Note: the corpora differ: {old['corpus']} and "
+              f"{new['corpus']}")
+    print(f"\n{'':<20} {'files/s old':>12} {'new':>8} {'ratio':>6}  "
+          f"{'peak MB old':>11} {'new':>6} {'ratio':>6}")
+    for name, new_result in new["pipelines"].items():
+        old_result = old["pipelines"].get(name)
+        if old_result is None:
+            continue
+        speed = (new_result["files_per_second"]
+                 / old_result["files_per_second"])
+        old_rss = old_result["peak_rss_bytes"]
+        new_rss = new_result["peak_rss_bytes"]
+        rss = f"{new_rss / old_rss:>6.2f}" if old_rss and new_rss else ""
+        print(f"{name:<20} {old_result['files_per_second']:>12.1f} "
+              f"{new_result['files_per_second']:>8.1f} {speed:>6.2f}  "
+              f"{megabytes(old_rss):>11} {megabytes(new_rss):>6} {rss}")
+
+        stages = {**(old_result["stages"] or {}),
+                  **(new_result["stages"] or {})}
+        for stage in stages:
+            old_seconds = (old_result["stages"] or {}).get(stage, {}).get(
+                "seconds")
+            new_seconds = (new_result["stages"] or {}).get(stage, {}).get(
+                "seconds")
+            print(f"    {stage:<24} "
+                  f"{'' if old_seconds is None else f'{old_seconds:.3f}':>8} "
+                  f"{'' if new_seconds is None else f'{new_seconds:.3f}':>8}"
+                  " s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=3,
+                        help="mean length of the audio clips")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int,
+                        help="worker processes of `modify` (default: all "
+                        "CPU cores)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pipelines", nargs="+",
+                        choices=["generate", "modify", "prosodic-annotate"])
+    parser.add_argument("--repository", default=REPOSITORY,
+                        help="checkout of the scripts to benchmark")
+    parser.add_argument("--output", help="store the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two stored results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote the results to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Benchmark of the start-up time of each `TextGrid_cli.py` subcommand.
+
+Runs each subcommand in a fresh Python process on empty inputs (a CSV file
+with only its header and a folder without TextGrids or audio files), so that
+the time measured is what a subcommand spends on imports and set-up before
+it starts on any file. Reports the median time over the runs, next to that
+of a bare interpreter, and which of the heavier dependencies each subcommand
+loads.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies reported as loaded or not
+HEAVY_MODULES = ["numpy", "pandas", "praatio", "googletrans", "ffmpeg",
+                 "sqlite3", "asyncio"]
+
+CHILD = """
+import contextlib, io, json, sys
+sys.path.insert(0, {repository!r})
+import TextGrid_cli
+with contextlib.redirect_stdout(io.StringIO()):
+    TextGrid_cli.main({arguments!r})
+print(json.dumps([name for name in {modules!r} if name in sys.modules]))
+"""
+
+
+def empty_inputs(directory):
+    """Write empty inputs for each subcommand, return their arguments."""
+    with open(os.path.join(directory, "realization.csv"), "w",
+              encoding="utf-8-sig") as f:
+        f.write("participant;audio_filename;duration;realization\n")
+    csv_path = os.path.join(directory, "NWD_june23.csv")
+    with open(csv_path, "w", encoding="utf-16") as f:
+        f.write("Informant,UniqueNumb,SoundMatch,Begin.Time...ss.msec,"
+                "End.Time...ss.msec,Realization\n")
+    textgrid_path = os.path.join(directory, "textgrids")
+    os.mkdir(textgrid_path)
+    return {
+        "generate": ["generate", "--input-path", directory],
+        "modify": ["modify", "--input-path", textgrid_path,
+                   "--backend", "google"],
+        "prosodic-annotate": ["prosodic-annotate", "--csv", csv_path,
+                              "--input-path", textgrid_path],
+    }
+
+
+def start_up(arguments, repeat):
+    """Return the median time of a run and the heavy modules loaded."""
+    code = CHILD.format(repository=REPOSITORY, arguments=arguments,
+                        modules=HEAVY_MODULES)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], check=True,
+                                capture_output=True, text=True).stdout
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    bare = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        bare.append(time.perf_counter() - start)
+    bare = statistics.median(bare)
+
+    print(f"{'':<20} {'median (ms)':>12} {'over bare (ms)':>15}  loads")
+    print(f"{'python -c pass':<20} {bare * 1000:>12.0f}")
+    with tempfile.TemporaryDirectory() as directory:
+        for command, arguments in empty_inputs(directory).items():
+            median, loaded = start_up(arguments, args.repeat)
+            print(f"{command:<20} {median * 1000:>12.0f} "
+                  f"{(median - bare) * 1000:>15.0f}  {', '.join(loaded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Benchmark of the fast TextGrid reader and writer against praatio.
+
+Writes a synthetic phone-aligned TextGrid of the given length (one hour by
+default, with `realization - phone`, `realization - word` and
+`realization - trans` tiers as output by Autophon), then times reading and
+writing it with praatio and with `TextGrid_io`, and checks that both write
+the same bytes.
+
+Usage:
+    python benchmarks/bench_textgrid_io.py --minutes 60
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from praatio import textgrid  # noqa: E402
+from TextGrid_io import open_textgrid, read_textgrid, write_textgrid  # noqa: E402,E501
+
+PHONES = ["a", "e", "i", "o", "u", "l", "r", "n", "s", "t", "k", "ʃ", "ø"]
+
+
+def phone_aligned_textgrid(seconds, seed=0):
+    """Return a praatio Textgrid with ~12 phones and ~3 words per second."""
+    rng = np.random.default_rng(seed)
+    n_phones = int(seconds * 12)
+    boundaries = np.round(np.sort(rng.uniform(0, seconds, n_phones - 1)), 4)
+    boundaries = np.unique(np.concatenate(([0.0], boundaries, [seconds])))
+    phones = [(start, end, PHONES[i % len(PHONES)])
+              for i, (start, end)
+              in enumerate(zip(boundaries[:-1].tolist(),
+                               boundaries[1:].tolist()))]
+    word_boundaries = boundaries[::4].tolist()
+    if word_boundaries[-1] != seconds:
+        word_boundaries.append(seconds)
+    words = [(start, end, f"ord{i}")
+             for i, (start, end)
+             in enumerate(zip(word_boundaries[:-1], word_boundaries[1:]))]
+
+    tg = textgrid.Textgrid()
+    tg.addTier(textgrid.IntervalTier("realization - phone", phones, 0, seconds))
+    tg.addTier(textgrid.IntervalTier("realization - word", words, 0, seconds))
+    tg.addTier(textgrid.IntervalTier("realization - trans",
+                                     [(0, seconds, "i fjor ga løperen opp")],
+                                     0, seconds))
+    return tg
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.TextGrid")
+        phone_aligned_textgrid(args.minutes * 60).save(
+            path, format="long_textgrid", includeBlankSpaces=True)
+        n_intervals = sum(len(tier.entries) for tier in
+                          textgrid.openTextgrid(path, True).tiers)
+        print(f"{args.minutes:g} minutes, {n_intervals} intervals, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB\n")
+
+        praatio_tg = textgrid.openTextgrid(path, True)
+        fast_tg = read_textgrid(path)
+        rows = []
+        for format in ("long_textgrid", "short_textgrid"):
+            praatio_path = os.path.join(directory, f"praatio.{format}")
+            fast_path = os.path.join(directory, f"fast.{format}")
+            praatio_time = timed(lambda: praatio_tg.save(
+                praatio_path, format=format, includeBlankSpaces=True),
+                args.repeat)
+            fast_time = timed(lambda: write_textgrid(
+                fast_tg, fast_path, format=format), args.repeat)
+            with open(praatio_path, "rb") as f, open(fast_path, "rb") as g:
+                assert f.read() == g.read(), f"{format} output differs"
+            rows.append((f"write {format}", praatio_time, fast_time))
+            rows.append((f"write {format} from praatio", praatio_time,
+                         timed(lambda: write_textgrid(
+                             praatio_tg, fast_path, format=format),
+                             args.repeat)))
+            with open(praatio_path, "rb") as f, open(fast_path, "rb") as g:
+                assert f.read() == g.read(), f"{format} output differs"
+
+            read_path = praatio_path
+            rows.append((f"read {format}",
+                         timed(lambda: textgrid.openTextgrid(read_path, True),
+                               args.repeat),
+                         timed(lambda: read_textgrid(read_path),
+                               args.repeat)))
+        rows.append(("read into praatio Textgrid",
+                     timed(lambda: textgrid.openTextgrid(path, True),
+                           args.repeat),
+                     timed(lambda: open_textgrid(path), args.repeat)))
+
+        print(f"{'':<32} {'praatio (s)':>12} {'TextGrid_io (s)':>16} "
+              f"{'speed-up':>9}")
+        for name, praatio_time, fast_time in rows:
+            print(f"{name:<32} {praatio_time:>12.3f} {fast_time:>16.3f} "
+                  f"{praatio_time / fast_time:>8.1f}×")
+
+
+if __name__ == "__main__":
+    main()
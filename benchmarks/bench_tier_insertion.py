@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark of bulk tier construction against repeated `insertEntry`.
+
+Builds an interval tier from n random intervals, a share of which overlap,
+once with `build_interval_tier` and once by calling praatio's
+`insertEntry(..., collisionMode="merge")` per interval, and checks that both
+give the same tier. Repeated insertion is O(n²) and takes very long for 100k
+intervals, so it is skipped above `--max-insert` intervals.
+
+Usage:
+    python benchmarks/bench_tier_insertion.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from praatio import textgrid  # noqa: E402
+from TextGrid_tiers import build_interval_tier  # noqa: E402
+
+
+def random_intervals(n, overlap=0.1, seed=0):
+    """Return n intervals in random order, about `overlap` of them overlapping."""
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.05, 0.5, n)
+    gaps = rng.uniform(0.0, 0.2, n)
+    starts = np.cumsum(durations + gaps) - durations
+    ends = starts + durations
+    # Stretch some intervals into the next one
+    stretched = rng.random(n) < overlap
+    ends[stretched] += durations[stretched] + gaps[stretched]
+    order = rng.permutation(n)
+    labels = np.array([str(i) for i in range(n)])
+    return starts[order], ends[order], labels[order]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--overlap", type=float, default=0.1,
+                        help="share of intervals overlapping the next one")
+    parser.add_argument("--max-insert", type=int, default=10000,
+                        help="largest size to time repeated insertEntry for")
+    args = parser.parse_args()
+
+    print(f"{'intervals':>10} {'bulk (s)':>10} {'insertEntry (s)':>16} "
+          f"{'speed-up':>9}")
+    for n in args.sizes:
+        starts, ends, labels = random_intervals(n, args.overlap)
+        maxT = float(ends.max())
+
+        # Collision warnings are printed by both; they are not timed output
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            bulk_tier = build_interval_tier("tier", starts, ends, labels,
+                                            minT=0, maxT=maxT)
+            bulk_time = time.perf_counter() - start
+
+            insert_time = None
+            if n <= args.max_insert:
+                start = time.perf_counter()
+                tier = textgrid.IntervalTier("tier", [], minT=0, maxT=maxT)
+                for entry in zip(starts.tolist(), ends.tolist(),
+                                 labels.tolist()):
+                    tier.insertEntry(entry, collisionMode="merge")
+                insert_time = time.perf_counter() - start
+                assert tier.entries == bulk_tier.entries
+
+        if insert_time is None:
+            print(f"{n:>10} {bulk_time:>10.3f} {'skipped':>16} {'':>9}")
+        else:
+            print(f"{n:>10} {bulk_time:>10.3f} {insert_time:>16.3f} "
+                  f"{insert_time / bulk_time:>8.0f}×")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark of the memory held by praatio tiers and by `ArrayTier`s.
+
+Builds the tiers of `TextGrid_script.py` (`phone`, `word`, `realization`,
+`translation (Google)` and `prosodic unit`) for a number of synthetic
+phone-aligned TextGrids, once as praatio tiers derived with `tier.new` and
+once as `ArrayTier`s derived with `ArrayTier.derive`, and reports the memory
+allocated for each corpus with `tracemalloc`.
+
+Usage:
+    python benchmarks/bench_tier_memory.py --files 20 --minutes 5
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_textgrid_io import phone_aligned_textgrid  # noqa: E402
+from TextGrid_tiers import ArrayTier, LabelTable  # noqa: E402
+
+
+def praatio_tiers(tg):
+    phone_tier = tg.getTier("realization - phone").new(name="phone")
+    word_tier = tg.getTier("realization - word").new(name="word")
+    realization_tier = tg.getTier("realization - trans").new(
+        name="realization")
+    translation_tier = realization_tier.new(
+        name="translation (Google)",
+        entries=[(start, stop, label.upper())
+                 for start, stop, label in realization_tier.entries])
+    prosodic_unit_tier = word_tier.new(
+        name="prosodic unit",
+        entries=[(start, stop, "ω") for start, stop, label
+                 in word_tier.entries])
+    return [phone_tier, word_tier, realization_tier, translation_tier,
+            prosodic_unit_tier]
+
+
+def array_tiers(tg, table):
+    phone_tier = ArrayTier.from_tier(tg.getTier("realization - phone"),
+                                     table).derive("phone")
+    word_tier = ArrayTier.from_tier(tg.getTier("realization - word"),
+                                    table).derive("word")
+    realization_tier = ArrayTier.from_tier(
+        tg.getTier("realization - trans"), table).derive("realization")
+    translation_tier = realization_tier.derive(
+        "translation (Google)",
+        [label.upper() for label in realization_tier.labels])
+    prosodic_unit_tier = word_tier.derive(
+        "prosodic unit", ["ω"] * len(word_tier.codes))
+    return [phone_tier, word_tier, realization_tier, translation_tier,
+            prosodic_unit_tier]
+
+
+def allocated(build, textgrids):
+    tracemalloc.start()
+    corpus = [build(tg) for tg in textgrids]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    n_entries = sum(len(tier.entries) for tiers in corpus for tier in tiers)
+    return size, n_entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--minutes", type=float, default=5)
+    args = parser.parse_args()
+
+    textgrids = [phone_aligned_textgrid(args.minutes * 60, seed=seed)
+                 for seed in range(args.files)]
+    table = LabelTable()
+    praatio_size, n_entries = allocated(praatio_tiers, textgrids)
+    array_size, _ = allocated(lambda tg: array_tiers(tg, table), textgrids)
+
+    print(f"{args.files} files of {args.minutes:g} minutes, "
+          f"{n_entries} entries in 5 tiers per file\n")
+    print(f"{'':<16} {'MB':>8} {'bytes/entry':>12}")
+    for name, size in (("praatio tiers", praatio_size),
+                       ("ArrayTier", array_size)):
+        print(f"{name:<16} {size / 1e6:>8.1f} {size / n_entries:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
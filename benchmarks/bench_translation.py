@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Benchmark of the concurrent translation pipeline.
+
+Translates synthetic labels through `FakeTranslationServer`, a local server
+that adds artificial latency to each request, first one request at a time and
+then with `AsyncTranslationPipeline` at increasing numbers of requests in
+flight. Prints throughput and latency percentiles for each run.
+
+Usage:
+    python benchmarks/bench_translation.py --texts 500 --latency 0.05
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TextGrid_translation import (AsyncTranslationPipeline,  # noqa: E402
+                                  FakeTranslationServer, HTTPTranslator,
+                                  run_coroutine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--texts", type=int, default=500,
+                        help="number of unique labels to translate")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="artificial latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.02,
+                        help="additional random latency per request (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.02,
+                        help="share of requests failing with status 503")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="rate limit (requests per second)")
+    parser.add_argument("--batch-chars", type=int, default=200,
+                        help="maximum characters per request")
+    parser.add_argument("--in-flight", type=int, nargs="+",
+                        default=[1, 4, 16, 64],
+                        help="numbers of requests in flight to compare")
+    args = parser.parse_args()
+
+    texts = [f"realisering nummer {i}" for i in range(args.texts)]
+
+    with FakeTranslationServer(latency=args.latency, jitter=args.jitter,
+                               failure_rate=args.failure_rate) as server:
+        backend = HTTPTranslator(server.url)
+        print(f"{'in flight':>9} {'texts/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'retries':>8} {'failed':>7}")
+        for max_in_flight in args.in_flight:
+            pipeline = AsyncTranslationPipeline(
+                max_in_flight=max_in_flight, rate=args.rate, retries=5,
+                backoff=0.05, timeout=max(1.0, 20 * args.latency),
+                batch_chars=args.batch_chars)
+            start = time.perf_counter()
+            translations = run_coroutine(
+                pipeline.translate_all(backend, texts))
+            assert all(translations[text] == f"en:{text}"
+                       for text in translations)
+            stats = pipeline.stats()
+            print(f"{max_in_flight:>9} "
+                  f"{len(translations) / (time.perf_counter() - start):>9.1f} "
+                  f"{stats['p50'] * 1000:>8.1f} {stats['p95'] * 1000:>8.1f} "
+                  f"{stats['p99'] * 1000:>8.1f} "
+                  f"{stats['attempts'] - stats['requests']:>8} "
+                  f"{stats['failures']:>7}")
+
+
+if __name__ == "__main__":
+    main()
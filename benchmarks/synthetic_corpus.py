@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Generator of synthetic input corpora for the TextGrid scripts.
+
+Writes, for a given number of files, the inputs of each pipeline in the
+layout the scripts expect:
+
+    <root>/<item>_<participant>.wav      silent audio clips
+    <root>/realization.csv               rows per audio file (generate)
+    <root>/fa_textgrids/                 Autophon-style TextGrids with
+                                         `realization - phone`, `- word` and
+                                         `- trans` tiers (modify)
+    <root>/NorwegianTextGrids/           TextGrids with `word` and `phone`
+                                         tiers, one per participant
+    <root>/NWD_june23.csv                UTF-16 sheet of intervals per
+                                         informant (prosodic-annotate)
+
+The corpus is determined by the arguments and the seed, so that two versions
+of the scripts can be benchmarked on the same inputs.
+
+Usage:
+    python benchmarks/synthetic_corpus.py corpus/ --files 200 --seconds 3
+"""
+
+import argparse
+import csv
+import os
+import sys
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from praatio import textgrid  # noqa: E402
+from TextGrid_io import write_textgrid  # noqa: E402
+
+WORDS = ["i", "fjor", "ga", "løperen", "opp", "under", "siste", "runde",
+         "han", "hun", "kom", "hjem", "sent", "på", "kvelden", "ikke"]
+PHONES = ["a", "e", "i", "o", "u", "y", "æ", "ø", "å", "l", "r", "n", "s",
+          "t", "k", "ʃ", "ç"]
+
+# Columns of `NWD_june23.csv` that the scripts do not use, as in the real
+# sheet, which has many more columns than are read
+FILLER_COLUMNS = ["Selection", "View", "Channel", "Low.Freq..Hz.",
+                  "High.Freq..Hz.", "Comment"]
+
+
+def sentences(n, rng):
+    """Return `n` distinct sentences of 3 to 8 words."""
+    result = set()
+    while len(result) < n:
+        length = rng.integers(3, 9)
+        result.add(" ".join(rng.choice(WORDS, length)))
+    return sorted(result)
+
+
+def aligned_tiers(duration, rng):
+    """Return word and phone intervals covering most of `duration`."""
+    words, phones = [], []
+    start = round(float(rng.uniform(0.05, 0.2)), 4)
+    while start < duration - 0.3:
+        end = min(round(start + float(rng.uniform(0.15, 0.4)), 4),
+                  duration)
+        words.append((start, end, str(rng.choice(WORDS))))
+        boundaries = np.round(np.linspace(start, end, rng.integers(3, 7)), 4)
+        phones.extend((float(phone_start), float(phone_end),
+                       str(rng.choice(PHONES)))
+                      for phone_start, phone_end
+                      in zip(boundaries[:-1], boundaries[1:]))
+        start = end + (round(float(rng.uniform(0, 0.1)), 4)
+                       if rng.random() < 0.3 else 0)
+    return words, phones
+
+
+def write_wav(path, duration, sample_rate=16000):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(2 * round(duration * sample_rate)))
+
+
+def write_corpus(root, n_files=100, seconds=3.0, n_sentences=None,
+                 csv_rows=8, emb_share=0.2, other_informants=0.1, seed=0):
+    """Write a corpus of `n_files` clips of about `seconds` each to `root`.
+
+    `n_sentences` is the number of distinct `realization` labels (by default
+    one per two files), `csv_rows` the number of rows of each informant in
+    `NWD_june23.csv`, of which a share `emb_share` is from the embedding
+    experiment. Rows of informants without a TextGrid are added in a share
+    `other_informants` of the sheet. Returns the number of files.
+    """
+    rng = np.random.default_rng(seed)
+    fa_path = os.path.join(root, "fa_textgrids")
+    norwegian_path = os.path.join(root, "NorwegianTextGrids")
+    os.makedirs(fa_path, exist_ok=True)
+    os.makedirs(norwegian_path, exist_ok=True)
+    if n_sentences is None:
+        n_sentences = max(1, n_files // 2)
+    sentence_list = sentences(n_sentences, rng)
+
+    realization_rows = []
+    nwd_rows = []
+    for i in range(n_files):
+        participant = f"P{i:05d}"
+        name = f"{1200 + i % 10}_{participant}"
+        duration = round(float(seconds * rng.uniform(0.6, 1.4)), 3)
+        sentence = sentence_list[i % n_sentences]
+
+        write_wav(os.path.join(root, name + ".wav"), duration)
+        realization_rows.append([participant, name + ".wav",
+                                 str(duration).replace(".", ","), sentence])
+
+        words, phones = aligned_tiers(duration, rng)
+        tg = textgrid.Textgrid()
+        tg.addTier(textgrid.IntervalTier("realization - phone", phones, 0,
+                                         duration))
+        tg.addTier(textgrid.IntervalTier("realization - word", words, 0,
+                                         duration))
+        tg.addTier(textgrid.IntervalTier("realization - trans",
+                                         [(0, duration, sentence)], 0,
+                                         duration))
+        write_textgrid(tg, os.path.join(fa_path, name + ".TextGrid"),
+                       format="long_textgrid", include_blank_spaces=True)
+
+        tg = textgrid.Textgrid()
+        tg.addTier(textgrid.IntervalTier("word", words, 0, duration))
+        tg.addTier(textgrid.IntervalTier("phone", phones, 0, duration))
+        write_textgrid(tg, os.path.join(norwegian_path,
+                                        participant + ".TextGrid"),
+                       format="long_textgrid", include_blank_spaces=True)
+
+        nwd_rows.extend(nwd_sheet_rows(participant, duration, csv_rows,
+                                       emb_share, rng))
+
+    n_other = int(len(nwd_rows) * other_informants)
+    for i in range(n_other // max(1, csv_rows) + (n_other > 0)):
+        nwd_rows.extend(nwd_sheet_rows(f"X{i:05d}", seconds, csv_rows,
+                                       emb_share, rng))
+    rng.shuffle(nwd_rows)
+
+    with open(os.path.join(root, "realization.csv"), "w",
+              encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["participant", "audio_filename", "duration",
+                         "realization"])
+        writer.writerows(realization_rows)
+
+    with open(os.path.join(root, "NWD_june23.csv"), "w", encoding="utf-16",
+              newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Informant", "UniqueNumb", "SoundMatch",
+                         "Begin.Time...ss.msec", "End.Time...ss.msec",
+                         "Realization", *FILLER_COLUMNS])
+        writer.writerows(nwd_rows)
+    return n_files
+
+
+def nwd_sheet_rows(informant, duration, n_rows, emb_share, rng):
+    """Return `n_rows` rows of `NWD_june23.csv` for `informant`."""
+    rows = []
+    for k in range(n_rows):
+        begin = round(float(rng.uniform(0, max(duration - 0.5, 0.1))), 3)
+        end = round(begin + float(rng.uniform(0.05, 0.5)), 3)
+        sound_match = (f"emb{k}" if rng.random() < emb_share
+                       else f"item{k}")
+        rows.append([informant, 1000 + k, sound_match, begin, end,
+                     str(rng.choice(["ja", "nei", "kanskje"])),
+                     k + 1, "Spectrogram 1", 1, 0, 8000, ""])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--sentences", type=int)
+    parser.add_argument("--csv-rows", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_corpus(args.root, args.files, args.seconds, args.sentences,
+                 args.csv_rows, seed=args.seed)
+    print(f"Wrote {args.files} files of about {args.seconds:g} s to "
+          f"'{args.root}'.")
+
+
+if __name__ == "__main__":
+    main()
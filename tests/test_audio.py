@@ -0,0 +1,94 @@
+import struct
+import wave
+
+import pytest
+
+from TextGrid_audio import (WAVE_FORMAT_EXTENSIBLE, WAVE_FORMAT_PCM,
+                            UnsupportedAudioFormat, read_wav_info,
+                            wav_duration)
+
+# The start of the sub-format GUIDs of WAVE_FORMAT_EXTENSIBLE headers
+GUID_TAIL = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+
+def fmt_chunk(format_tag, channels, sample_rate, bits, sub_format=None):
+    block_align = channels * bits // 8
+    fields = struct.pack("<HHIIHH", format_tag, channels, sample_rate,
+                         sample_rate * block_align, block_align, bits)
+    if sub_format is not None:
+        fields += struct.pack("<HHI", 22, bits, 0)
+        fields += struct.pack("<H", sub_format) + GUID_TAIL
+    return b"fmt " + struct.pack("<I", len(fields)) + fields
+
+
+def write_wav(path, fmt, data, rf64=False, extra=b""):
+    """Write a WAV (or RF64) file with the chunks `fmt`, `extra` and data."""
+    if rf64:
+        ds64 = b"ds64" + struct.pack("<IQQQI", 28, 0, len(data), 0, 0)
+        body = (b"WAVE" + ds64 + fmt + extra + b"data"
+                + struct.pack("<I", 0xFFFFFFFF) + data)
+        header = b"RF64" + struct.pack("<I", 0xFFFFFFFF)
+    else:
+        body = b"WAVE" + fmt + extra + b"data" + struct.pack("<I",
+                                                             len(data)) + data
+        header = b"RIFF" + struct.pack("<I", len(body))
+    with open(path, "wb") as f:
+        f.write(header + body)
+
+
+@pytest.mark.parametrize("channels,sample_rate,sample_width,frames", [
+    (1, 16000, 2, 16001), (2, 44100, 2, 44100 * 3 + 7), (1, 8000, 1, 5),
+    (2, 48000, 3, 48000)])
+def test_pcm_matches_wave_module(tmp_path, channels, sample_rate,
+                                 sample_width, frames):
+    path = str(tmp_path / "pcm.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\0" * frames * channels * sample_width)
+
+    info = read_wav_info(path)
+    assert info.format_tag == WAVE_FORMAT_PCM
+    assert (info.channels, info.sample_rate, info.frames) == (
+        channels, sample_rate, frames)
+    assert wav_duration(path) == round(frames / sample_rate, 6)
+
+
+def test_extensible_24_bit(tmp_path):
+    path = str(tmp_path / "extensible.wav")
+    # An odd-sized chunk before `data` is padded to an even size
+    write_wav(path, fmt_chunk(WAVE_FORMAT_EXTENSIBLE, 2, 48000, 24,
+                              sub_format=WAVE_FORMAT_PCM),
+              b"\0" * 6 * 24000, extra=b"LIST" + struct.pack("<I", 3)
+              + b"abc\0")
+    info = read_wav_info(path)
+    assert (info.format_tag, info.bits_per_sample, info.block_align,
+            info.frames) == (WAVE_FORMAT_PCM, 24, 6, 24000)
+    assert wav_duration(path) == 0.5
+
+
+def test_rf64(tmp_path):
+    path = str(tmp_path / "rf64.wav")
+    write_wav(path, fmt_chunk(WAVE_FORMAT_PCM, 1, 16000, 16),
+              b"\0" * 2 * 16000 * 2, rf64=True)
+    assert read_wav_info(path).frames == 32000
+    assert wav_duration(path) == 2.0
+
+
+def test_unsupported_headers(tmp_path):
+    path = str(tmp_path / "bad.wav")
+    # Compressed (MPEG) audio
+    write_wav(path, fmt_chunk(0x0055, 1, 16000, 16), b"\0" * 100)
+    with pytest.raises(UnsupportedAudioFormat):
+        read_wav_info(path)
+    # A `data` chunk longer than the file
+    write_wav(path, fmt_chunk(WAVE_FORMAT_PCM, 1, 16000, 16), b"\0" * 100)
+    with open(path, "r+b") as f:
+        f.truncate(80)
+    with pytest.raises(UnsupportedAudioFormat):
+        read_wav_info(path)
+    with open(path, "wb") as f:
+        f.write(b"ID3" + b"\0" * 40)
+    with pytest.raises(UnsupportedAudioFormat):
+        read_wav_info(path)
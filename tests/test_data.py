@@ -0,0 +1,46 @@
+import pytest
+
+import TextGrid_data
+from TextGrid_data import read_annotation_csv
+
+pytest.importorskip("pyarrow")
+
+ROWS = [("A", "1", "x", 0.0, 1.0, "hei"),
+        ("B", "2", "x", 1.0, 2.0, "du"),
+        ("A", "3", "emb", 2.0, 3.0, "ja"),
+        ("C", "4", "x", 3.0, 4.0, "nei")]
+
+
+def write_sheet(path):
+    with open(path, "w", encoding="utf-16") as f:
+        f.write("Informant,UniqueNumb,SoundMatch,Begin.Time...ss.msec,"
+                "End.Time...ss.msec,Realization,Other\n")
+        for row in ROWS:
+            f.write(",".join(map(str, row)) + ",-\n")
+
+
+def informant_rows(df):
+    return sorted(zip(df["Informant"].astype(str),
+                      df["Realization"].astype(str)))
+
+
+def test_cache_holds_the_informants_it_was_read_for(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "sheet.csv")
+    cache_path = str(tmp_path / "sheet.feather")
+    write_sheet(csv_path)
+
+    df = read_annotation_csv(csv_path, ["A", "B"], cache_path=cache_path)
+    assert informant_rows(df) == [("A", "hei"), ("B", "du")]
+    # A subset of the cached informants is read from the cache
+    parse = TextGrid_data._parse_annotation_csv
+    monkeypatch.setattr(TextGrid_data, "_parse_annotation_csv", None)
+    df = read_annotation_csv(csv_path, ["B"], cache_path=cache_path)
+    assert informant_rows(df) == [("B", "du")]
+    monkeypatch.setattr(TextGrid_data, "_parse_annotation_csv", parse)
+    # Other informants are not in the cache, so the sheet is read again
+    df = read_annotation_csv(csv_path, ["C"], cache_path=cache_path)
+    assert informant_rows(df) == [("C", "nei")]
+    df = read_annotation_csv(csv_path, cache_path=cache_path)
+    assert informant_rows(df) == [("A", "hei"), ("B", "du"), ("C", "nei")]
+    df = read_annotation_csv(csv_path, ["A", "C"], cache_path=cache_path)
+    assert informant_rows(df) == [("A", "hei"), ("C", "nei")]
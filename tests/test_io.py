@@ -0,0 +1,51 @@
+import random
+
+from praatio import textgrid
+from praatio.utilities.constants import Interval, Point
+
+from TextGrid_io import read_textgrid, write_textgrid
+
+LABELS = ["", "a", "hei på deg", 'sa "ja"', "ø", "x y", "1.5"]
+
+
+def random_textgrid(rng):
+    maxT = rng.randrange(5, 20) / 2
+    tg = textgrid.Textgrid()
+    for i in range(rng.randrange(1, 4)):
+        times = sorted(rng.sample(range(1, int(maxT * 8)), 6))
+        times = [time / 8 for time in times]
+        if rng.random() < 0.7:
+            entries = [Interval(start, end, rng.choice(LABELS[1:]))
+                       for start, end in zip(times[::2], times[1::2])
+                       if rng.random() < 0.8]
+            tier = textgrid.IntervalTier(f"tier {i}", entries, 0, maxT)
+        else:
+            entries = [Point(time, rng.choice(LABELS))
+                       for time in times if rng.random() < 0.6]
+            tier = textgrid.PointTier(f"point {i}", entries, 0, maxT)
+        tg.addTier(tier)
+    return tg
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_write_textgrid_matches_praatio(tmp_path):
+    rng = random.Random(0)
+    for n in range(100):
+        tg = random_textgrid(rng)
+        for format in ("long_textgrid", "short_textgrid"):
+            for blanks in (True, False):
+                expected = str(tmp_path / "praatio.TextGrid")
+                tg.save(expected, format=format, includeBlankSpaces=blanks)
+                path = str(tmp_path / "fast.TextGrid")
+                write_textgrid(tg, path, format=format,
+                               include_blank_spaces=blanks)
+                assert read_bytes(path) == read_bytes(expected), (n, format)
+
+                # Read back with the fast reader and written again
+                write_textgrid(read_textgrid(expected), path, format=format,
+                               include_blank_spaces=blanks)
+                assert read_bytes(path) == read_bytes(expected), (n, format)
@@ -0,0 +1,56 @@
+import random
+
+import numpy as np
+
+from TextGrid_join import IntervalIndex, join_labels
+from TextGrid_tiers import ArrayTier
+
+
+def brute_force(entry_starts, entry_ends, starts, ends, mode):
+    pairs = []
+    for query, (start, end) in enumerate(zip(starts, ends)):
+        matches = []
+        for entry, (entry_start, entry_end) in enumerate(zip(entry_starts,
+                                                             entry_ends)):
+            if mode == "overlap":
+                match = (entry_start < end and entry_end > start
+                         or entry_start == entry_end
+                         and start <= entry_start <= end)
+            elif mode == "within":
+                match = start <= entry_start and entry_end <= end
+            else:
+                match = entry_start <= start and end <= entry_end
+            if match:
+                matches.append(entry)
+        # In the order of the start times of the entries
+        matches.sort(key=lambda entry: entry_starts[entry])
+        pairs.extend((query, entry) for entry in matches)
+    return pairs
+
+
+def random_intervals(rng, n, points=False):
+    starts = [rng.randrange(0, 20) / 2 for _ in range(n)]
+    ends = [start if points else start + rng.randrange(0, 8) / 2
+            for start in starts]
+    return starts, ends
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(300):
+        entry_starts, entry_ends = random_intervals(
+            rng, rng.randrange(0, 15), points=rng.random() < 0.2)
+        starts, ends = random_intervals(rng, rng.randrange(1, 8))
+        index = IntervalIndex(entry_starts, entry_ends)
+        for mode in ("overlap", "within", "contains"):
+            queries, entries = index.query(starts, ends, mode)
+            assert list(zip(queries.tolist(), entries.tolist())) == \
+                brute_force(entry_starts, entry_ends, starts, ends, mode)
+
+
+def test_join_labels_skips_empty_labels():
+    tier = ArrayTier.from_labels("word", [0, 1, 2], [1, 2, 3],
+                                 ["hei", "", "du"], xmin=0, xmax=3)
+    labels = join_labels(tier, np.array([0.5, 0.0, 1.2]),
+                         np.array([2.5, 0.9, 1.8]))
+    assert labels.tolist() == ["hei du", "hei", ""]
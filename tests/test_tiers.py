@@ -0,0 +1,58 @@
+import random
+
+import pytest
+from praatio import textgrid
+from praatio.utilities import errors
+from praatio.utilities.constants import Interval
+
+from TextGrid_tiers import build_interval_tier, merge_intervals
+
+
+def random_intervals(rng, n):
+    # Times on a coarse grid, so that intervals often overlap, nest or touch
+    starts = [rng.randrange(0, 40) / 4 for _ in range(n)]
+    ends = [start + rng.randrange(1, 12) / 4 for start in starts]
+    labels = [rng.choice("abc") + str(i) for i in range(n)]
+    return starts, ends, labels
+
+
+def inserted_one_by_one(starts, ends, labels, maxT, collision_mode):
+    tier = textgrid.IntervalTier("x", [], 0, maxT)
+    for entry in zip(starts, ends, labels):
+        tier.insertEntry(Interval(*entry), collisionMode=collision_mode,
+                         collisionReportingMode="silence")
+    return tier
+
+
+def test_build_interval_tier_matches_insert_entry():
+    rng = random.Random(0)
+    for _ in range(500):
+        starts, ends, labels = random_intervals(rng, rng.randrange(1, 12))
+        for collision_mode in ("merge", "error"):
+            try:
+                expected = inserted_one_by_one(starts, ends, labels, 15,
+                                               collision_mode)
+            except errors.CollisionError:
+                with pytest.raises(errors.CollisionError):
+                    build_interval_tier("x", starts, ends, labels, 0, 15,
+                                        collision_mode=collision_mode,
+                                        collision_reporting_mode="silence")
+                continue
+            tier = build_interval_tier("x", starts, ends, labels, 0, 15,
+                                       collision_mode=collision_mode,
+                                       collision_reporting_mode="silence")
+            assert list(tier.entries) == list(expected.entries)
+            merged = merge_intervals("x", starts, ends, labels,
+                                     collision_mode=collision_mode,
+                                     collision_reporting_mode="silence")
+            assert list(zip(merged[0].tolist(), merged[1].tolist(),
+                            merged[2])) == [tuple(entry) for entry
+                                            in expected.entries]
+
+
+def test_build_interval_tier_without_intervals():
+    for collision_mode in ("merge", "error"):
+        tier = build_interval_tier("x", [], [], [], 0, 5,
+                                   collision_mode=collision_mode)
+        assert len(tier.entries) == 0
+        assert (tier.minTimestamp, tier.maxTimestamp) == (0, 5)
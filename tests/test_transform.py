@@ -0,0 +1,39 @@
+import os
+
+from TextGrid_io import TextGridData, read_textgrid, write_textgrid
+from TextGrid_tiers import ArrayTier
+from TextGrid_transform import compile_transform, load_config
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "tier_configs")
+
+
+def aligner_textgrid(extra_tiers=()):
+    """A TextGrid with the tiers of the forced aligner and `extra_tiers`."""
+    tiers = [
+        ArrayTier.from_labels("realization - phone", [0.0, 0.5], [0.5, 1.0],
+                              ["h", "ei"], xmin=0, xmax=1),
+        ArrayTier.from_labels("realization - word", [0.0], [1.0], ["hei"],
+                              xmin=0, xmax=1),
+        ArrayTier.from_labels("realization - trans", [0.0], [1.0], ["hei"],
+                              xmin=0, xmax=1),
+    ]
+    tiers.extend(ArrayTier.from_labels(name, [0.2], [0.8], ["x"], xmin=0,
+                                       xmax=1)
+                 for name in extra_tiers)
+    return TextGridData(0.0, 1.0, tiers)
+
+
+def test_modify_config_keeps_other_tiers(tmp_path):
+    transform = compile_transform(
+        load_config(os.path.join(CONFIG_DIR, "modify_textgrids.json")),
+        {"prosodic_word": lambda labels: labels,
+         "translate": lambda labels: labels})
+    path = str(tmp_path / "extra.TextGrid")
+    write_textgrid(transform.apply(aligner_textgrid(["notes"])), path)
+
+    tg = read_textgrid(path, include_empty_intervals=False)
+    assert tg.tier_names == ["phone", "word", "notes", "realization",
+                             "translation (Google)", "prosodic unit",
+                             "stress (PS|SS|0)", "emphasis (E)", "comment"]
+    assert [label for _, _, label in tg.get_tier("notes").entries] == ["x"]
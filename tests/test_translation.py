@@ -0,0 +1,39 @@
+import random
+
+from TextGrid_translation import (AsyncTranslationPipeline,
+                                  FakeTranslationServer, HTTPTranslator,
+                                  run_coroutine)
+
+TEXTS = [f"realisering nummer {i}" for i in range(40)]
+
+
+def test_pipeline_retries_failures_and_timeouts():
+    random.seed(0)
+    # About a third of the requests fail, and about a third time out
+    with FakeTranslationServer(latency=0.0, jitter=0.15,
+                               failure_rate=0.3) as server:
+        pipeline = AsyncTranslationPipeline(max_in_flight=4, retries=20,
+                                            backoff=0.01, timeout=0.1)
+        translations = run_coroutine(pipeline.translate_all(
+            HTTPTranslator(server.url), TEXTS))
+
+    assert translations == {text: f"en:{text}" for text in TEXTS}
+    stats = pipeline.stats()
+    assert stats["failures"] == 0
+    assert stats["attempts"] > stats["requests"]
+    assert server.peak_in_flight <= 4
+
+
+def test_pipeline_counts_abandoned_requests_in_flight():
+    # Every request times out, but keeps its place until the server replies
+    with FakeTranslationServer(latency=0.3) as server:
+        pipeline = AsyncTranslationPipeline(max_in_flight=2, retries=2,
+                                            backoff=0.01, timeout=0.05)
+        translations = run_coroutine(pipeline.translate_all(
+            HTTPTranslator(server.url), TEXTS))
+
+    assert translations == {}
+    stats = pipeline.stats()
+    assert stats["failures"] == stats["requests"] == 2
+    assert stats["abandoned"] == stats["attempts"] == 6
+    assert server.peak_in_flight <= 2